@@ -0,0 +1,40 @@
+"""Compare per-call connections against the pooled transport.
+
+    python -m benchmarks.bench_transport [calls]
+"""
+import sys
+import time
+import requests
+from benchmarks.stub_server import StubServer
+from formstack.forms_api import FormsClient
+from formstack.transport import Transport
+
+
+def run_unpooled(server: StubServer, calls: int):
+    url = f"http://{server.hostname}/api/v2/form.json"
+    for _ in range(calls):
+        requests.request(method="GET", url=url).json()
+
+
+def run_pooled(server: StubServer, calls: int):
+    transport = Transport()
+    fs = FormsClient(hostname=server.hostname, scheme="http", transport=transport)
+    for _ in range(calls):
+        fs.get_form()
+    transport.close()
+
+
+def main(calls: int = 500):
+    for name, fn in (("requests.request", run_unpooled), ("Transport", run_pooled)):
+        with StubServer() as server:
+            start = time.perf_counter()
+            fn(server, calls)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<18} calls={calls} connections={server.connections} "
+                f"elapsed={elapsed:.3f}s req/s={calls / elapsed:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,227 @@
+"""Benchmark the main client workloads against the local Formstack stub server.
+
+    python -m benchmarks.bench_workloads [--workload NAME ...] [--latency 0.005]
+        [--error-429 0.01] [--error-5xx 0.01] [--max-connections 8]
+        [--save results.json] [--baseline results.json] [--tolerance 0.25]
+
+Each workload runs in a fresh process so its peak RSS is its own. Requests per
+second and p50/p99 latency are measured on the client, connections opened on
+the server. With ``--baseline`` the run fails (exit status 1) when a workload's
+requests per second drop, or its p99 latency grows, by more than
+``--tolerance`` compared to the saved results.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from typing import Dict, List
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.instrumentation import Instrumentation
+from formstack.ratelimit import RateLimiter
+from formstack.retry import RetryPolicy
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+ALL_METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+
+
+def _client_options(hostname: str, instrumentation: Instrumentation) -> Dict:
+    return dict(
+        hostname=hostname,
+        scheme="http",
+        rate_limiter=RateLimiter(max_retries=10),
+        retry=RetryPolicy(max_retries=5, backoff_factor=0.01, methods=ALL_METHODS),
+        instrumentation=instrumentation,
+    )
+
+
+def form_listing(hostname: str, options: Dict, instrumentation: Instrumentation):
+    from formstack.forms_api import FormsClient
+
+    fs = FormsClient(token="bench", **_client_options(hostname, instrumentation))
+    for _ in range(options["repeat"]):
+        for form in fs.iter_forms(per_page=100):
+            fs.get_form(form["id"])
+
+
+def submission_paging(hostname: str, options: Dict, instrumentation: Instrumentation):
+    from formstack.forms_api import FormsClient
+
+    fs = FormsClient(token="bench", **_client_options(hostname, instrumentation))
+    for form_id in range(1, options["repeat"] + 1):
+        for _ in fs.iter_form_submissions(form_id, per_page=100, stream=True):
+            pass
+
+
+def bulk_merge(hostname: str, options: Dict, instrumentation: Instrumentation):
+    from formstack.docs_api import DocsClient
+
+    docs = DocsClient(api_key="bench", api_secret="bench", **_client_options(hostname, instrumentation))
+    items = ((n % 20 + 1, {"name": f"Recipient {n}"}) for n in range(options["merges"]))
+    for result in docs.merge_many(items, workers=options["workers"]):
+        if not result.ok:
+            raise RuntimeError(result.error)
+
+
+def scim_sync(hostname: str, options: Dict, instrumentation: Instrumentation):
+    from formstack.forms_scim import FormsSCIM
+    from formstack.scim_sync import DirectorySync
+
+    scim = FormsSCIM(token="bench", **_client_options(hostname, instrumentation))
+    users = options["users"]
+    # A tenth renamed, a tenth new, a tenth deprovisioned
+    desired = [
+        {
+            "userName": f"user{n}@example.com",
+            "externalId": f"ext-{n}",
+            "name": {"givenName": f"Renamed{n}" if n % 10 == 0 else f"Given{n}", "familyName": f"Family{n}"},
+            "active": True,
+        }
+        for n in range(users // 10, users + users // 10)
+    ]
+    groups = [
+        {"displayName": f"Group {n}", "members": [f"ext-{m}" for m in range(n, users, 10)]}
+        for n in range(10)
+    ]
+    report = DirectorySync(scim, workers=options["workers"], bulk=options["scim_bulk"]).run(desired, groups)
+    if report.errors:
+        raise RuntimeError(report.errors[0].error)
+
+
+WORKLOADS = {
+    "form_listing": form_listing,
+    "submission_paging": submission_paging,
+    "bulk_merge": bulk_merge,
+    "scim_sync": scim_sync,
+}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_workload(name: str, hostname: str, options: Dict) -> Dict:
+    """Run one workload in this process and measure it from the client side."""
+    latencies = []
+    instrumentation = Instrumentation()
+    instrumentation.on_response(lambda trace: latencies.append(trace.elapsed))
+    start = time.perf_counter()
+    WORKLOADS[name](hostname, options, instrumentation)
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "elapsed": elapsed,
+        "req_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run(names: List[str], config: StubConfig, options: Dict) -> Dict[str, Dict]:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        # A fresh server per workload, so SCIM changes do not carry over
+        with FormstackStubServer(config) as server:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_workload, (name, server.hostname, options))
+            result["connections"] = server.connections
+            result["server_errors"] = sum(
+                count for status, count in server.statuses.items() if status in (429, 503)
+            )
+        results[name] = result
+    return results
+
+
+def regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result["req_s"] < before["req_s"] * (1 - tolerance):
+            found.append(f"{name}: req/s {before['req_s']:.0f} -> {result['req_s']:.0f}")
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            found.append(f"{name}: p99 {before['p99_ms']:.1f}ms -> {result['p99_ms']:.1f}ms")
+    return found
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS))
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--payload-size", type=int, default=512)
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    parser.add_argument("--max-connections", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--merges", type=int, default=500)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-scim-bulk", action="store_true")
+    parser.add_argument("--save")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        page_size=args.page_size,
+        submissions=args.submissions,
+        payload_size=args.payload_size,
+        users=args.users,
+        scim_bulk=not args.no_scim_bulk,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        max_connections=args.max_connections,
+        keep_alive_timeout=0.5 if args.max_connections else 5.0,
+    )
+    options = {
+        "repeat": args.repeat,
+        "merges": args.merges,
+        "users": args.users,
+        "workers": args.workers,
+        "scim_bulk": not args.no_scim_bulk,
+    }
+    results = run(args.workload or list(WORKLOADS), config, options)
+    print(f"{'workload':<18} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'conns':>5} {'429/5xx':>7}")
+    for name, r in results.items():
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(
+            f"{name:<18} {r['requests']:>8} {r['req_s']:>8.0f} {r['p50_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {rss:>7} {r['connections']:>5} {r['server_errors']:>7}"
+        )
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
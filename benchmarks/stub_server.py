@@ -0,0 +1,657 @@
+import base64
+import json
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = json.dumps({"method": self.command, "path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=("127.0.0.1", 0), handler=StubHandler):
+        super().__init__(address, handler)
+        self.connections = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    def count_connection(self):
+        with self._count_lock:
+            self.connections += 1
+
+    @property
+    def hostname(self) -> str:
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubConfig:
+    """Behaviour of :class:`FormstackStubServer`.
+
+    ``latency`` (plus up to ``jitter``) seconds are added to every response.
+    ``page_size`` caps ``per_page``/``count`` like the real APIs do.
+    ``payload_size`` is the approximate size in bytes of each submission's
+    field data. A share ``error_429`` of requests is answered with 429 and
+    ``Retry-After: retry_after``, and ``error_5xx`` with 503. At most
+    ``max_connections`` connections are served at once; more wait in the
+    listen backlog until a connection closes, e.g. after being idle for
+    ``keep_alive_timeout`` seconds.
+
+    Each form has ``fields`` fields and ``partial_submissions`` partial
+    submissions; there are ``smartlists`` smartlists of ``smartlist_options``
+    options. Uploaded files are ``download_size`` bytes. ``Range`` requests
+    for them get a 206 unless ``download_ranges`` is off, and with
+    ``download_drop_after`` the first download of each file stops after that
+    many bytes, as if the connection dropped.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        page_size: int = 100,
+        forms: int = 50,
+        submissions: int = 1000,
+        payload_size: int = 256,
+        fields: int = 8,
+        partial_submissions: int = 50,
+        smartlists: int = 3,
+        smartlist_options: int = 20,
+        download_size: int = 256 * 1024,
+        download_ranges: bool = True,
+        download_drop_after: int = None,
+        users: int = 500,
+        groups: int = 10,
+        scim_bulk: bool = True,
+        error_429: float = 0.0,
+        error_5xx: float = 0.0,
+        retry_after: float = 0,
+        max_connections: int = None,
+        keep_alive_timeout: float = 5.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.forms = forms
+        self.submissions = submissions
+        self.payload_size = payload_size
+        self.fields = fields
+        self.partial_submissions = partial_submissions
+        self.smartlists = smartlists
+        self.smartlist_options = smartlist_options
+        self.download_size = download_size
+        self.download_ranges = download_ranges
+        self.download_drop_after = download_drop_after
+        self.users = users
+        self.groups = groups
+        self.scim_bulk = scim_bulk
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.retry_after = retry_after
+        self.max_connections = max_connections
+        self.keep_alive_timeout = keep_alive_timeout
+        self.seed = seed
+
+
+class FormstackData:
+    """Forms and submissions generated on demand, and mutable smartlists and
+    SCIM directory."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.users = {}
+        self.groups = {}
+        self.next_id = 1
+        self.smartlists = {
+            n: {
+                "id": str(n),
+                "name": f"Smartlist {n}",
+                "options": [
+                    {"id": str(n * 100000 + m), "label": f"Option {m}", "value": f"option-{m}"}
+                    for m in range(config.smartlist_options)
+                ],
+            }
+            for n in range(1, config.smartlists + 1)
+        }
+        self.next_option = 1
+        # Files whose first download was cut short
+        self.dropped = set()
+        for n in range(config.users):
+            self.add_user({
+                "userName": f"user{n}@example.com",
+                "externalId": f"ext-{n}",
+                "name": {"givenName": f"Given{n}", "familyName": f"Family{n}"},
+                "active": True,
+            })
+        user_ids = list(self.users)
+        for n in range(config.groups):
+            self.add_group({
+                "displayName": f"Group {n}",
+                "members": [{"value": id} for id in user_ids[n :: max(1, config.groups)]],
+            })
+
+    # Forms
+    def form(self, id: int):
+        return {
+            "id": str(id),
+            "name": f"Form {id}",
+            "folder": str(id % 5),
+            "submissions": str(self.config.submissions),
+            "url": f"https://example.formstack.com/forms/form{id}",
+        }
+
+    def submission(self, form_id: int, n: int):
+        fields = 8
+        value = "x" * max(1, self.config.payload_size // fields - 30)
+        return {
+            "id": str(form_id * 1000000 + n),
+            "form": str(form_id),
+            "timestamp": "2024-01-01 00:00:00",
+            "data": {
+                str(field): {"field": str(field), "label": f"Field {field}", "value": value}
+                for field in range(1, fields + 1)
+            },
+        }
+
+    def field(self, id: int):
+        return {
+            "id": str(id),
+            "form": str(id // 1000),
+            "label": f"Field {id % 1000}",
+            "type": "text",
+            "required": "0",
+            "sort": str(id % 1000),
+        }
+
+    def fields(self, form_id: int):
+        return [self.field(form_id * 1000 + n) for n in range(1, self.config.fields + 1)]
+
+    def partial_submission(self, form_id: int, n: int):
+        return dict(self.submission(form_id, n), id=str(form_id * 1000000 + n))
+
+    def file(self, id: int, field_id: int) -> bytes:
+        # Deterministic content, so a resumed download can be checked
+        seed = f"{id}-{field_id}-".encode()
+        size = self.config.download_size
+        return (seed * (size // len(seed) + 1))[:size]
+
+    # Smartlists
+    def add_options(self, smartlist, options):
+        with self.lock:
+            for option in options:
+                smartlist["options"].append(dict(option, id=str(self.next_option)))
+                self.next_option += 1
+
+    def delete_option(self, smartlist, option_id: str) -> bool:
+        with self.lock:
+            kept = [o for o in smartlist["options"] if o["id"] != option_id]
+            found = len(kept) != len(smartlist["options"])
+            smartlist["options"] = kept
+            return found
+
+    # SCIM
+    def _new_id(self) -> str:
+        id = f"{self.next_id:08d}-0000-4000-8000-000000000000"
+        self.next_id += 1
+        return id
+
+    def add_user(self, user):
+        with self.lock:
+            id = self._new_id()
+            self.users[id] = dict(
+                user,
+                id=id,
+                schemas=["urn:ietf:params:scim:schemas:core:2.0:User"],
+                meta={"resourceType": "User"},
+            )
+            return self.users[id]
+
+    def add_group(self, group):
+        with self.lock:
+            id = self._new_id()
+            self.groups[id] = dict(
+                group,
+                id=id,
+                schemas=["urn:ietf:params:scim:schemas:core:2.0:Group"],
+                meta={"resourceType": "Group"},
+            )
+            return self.groups[id]
+
+    def patch(self, resource, operations):
+        with self.lock:
+            for op in operations:
+                path = op.get("path", "")
+                if op["op"] == "replace":
+                    resource[path] = op["value"]
+                elif op["op"] == "add":
+                    resource.setdefault(path, []).extend(op["value"])
+                elif op["op"] == "remove" and path.startswith("members[value eq "):
+                    value = path.split('"')[1]
+                    resource["members"] = [m for m in resource.get("members", ()) if m["value"] != value]
+        return resource
+
+
+def _page(items, start: int, size: int):
+    return items[start : start + size]
+
+
+class FormstackHandler(StubHandler):
+    """Emulates the Forms v2 (``/api/v2/``), Documents (``/api/``,
+    ``/merge/``, ``/route/``) and SCIM (``/scim/``) endpoints the clients call.
+    File downloads are sent as raw bytes, everything else as JSON."""
+
+    def setup(self):
+        # Idle keep-alive connections are closed after the timeout
+        self.timeout = self.server.config.keep_alive_timeout
+        super().setup()
+
+    def _send_json(self, status: int, data=None, headers=None):
+        # "/" escaped as the PHP API does
+        body = json.dumps(data).replace("/", "\\/").encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_response(status)
+
+    def _send_file(self, id: int, field_id: int):
+        # An uploaded file, honouring "Range: bytes=N-"
+        server = self.server
+        config = server.config
+        content = server.data.file(id, field_id)
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        start = int(match.group(1)) if match and config.download_ranges else 0
+        if start >= len(content) and start:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(content)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return server.count_response(416)
+        status = 206 if start else 200
+        body = content[start:]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        server.count_response(status)
+        drop = config.download_drop_after
+        if drop is not None and (id, field_id) not in server.data.dropped:
+            server.data.dropped.add((id, field_id))
+            self.wfile.write(body[:drop])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body)
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            raw = self._read_chunked()
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else None
+
+    def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                # Trailers end with an empty line
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def _dispatch(self):
+        server = self.server
+        config = server.config
+        body = self._body()
+        delay = config.latency + (server.random() * config.jitter if config.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        roll = server.random() if (config.error_429 or config.error_5xx) else 1.0
+        if roll < config.error_429:
+            return self._send_json(429, {"error": "Too many requests"}, {"Retry-After": str(config.retry_after)})
+        if roll < config.error_429 + config.error_5xx:
+            return self._send_json(503, {"error": "Service unavailable"})
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        download = _DOWNLOAD.fullmatch(url.path)
+        if download and self.command == "GET":
+            return self._send_file(int(download.group(1)), int(download.group(2)))
+        for method, pattern, handler in ROUTES:
+            if method != self.command:
+                continue
+            match = pattern.fullmatch(url.path)
+            if match:
+                status, data = handler(server.data, config, query, body, *match.groups())
+                return self._send_json(status, data)
+        self._send_json(404, {"error": f"No route for {self.command} {url.path}"})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+
+def _paged(total: int, query, config):
+    # Envelope, offset and size of the requested page
+    per_page = min(int(query.get("per_page") or 25), config.page_size)
+    page = int(query.get("page") or 1)
+    return {"total": total, "pages": -(-total // per_page)}, (page - 1) * per_page, per_page
+
+
+def _forms(data, config, query, body):
+    envelope, start, size = _paged(config.forms, query, config)
+    ids = range(1 + start, 1 + min(config.forms, start + size))
+    return 200, dict(envelope, forms=[data.form(id) for id in ids])
+
+
+def _form(data, config, query, body, id):
+    return 200, data.form(int(id))
+
+
+def _submissions(data, config, query, body, id):
+    envelope, start, size = _paged(config.submissions, query, config)
+    numbers = range(start, min(config.submissions, start + size))
+    return 200, dict(envelope, submissions=[data.submission(int(id), n) for n in numbers])
+
+
+def _create_submission(data, config, query, body, id):
+    return 201, {"id": str(int(id) * 1000000 + config.submissions), "form": id}
+
+
+def _form_fields(data, config, query, body, id):
+    return 200, data.fields(int(id))
+
+
+def _field(data, config, query, body, id):
+    return 200, dict(data.field(int(id)), **(body or {}))
+
+
+def _partial_submissions(data, config, query, body, id):
+    envelope, start, size = _paged(config.partial_submissions, query, config)
+    numbers = range(start, min(config.partial_submissions, start + size))
+    return 200, dict(envelope, partial_submissions=[data.partial_submission(int(id), n) for n in numbers])
+
+
+def _partial_submission(data, config, query, body, id):
+    return 200, data.partial_submission(int(id) // 1000000, int(id) % 1000000)
+
+
+def _smartlists(data, config, query, body):
+    smartlists = [{"id": s["id"], "name": s["name"]} for s in data.smartlists.values()]
+    return 200, {"total": len(smartlists), "smartlists": smartlists}
+
+
+def _smartlist(handler):
+    def respond(data, config, query, body, id, *args):
+        smartlist = data.smartlists.get(int(id))
+        if smartlist is None:
+            return 404, {"error": "The smartlist was not found"}
+        return handler(data, config, query, body, smartlist, *args)
+
+    return respond
+
+
+def _smartlist_info(data, config, query, body, smartlist):
+    return 200, {"id": smartlist["id"], "name": smartlist["name"]}
+
+
+def _smartlist_options(data, config, query, body, smartlist):
+    options = list(smartlist["options"])
+    envelope, start, size = _paged(len(options), query, config)
+    return 200, dict(envelope, options=options[start : start + size])
+
+
+def _add_smartlist_options(data, config, query, body, smartlist):
+    data.add_options(smartlist, body.get("options", ()))
+    return 200, {"success": 1}
+
+
+def _delete_smartlist_option(data, config, query, body, smartlist, option_id):
+    if not data.delete_option(smartlist, option_id):
+        return 404, {"error": "The option was not found"}
+    return 200, {"success": 1}
+
+
+def _document_key(data, config, query, body, id):
+    return 200, {"id": id, "key": f"key{id}"}
+
+
+def _merge(data, config, query, body, id, key):
+    if key != f"key{id}":
+        return 401, {"error": "Invalid key"}
+    return 200, {"success": 1, "id": id}
+
+
+def _tool_file(name: str, content: bytes):
+    return {"name": name, "contents": base64.b64encode(content).decode("ascii")}
+
+
+def _tool(data, config, query, body, tool):
+    # Reversible stand-ins for the PDF tools, so a chain's output can be checked
+    files = body.get("files") or [body.get("file")]
+    contents = [base64.b64decode(f["contents"]) for f in files]
+    name = files[0]["name"]
+    if tool == "combine":
+        return 200, _tool_file(name, b"".join(contents))
+    content = contents[0]
+    if tool == "convert_to_pdf":
+        return 200, _tool_file(name.rsplit(".", 1)[0] + ".pdf", b"%PDF-1.4\n" + content)
+    if tool == "compress_pdf":
+        return 200, _tool_file(name, zlib.compress(content))
+    if tool == "encrypt_pdf":
+        return 200, _tool_file(name, b"ENC:" + body["password"].encode() + b":" + content)
+    size = -(-len(content) // int(body.get("parts", 2)))
+    parts = [content[i : i + size] for i in range(0, len(content), size)]
+    return 200, {"files": [_tool_file(f"{name}-{n}", part) for n, part in enumerate(parts, 1)]}
+
+
+def _scim_list(resources, config, query):
+    resources = list(resources)
+    if query.get("filter"):
+        name, _, value = query["filter"].partition(" eq ")
+        value = value.strip('"')
+        resources = [r for r in resources if str(r.get(name.strip())).lower() == value.lower()]
+    count = min(int(query.get("count") or config.page_size), config.page_size)
+    start = int(query.get("startIndex") or 1)
+    page = _page(resources, start - 1, count)
+    if query.get("attributes"):
+        keep = set(query["attributes"].split(",")) | {"id", "schemas", "meta"}
+        page = [{k: v for k, v in r.items() if k in keep} for r in page]
+    return 200, {
+        "schemas": ["urn:ietf:params:scim:api:messages:2.0:ListResponse"],
+        "totalResults": len(resources),
+        "startIndex": start,
+        "itemsPerPage": len(page),
+        "Resources": page,
+    }
+
+
+def _scim_collection(kind):
+    def handler(data, config, query, body):
+        return _scim_list(getattr(data, kind).values(), config, query)
+
+    return handler
+
+
+def _scim_create(kind):
+    def handler(data, config, query, body):
+        add = data.add_user if kind == "users" else data.add_group
+        return 201, add(body)
+
+    return handler
+
+
+def _scim_resource(kind, method):
+    def handler(data, config, query, body, id):
+        resources = getattr(data, kind)
+        if id not in resources:
+            return 404, {"detail": "Resource not found", "status": "404"}
+        if method == "GET":
+            return 200, resources[id]
+        if method == "PUT":
+            with data.lock:
+                resources[id] = dict(body, id=id)
+            return 200, resources[id]
+        if method == "PATCH":
+            return 200, data.patch(resources[id], body.get("Operations", ()))
+        with data.lock:
+            resources.pop(id, None)
+        return 204, None
+
+    return handler
+
+
+def _service_provider_config(data, config, query, body):
+    return 200, {
+        "bulk": {"supported": config.scim_bulk, "maxOperations": 100, "maxPayloadSize": 1048576},
+        "patch": {"supported": True},
+        "filter": {"supported": True, "maxResults": config.page_size},
+    }
+
+
+def _scim_bulk(data, config, query, body):
+    results = []
+    for operation in body.get("Operations", ()):
+        kind, _, id = operation["path"].strip("/").partition("/")
+        kind = kind.lower()
+        method = operation["method"]
+        if not id:
+            status, resource = _scim_create(kind)(data, config, {}, operation.get("data"))
+        else:
+            status, resource = _scim_resource(kind, method)(data, config, {}, operation.get("data"), id)
+        result = {"method": method, "bulkId": operation.get("bulkId"), "status": str(status)}
+        if isinstance(resource, dict) and resource.get("id"):
+            result["location"] = f"/scim/{kind.title()}/{resource['id']}"
+        results.append(result)
+    return 200, {"schemas": ["urn:ietf:params:scim:api:messages:2.0:BulkResponse"], "Operations": results}
+
+
+_DOWNLOAD = re.compile(r"/api/v2/download/(\d+)/(\d+)\.json")
+
+ROUTES = [
+    ("GET", re.compile(r"/api/v2/form\.json"), _forms),
+    ("GET", re.compile(r"/api/v2/form/(\d+)/?\.json"), _form),
+    ("GET", re.compile(r"/api/v2/form/(\d+)/submission\.json"), _submissions),
+    ("POST", re.compile(r"/api/v2/form/(\d+)/submission\.json"), _create_submission),
+    ("GET", re.compile(r"/api/v2/form/(\d+)/field\.json"), _form_fields),
+    ("GET", re.compile(r"/api/v2/field/(\d+)\.json"), _field),
+    ("PUT", re.compile(r"/api/v2/field/(\d+)\.json"), _field),
+    ("GET", re.compile(r"/api/v2/form/(\d+)/partialsubmission\.json"), _partial_submissions),
+    ("GET", re.compile(r"/api/v2/partialsubmission/(\d+)\.json"), _partial_submission),
+    ("GET", re.compile(r"/api/v2/smartlist"), _smartlists),
+    ("GET", re.compile(r"/api/v2/smartlist/(\d+)"), _smartlist(_smartlist_info)),
+    ("GET", re.compile(r"/api/v2/smartlist/(\d+)/option"), _smartlist(_smartlist_options)),
+    ("PUT", re.compile(r"/api/v2/smartlist/(\d+)/bulkoptions"), _smartlist(_add_smartlist_options)),
+    ("DELETE", re.compile(r"/api/v2/smartlist/(\d+)/option/(\d+)"), _smartlist(_delete_smartlist_option)),
+    ("POST", re.compile(r"/api/(?:documents|routes)/(\d+)"), _document_key),
+    ("POST", re.compile(r"/(?:merge|route)/(\d+)/([^/]+)"), _merge),
+    ("POST", re.compile(r"/api/tools/(combine|convert_to_pdf|compress_pdf|encrypt_pdf|split_pdf)"), _tool),
+    ("GET", re.compile(r"/scim/ServiceProviderConfig"), _service_provider_config),
+    ("POST", re.compile(r"/scim/Bulk"), _scim_bulk),
+]
+for _kind, _path in (("users", "Users"), ("groups", "Groups")):
+    ROUTES.append(("GET", re.compile(rf"/scim/{_path}"), _scim_collection(_kind)))
+    ROUTES.append(("POST", re.compile(rf"/scim/{_path}"), _scim_create(_kind)))
+    for _method in ("GET", "PUT", "PATCH", "DELETE"):
+        ROUTES.append((_method, re.compile(rf"/scim/{_path}/([^/]+)"), _scim_resource(_kind, _method)))
+
+
+class FormstackStubServer(StubServer):
+    """:class:`StubServer` serving :class:`FormstackHandler` with the
+    behaviour set by a :class:`StubConfig`.
+
+    Besides ``connections`` it counts ``requests``, responses per status
+    (``statuses``) and the most connections served at once (``peak_active``).
+    """
+
+    def __init__(self, config: StubConfig = None, address=("127.0.0.1", 0)):
+        super().__init__(address, FormstackHandler)
+        self.config = config or StubConfig()
+        self.data = FormstackData(self.config)
+        self.requests = 0
+        self.statuses = {}
+        self.active = 0
+        self.peak_active = 0
+        self._random = random.Random(self.config.seed)
+        self._slots = (
+            threading.BoundedSemaphore(self.config.max_connections)
+            if self.config.max_connections
+            else None
+        )
+
+    def random(self) -> float:
+        with self._count_lock:
+            return self._random.random()
+
+    def count_response(self, status: int):
+        with self._count_lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def process_request_thread(self, request, client_address):
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._count_lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._count_lock:
+                self.active -= 1
+            if self._slots is not None:
+                self._slots.release()
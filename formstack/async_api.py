@@ -0,0 +1,346 @@
+import asyncio
+import requests
+from typing import Dict, Iterable, Tuple
+from formstack.bulk import AsyncBulkRun
+from formstack.download import DEFAULT_CHUNK_SIZE, Destination
+from formstack.coalesce import AsyncSingleFlight
+from formstack.docs_api import _DocsAPI, _is_stale_key_error
+from formstack.exceptions import FormstackException
+from formstack.forms_api import FormsClient
+from formstack.forms_scim import FormsSCIM
+from formstack.hierarchy import FolderIndex
+from formstack.smartlist import SmartlistUploader, UploadProgress
+from formstack.instrumentation import acount_bytes
+from formstack.jsonstream import STREAM_CHUNK_SIZE, ArrayParser, aiter_items
+from formstack.pagination import (
+    aiter_pages,
+    aiter_scim_pages,
+    aiter_scim_stream_pages,
+    aiter_stream_pages,
+)
+from formstack.transport import AsyncTransport
+
+# The async clients inherit every endpoint method from their blocking
+# counterparts: those methods return ``self.get(...)``/``self.post(...)``, which
+# here return a coroutine from the async ``_do``. Only methods that post-process
+# a response need an async override.
+
+
+class _AsyncClient:
+    # The asyncio send steps; request preparation and response handling are
+    # the BaseClient helpers the blocking clients use
+    def __init__(
+        self,
+        *args,
+        transport: AsyncTransport = None,
+        max_concurrency: int = 50,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self._transport = transport or AsyncTransport()
+        self._owns_transport = transport is None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        if self._flight is not None and not isinstance(self._flight, AsyncSingleFlight):
+            raise TypeError("coalesce must be an AsyncSingleFlight for the async clients")
+
+    async def aclose(self):
+        if self._owns_transport:
+            await self._transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _do(
+        self,
+        http_method: str,
+        endpoint: str,
+        params: Dict = None,
+        data: Dict = None,
+        enc_password: str = "",
+        cache: bool = True,
+    ):
+        call = self._prepare(http_method, endpoint, params, data, enc_password, cache)
+        if call.hit:
+            return self._cached_result(endpoint, call.cached)
+        self._begin(call)
+        try:
+            async with self._semaphore:
+                response = await self._transport.request(**self._request_args(call))
+        except requests.exceptions.RequestException as e:
+            raise self._request_failed(call, e) from e
+        except BaseException as e:
+            self._finish(call, error=e)
+            raise
+        return self._complete(call, response)
+
+    async def _stream(
+        self,
+        endpoint: str,
+        key: str,
+        params: Dict = None,
+        enc_password: str = "",
+        parser: ArrayParser = None,
+    ):
+        call = self._prepare("GET", endpoint, params, enc_password=enc_password, cache=False)
+        self._begin(call, stream=True)
+        try:
+            # Only the request holds a concurrency slot, not reading the body
+            async with self._semaphore:
+                response = await self._transport.request(stream=True, **self._request_args(call))
+        except requests.exceptions.RequestException as e:
+            raise self._request_failed(call, e) from e
+        except BaseException as e:
+            self._finish(call, error=e)
+            raise
+        try:
+            self._check_stream(response)
+            async for item in aiter_items(
+                acount_bytes(response.aiter_bytes(STREAM_CHUNK_SIZE), call.trace),
+                key,
+                self._stream_wrapper(endpoint),
+                parser,
+            ):
+                yield item
+        finally:
+            await response.aclose()
+            self._finish(call, response, streamed=True)
+
+
+class AsyncFormsClient(_AsyncClient, FormsClient):
+    # Forms
+    def iter_forms(
+        self,
+        params: Dict = None,
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        params = dict({"folders": "false"}, **(params or {}))
+        if stream:
+            return aiter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    "form.json", "forms", page_params, parser=parser
+                ),
+                key="forms",
+                params=params,
+                per_page=per_page,
+            )
+        return aiter_pages(
+            lambda page_params: self.get_form(params=page_params),
+            key="forms",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
+    # Folders
+    def iter_folders(self, params: Dict = None, per_page: int = 100, prefetch: bool = True):
+        return aiter_pages(
+            lambda page_params: self.get_folder(params=page_params),
+            key="folders",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
+    async def folder_index(self, max_age: float = 300) -> FolderIndex:
+        index = FolderIndex(self, max_age=max_age)
+        await index.arefresh(force=True)
+        return index
+
+    # Form Submissions
+    def iter_form_submissions(
+        self,
+        id: int = "",
+        params: Dict = None,
+        enc_password: str = "",
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        if stream:
+            return aiter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    f"form/{id}/submission.json",
+                    "submissions",
+                    page_params,
+                    enc_password,
+                    parser,
+                ),
+                key="submissions",
+                params=params,
+                per_page=per_page,
+            )
+        return aiter_pages(
+            lambda page_params: self.get_form_submissions(
+                id=id, params=page_params, enc_password=enc_password
+            ),
+            key="submissions",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
+    # Download
+    async def download_file(
+        self,
+        id: int,
+        field_id: int,
+        dest,
+        enc_password: str = "",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        resume: bool = True,
+    ) -> int:
+        target = Destination(dest, resume=resume)
+        try:
+            async with self._semaphore:
+                response = await self._transport.request(
+                    stream=True, **self._download_request(id, field_id, target, enc_password)
+                )
+                try:
+                    with target:
+                        if target.begin(response):
+                            async for chunk in self._transport.aiter_bytes(response, chunk_size):
+                                target.write(chunk)
+                finally:
+                    await response.aclose()
+        except requests.exceptions.RequestException as e:
+            self._logger.error(msg=(str(e)))
+            raise FormstackException("Reqest failed from e") from e
+        return target.written
+
+    def download_files(
+        self,
+        items: Iterable[Tuple[int, int, str]],
+        workers: int = 4,
+        enc_password: str = "",
+        resume: bool = True,
+    ) -> AsyncBulkRun:
+        return AsyncBulkRun(
+            lambda item: self.download_file(
+                item[0], item[1], item[2], enc_password=enc_password, resume=resume
+            ),
+            items,
+            workers=workers,
+        )
+
+    # Partial Submissions
+    def iter_form_partial_submissions(
+        self,
+        id: int = "",
+        params: Dict = None,
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        if stream:
+            return aiter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    f"form/{id}/partialsubmission.json",
+                    "partial_submissions",
+                    page_params,
+                    parser=parser,
+                ),
+                key="partial_submissions",
+                params=params,
+                per_page=per_page,
+            )
+        return aiter_pages(
+            lambda page_params: self.get_form_partial_submissions(
+                id=id, params=page_params
+            ),
+            key="partial_submissions",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
+    # Smartlists
+    def iter_smartlist_options(self, id: int, params: Dict = None, per_page: int = 100):
+        return aiter_pages(
+            lambda page_params: self.get_smartlist_options(id=id, params=page_params),
+            key="options",
+            params=params,
+            per_page=per_page,
+        )
+
+    async def upload_smartlist_options(self, id: int, options: Iterable, **kwargs) -> UploadProgress:
+        return await SmartlistUploader(self, id, **kwargs).arun(options)
+
+
+class AsyncDocsClient(_AsyncClient, _DocsAPI):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._auth = (self._key, self._secret)
+        self._key_flight = AsyncSingleFlight()
+
+    # Documents
+    async def get_document_key(self, id: int):
+        doc = await self.post(endpoint=f"api/documents/{id}")
+        return doc["key"]
+
+    async def get_route_key(self, id: int):
+        route = await self.post(endpoint=f"api/routes/{id}")
+        return route["key"]
+
+    async def _merge_key(self, kind: str, id: int, refresh: bool = False):
+        if not refresh:
+            key = self._cached_key(kind, id)
+            if key is not None:
+                return key
+        fetch = self.get_document_key if kind == "document" else self.get_route_key
+
+        async def load():
+            return self._remember_key(kind, id, await fetch(id=id))
+
+        return await self._key_flight.do((kind, str(id)), load)
+
+    async def merge_document(self, id: int, data: Dict):
+        key = await self._merge_key("document", id)
+        result = await self.post(endpoint=f"merge/{id}/{key}", data=data)
+        if _is_stale_key_error(result):
+            key = await self._merge_key("document", id, refresh=True)
+            result = await self.post(endpoint=f"merge/{id}/{key}", data=data)
+        return result
+
+    def merge_many(
+        self,
+        items: Iterable[Tuple[int, Dict]],
+        workers: int = 8,
+        ordered: bool = False,
+        route: bool = False,
+    ) -> AsyncBulkRun:
+        merge = self.merge_data_route if route else self.merge_document
+        return AsyncBulkRun(
+            lambda item: merge(item[0], item[1]),
+            items,
+            workers=workers,
+            ordered=ordered,
+        )
+
+    async def merge_data_route(self, id: int, data: Dict = None):
+        key = await self._merge_key("route", id)
+        result = await self.post(endpoint=f"route/{id}/{key}", data=data)
+        if _is_stale_key_error(result):
+            key = await self._merge_key("route", id, refresh=True)
+            result = await self.post(endpoint=f"route/{id}/{key}", data=data)
+        return result
+
+
+class AsyncFormsSCIM(_AsyncClient, FormsSCIM):
+    def _iter(self, endpoint: str, params: Dict, count: int, workers: int, stream: bool, cache: bool = True):
+        if stream:
+            return aiter_scim_stream_pages(
+                lambda page_params, parser: self._stream(endpoint, "Resources", page_params, parser=parser),
+                params=params,
+                count=count,
+            )
+        return aiter_scim_pages(
+            lambda page_params: self.get(endpoint=endpoint, params=page_params, cache=cache),
+            params=params,
+            count=count,
+            workers=workers,
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+from formstack.exceptions import FormstackException
+
+
+class BulkResult:
+    __slots__ = ("index", "item", "result", "error", "elapsed")
+
+    def __init__(self, index: int, item, result=None, error: Exception = None, elapsed: float = 0.0):
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        outcome = "ok" if self.ok else f"error={self.error!r}"
+        return f"BulkResult(index={self.index}, {outcome}, elapsed={self.elapsed:.3f})"
+
+
+class BulkStats:
+    """Success/failure and latency counters for a bulk run."""
+
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, result: BulkResult):
+        with self._lock:
+            if result.ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            self.latency_total += result.elapsed
+            self.latency_max = max(self.latency_max, result.elapsed)
+
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+
+    @property
+    def latency_mean(self) -> float:
+        return self.latency_total / self.completed if self.completed else 0.0
+
+    @property
+    def throughput(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f"BulkStats(succeeded={self.succeeded}, failed={self.failed}, "
+            f"latency_mean={self.latency_mean:.3f}, latency_max={self.latency_max:.3f}, "
+            f"throughput={self.throughput:.1f}/s)"
+        )
+
+
+def _outcome(index: int, item, result, start: float) -> BulkResult:
+    elapsed = time.monotonic() - start
+    if isinstance(result, str):
+        # The clients return HTTP errors as a message string
+        return BulkResult(index, item, error=FormstackException(result), elapsed=elapsed)
+    return BulkResult(index, item, result=result, elapsed=elapsed)
+
+
+def _call(fn: Callable, index: int, item) -> BulkResult:
+    start = time.monotonic()
+    try:
+        result = fn(item)
+    except Exception as e:
+        return BulkResult(index, item, error=e, elapsed=time.monotonic() - start)
+    return _outcome(index, item, result, start)
+
+
+class BulkRun:
+    """Apply ``fn`` to every item on a bounded thread pool.
+
+    Items are pulled from ``items`` only as workers free up, so at most
+    ``max_pending`` (twice ``workers`` by default) are held at a time. Iterate
+    the run to get a :class:`BulkResult` per item, in completion order or,
+    with ``ordered``, in input order. ``stats`` is updated as results arrive.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[Any], Any],
+        items: Iterable,
+        workers: int = 8,
+        ordered: bool = False,
+        max_pending: int = None,
+    ):
+        self.fn = fn
+        self.items = items
+        self.workers = workers
+        self.ordered = ordered
+        self.max_pending = max_pending or workers * 2
+        self.stats = BulkStats()
+
+    def __iter__(self) -> Iterator[BulkResult]:
+        source = enumerate(self.items)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        exhausted = False
+
+        def fill():
+            nonlocal exhausted
+            while not exhausted and len(pending) < self.max_pending:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    return
+                pending.append(executor.submit(_call, self.fn, index, item))
+
+        try:
+            fill()
+            while pending:
+                if self.ordered:
+                    future = pending.popleft()
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = next(f for f in pending if f in finished)
+                    pending.remove(future)
+                result = future.result()
+                self.stats.record(result)
+                fill()
+                yield result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def _acall(fn: Callable, index: int, item) -> BulkResult:
+    start = time.monotonic()
+    try:
+        result = await fn(item)
+    except Exception as e:
+        return BulkResult(index, item, error=e, elapsed=time.monotonic() - start)
+    return _outcome(index, item, result, start)
+
+
+class AsyncBulkRun(BulkRun):
+    """asyncio version of :class:`BulkRun`; ``fn`` returns an awaitable and
+    ``workers`` bounds the number of tasks in flight. Use ``async for``."""
+
+    def __iter__(self):
+        raise TypeError("AsyncBulkRun must be iterated with 'async for'")
+
+    async def __aiter__(self):
+        source = enumerate(self.items)
+        pending = deque()
+        exhausted = False
+
+        def fill():
+            nonlocal exhausted
+            while not exhausted and len(pending) < self.workers:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    return
+                pending.append(asyncio.ensure_future(_acall(self.fn, index, item)))
+
+        try:
+            fill()
+            while pending:
+                if self.ordered:
+                    future = pending.popleft()
+                    await future
+                else:
+                    finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    future = next(f for f in pending if f in finished)
+                    pending.remove(future)
+                result = future.result()
+                self.stats.record(result)
+                fill()
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
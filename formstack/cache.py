@@ -0,0 +1,433 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlencode
+from formstack.jsonstream import loads
+
+# Endpoint patterns (matched against the endpoint passed to get()) and how long
+# their responses stay fresh, in seconds. Only metadata is cached by default;
+# submissions are never cached unless a pattern for them is added.
+DEFAULT_TTLS = {
+    # FormsClient
+    r"form(/\d+/(basic|html)?)?\.json": 300,
+    r"form/\d+/field\.json": 300,
+    r"field/\d+\.json": 300,
+    r"folder(/\d+)?\.json": 300,
+    r"smartlist(/\d+)?": 300,
+    r"smartlist/\d+/option.*": 300,
+    # FormsSCIM
+    r"(Users|Groups)(/[^/]+)?": 300,
+    r"(Forms|Folders)(/.*)?": 300,
+    # DocsClient
+    r"api/(documents|routes)(/\d+)?": 300,
+}
+
+# Writes to one kind of resource that change cached responses of another
+RELATED = {
+    "field": (r"form/\d+/field\.json",),
+    # A SCIM bulk request may create, change or delete any user or group
+    "Bulk": (r"Users(/[^/]+)?", r"Groups(/[^/]+)?"),
+}
+
+# Endpoint bounds for the backends: the endpoints starting with a prefix, and
+# exactly one endpoint
+_LAST = "\U0010ffff"
+Range = Tuple[str, str]
+
+
+def _prefix(prefix: str) -> Range:
+    return prefix, prefix + _LAST
+
+
+def _exact(endpoint: str) -> Range:
+    return endpoint, endpoint + "\0"
+
+
+# The literal start of a pattern, up to the first special character
+_LITERAL = re.compile(r"[^\\.^$*+?{}\[\]|()]*")
+# The first path segment of a pattern: a word or a group of alternative words,
+# followed by something that cannot continue the word
+_KIND = re.compile(r"(?:\((?P<alternatives>\w+(?:\|\w+)*)\)|(?P<word>\w+))(?P<rest>.*)", re.S)
+_KIND_END = ("/", "\\.", "(/", "(\\.", "(?:/", "(?:\\.")
+
+
+def _pattern_kinds(pattern: str) -> Optional[Set[str]]:
+    # Kinds of endpoint (first path segment) a pattern can match, or None
+    # when that cannot be told
+    match = _KIND.fullmatch(pattern)
+    if match is None or (match["rest"] and not match["rest"].startswith(_KIND_END)):
+        return None
+    return set((match["alternatives"] or match["word"]).split("|"))
+
+
+class CacheEntry:
+    __slots__ = ("endpoint", "body", "etag", "last_modified", "expires")
+
+    def __init__(self, endpoint, body, etag=None, last_modified=None, expires=0.0):
+        self.endpoint = endpoint
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.endpoint) + 64
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class MemoryBackend:
+    """LRU store bounded by entry count and total body size."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def delete(self, match: Callable[[str], bool], ranges: Iterable[Range] = None):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if match(e.endpoint)]:
+                self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class SQLiteBackend:
+    """Single-file store shared by threads and worker processes.
+
+    Bodies larger than ``compress_over`` bytes are zlib-compressed. Entries
+    survive restarts, so a new process starts with a warm cache. Once more
+    than ``max_entries`` entries or ``max_bytes`` of bodies are stored, the
+    least recently used entries are dropped; the check runs every
+    ``evict_every`` writes. Reads record their access time in batches of
+    ``touch_every``, so recency is approximate: reads not yet written when
+    a process exits are lost.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        compress_over: int = 1024,
+        evict_every: int = 32,
+        touch_every: int = 64,
+        timeout: float = 30.0,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress_over = compress_over
+        self.evict_every = evict_every
+        self.touch_every = touch_every
+        self.timeout = timeout
+        self.evictions = 0
+        self._writes = 0
+        self._reads = 0
+        self._touched: Dict[str, float] = {}
+        self._touch_lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, endpoint TEXT, body BLOB, compressed INTEGER,"
+                " etag TEXT, last_modified TEXT, expires REAL, size INTEGER,"
+                " accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_endpoint ON cache (endpoint)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not
+        # cross a fork)
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn = conn
+            local.pid = os.getpid()
+        return local.conn
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    @property
+    def bytes(self) -> int:
+        row = self._connect().execute("SELECT SUM(size) FROM cache").fetchone()
+        return row[0] or 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT endpoint, body, compressed, etag, last_modified, expires"
+            " FROM cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        with self._touch_lock:
+            self._touched[key] = time.time()
+            self._reads += 1
+            flush = self._reads % self.touch_every == 0
+        if flush:
+            self.flush()
+        endpoint, body, compressed, etag, last_modified, expires = row
+        if compressed:
+            body = zlib.decompress(body)
+        return CacheEntry(endpoint, body, etag, last_modified, expires)
+
+    def set(self, key: str, entry: CacheEntry):
+        body = entry.body
+        compressed = len(body) > self.compress_over
+        if compressed:
+            body = zlib.compress(body)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    entry.endpoint,
+                    body,
+                    int(compressed),
+                    entry.etag,
+                    entry.last_modified,
+                    entry.expires,
+                    len(body),
+                    time.time(),
+                ),
+            )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def flush(self):
+        """Write the access times of the reads since the last flush."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "UPDATE cache SET accessed = ? WHERE key = ?",
+                    [(accessed, key) for key, accessed in touched.items()],
+                )
+
+    def evict(self):
+        self.flush()
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, ROW_NUMBER() OVER w AS n, SUM(size) OVER w AS total"
+                "  FROM cache WINDOW w AS (ORDER BY accessed DESC, key))"
+                " WHERE n > ? OR total > ?)",
+                (self.max_entries, self.max_bytes),
+            )
+        self.evictions += cursor.rowcount
+
+    def delete(self, match: Callable[[str], bool], ranges: Iterable[Range] = None):
+        """Delete the entries whose endpoint ``match`` accepts. ``ranges``
+        bound the endpoints to test, read through the endpoint index."""
+        conn = self._connect()
+        if ranges is None:
+            rows = conn.execute("SELECT key, endpoint FROM cache").fetchall()
+        else:
+            rows = []
+            for low, high in set(ranges):
+                rows += conn.execute(
+                    "SELECT key, endpoint FROM cache WHERE endpoint >= ? AND endpoint < ?",
+                    (low, high),
+                ).fetchall()
+        keys = [(key,) for key, endpoint in set(rows) if match(endpoint)]
+        if keys:
+            with conn:
+                conn.executemany("DELETE FROM cache WHERE key = ?", keys)
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache")
+
+
+def credential_id(*secrets: str) -> str:
+    """Short fingerprint of credentials for cache and coalescing keys."""
+    return hashlib.sha256("\0".join(secrets).encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Opt-in cache for GET responses of the Formstack clients.
+
+    ``ttls`` maps endpoint regexes to a freshness lifetime in seconds;
+    endpoints that match no pattern are only cached when ``default_ttl`` is
+    set. Stale entries with an ETag or Last-Modified are revalidated with a
+    conditional request. Writes invalidate cached responses for the same
+    resource. Entries live in ``backend``, a :class:`MemoryBackend` unless
+    another one (e.g. :class:`SQLiteBackend`) is given.
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float] = None,
+        default_ttl: float = None,
+        backend=None,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        ttls = DEFAULT_TTLS if ttls is None else ttls
+        self._ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls.items()]
+        self.default_ttl = default_ttl
+        # Kinds of endpoint that can be cached at all; None when any can
+        self._kinds = None
+        if default_ttl is None:
+            kinds = [_pattern_kinds(pattern) for pattern in ttls]
+            if None not in kinds:
+                self._kinds = set().union(*kinds)
+        self.backend = backend if backend is not None else MemoryBackend(max_entries, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+    def ttl(self, endpoint: str) -> Optional[float]:
+        for pattern, ttl in self._ttls:
+            if pattern.fullmatch(endpoint):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def key(url: str, params: Dict = None, enc_password: str = "", credential_id: str = "") -> str:
+        """``credential_id`` is a fingerprint of the client's token or API key
+        (see :func:`credential_id`), so clients of different accounts sharing
+        the cache never read each other's entries."""
+        key = url
+        if params:
+            key += "?" + urlencode(sorted(params.items()), doseq=True)
+        if enc_password:
+            # Never keep the password itself, only tell entries apart
+            key += "#" + hashlib.sha256(enc_password.encode()).hexdigest()[:16]
+        if credential_id:
+            key += "@" + credential_id
+        return key
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    @staticmethod
+    def load(entry: CacheEntry):
+        return loads(entry.body)
+
+    def store(self, key: str, endpoint: str, response):
+        ttl = self.ttl(endpoint)
+        if not ttl:
+            return
+        self.backend.set(
+            key,
+            CacheEntry(
+                endpoint,
+                response.content,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                time.time() + ttl,
+            ),
+        )
+
+    def refresh(self, key: str, entry: CacheEntry):
+        # The server answered 304 Not Modified
+        with self._lock:
+            self.revalidated += 1
+        entry.expires = time.time() + (self.ttl(entry.endpoint) or 0)
+        self.backend.set(key, entry)
+
+    def invalidate(self, endpoint: str):
+        parts = endpoint.split(".json")[0].split("/")
+        kind = parts[0]
+        patterns = RELATED.get(kind, ())
+        if self._kinds is not None and kind not in self._kinds and not patterns:
+            # A write to something that is never cached, e.g. a submission
+            return
+        prefix = "/".join(parts[:2])
+        related = [re.compile(p) for p in patterns]
+
+        def match(cached: str) -> bool:
+            base = cached.split(".json")[0]
+            if base == kind or any(p.fullmatch(cached) for p in related):
+                return True
+            return len(parts) > 1 and (base == prefix or base.startswith(prefix + "/"))
+
+        ranges = [_exact(kind), _prefix(kind + ".json")]
+        if len(parts) > 1:
+            ranges += [_exact(prefix), _prefix(prefix + ".json"), _prefix(prefix + "/")]
+        ranges += [_prefix(_LITERAL.match(p).group()) for p in patterns]
+        self.backend.delete(match, ranges)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "entries": len(self.backend),
+        }
@@ -0,0 +1,258 @@
+import logging
+from json import JSONDecodeError
+from typing import Dict
+import requests
+from formstack import exceptions
+from formstack.coalesce import request_key
+from formstack.exceptions import FormstackException
+from formstack.instrumentation import count_bytes
+from formstack.jsonstream import STREAM_CHUNK_SIZE, ArrayParser, iter_items, loads
+from formstack.models import model_for, wrap, wrap_body
+
+ENCRYPTION_HEADER = "X-FS-ENCRYPTION-PASSWORD"
+
+
+class _Call:
+    # One request as it goes through the shared preparation and completion
+    # steps; only the send in between differs between the blocking and
+    # asyncio clients
+    __slots__ = ("method", "endpoint", "url", "params", "data", "headers", "cache_key", "cached", "trace")
+
+    def __init__(self, method: str, endpoint: str, url: str, params: Dict, data, headers: Dict):
+        self.method = method
+        self.endpoint = endpoint
+        self.url = url
+        self.params = params
+        self.data = data
+        self.headers = headers
+        self.cache_key = None
+        self.cached = None
+        self.trace = None
+
+    @property
+    def hit(self) -> bool:
+        return self.cached is not None and self.cached.fresh
+
+
+def _reason(response) -> str:
+    # requests calls it reason, httpx reason_phrase
+    return getattr(response, "reason_phrase", None) or getattr(response, "reason", "")
+
+
+class BaseClient:
+    """Request and response handling shared by the Forms, Documents and SCIM
+    clients.
+
+    Subclasses set ``url``, ``_headers`` and the options below in their
+    constructor and add the endpoint methods. ``_do`` and ``_stream`` are the
+    only methods the asyncio clients replace; everything around the send
+    (cache, instrumentation, error handling, models) lives in the helpers
+    they share.
+    """
+
+    _auth = None
+    _credential_id = ""
+    _cache = None
+    _instrumentation = None
+    _flight = None
+    _models = False
+    # Whether the client created its transport; the shared default transport
+    # and one passed in are left open for the other clients using them
+    _owns_transport = False
+
+    def close(self):
+        if self._owns_transport:
+            self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get(self, endpoint: str, params: Dict = None, enc_password: str = "", cache: bool = True):
+        # cache=False always reads from the server, so it is not coalesced
+        # with a request that may be answered from the cache
+        if self._flight is not None and cache:
+            # Identical GETs in flight at the same time share one request
+            return self._flight.do(
+                request_key("GET", self.url + endpoint, params, enc_password, self._credential_id),
+                lambda: self._do("GET", endpoint, params=params, enc_password=enc_password),
+            )
+        return self._do("GET", endpoint, params=params, enc_password=enc_password, cache=cache)
+
+    def _result(self, endpoint: str, data):
+        return wrap(endpoint, data) if self._models else data
+
+    def _cached_result(self, endpoint: str, entry):
+        if self._models:
+            model = wrap_body(endpoint, entry.body)
+            if model is not None:
+                return model
+        return self._result(endpoint, self._cache.load(entry))
+
+    def _stream_wrapper(self, endpoint: str):
+        route = model_for(endpoint) if self._models else None
+        return route[1] if route else None
+
+    def _prepare(
+        self,
+        http_method: str,
+        endpoint: str,
+        params: Dict = None,
+        data: Dict = None,
+        enc_password: str = "",
+        cache: bool = True,
+    ) -> _Call:
+        headers = self._headers
+        if enc_password != "":
+            headers = dict(headers)
+            headers[ENCRYPTION_HEADER] = enc_password
+        call = _Call(http_method, endpoint, self.url + endpoint, params, data, headers)
+        if cache and self._cache is not None and http_method == "GET":
+            call.cache_key = self._cache.key(call.url, params, enc_password, self._credential_id)
+            call.cached = self._cache.lookup(call.cache_key)
+            if call.cached is not None and not call.cached.fresh:
+                call.headers = dict(headers, **call.cached.validators())
+        return call
+
+    def _begin(self, call: _Call, stream: bool = False):
+        if self._instrumentation is not None:
+            call.trace = self._instrumentation.start(call.method, call.endpoint, call.url)
+        if stream:
+            self._logger.debug("method=%s, url=%s, params=%s, stream=True", call.method, call.url, call.params)
+        else:
+            self._logger.debug("method=%s, url=%s, params=%s", call.method, call.url, call.params)
+
+    def _request_args(self, call: _Call) -> Dict:
+        args = dict(
+            method=call.method,
+            url=call.url,
+            verify=self._ssl_verify,
+            headers=call.headers,
+            params=call.params,
+            json=call.data,
+            rate_limiter=self._rate_limiter,
+            retry=self._retry,
+            trace=call.trace,
+        )
+        if self._auth is not None:
+            args["auth"] = self._auth
+        return args
+
+    def _finish(self, call: _Call, response=None, error: BaseException = None, streamed: bool = False):
+        if call.trace is not None:
+            self._instrumentation.finish(call.trace, response, error=error, streamed=streamed)
+
+    def _request_failed(self, call: _Call, error: Exception) -> FormstackException:
+        self._finish(call, error=error)
+        self._logger.error(msg=(str(error)))
+        return FormstackException("Reqest failed from e")
+
+    def _complete(self, call: _Call, response):
+        # Turn a response into the client's return value
+        self._finish(call, response)
+        status = response.status_code
+        if status == 429:
+            self._logger.error(msg=status)
+            raise exceptions.RateLimitException(exceptions.detect_http_error(response))
+        if self._cache is not None:
+            if call.method != "GET":
+                self._cache.invalidate(call.endpoint)
+            elif call.cached is not None and status == 304:
+                self._cache.refresh(call.cache_key, call.cached)
+                return self._cached_result(call.endpoint, call.cached)
+        if status == 204:
+            # DELETE (and PATCH on some servers) answer with no body
+            return None
+        is_success = 299 >= status >= 200
+        # A single object is handed to its model undecoded when models are on
+        model = wrap_body(call.endpoint, response.content) if self._models and is_success else None
+        if model is None:
+            # Deserialize JSON output to Python object, or raise on a body that is not JSON
+            try:
+                data_out = loads(response.content)
+            except (ValueError, JSONDecodeError) as e:
+                self._logger.error(
+                    "method=%s, url=%s, params=%s, success=False, status_code=None, message=%s",
+                    call.method, call.url, call.params, e,
+                )
+                raise FormstackException("Bad JSON in response") from e
+        # Formatted by logging only if the record is emitted
+        self._logger.log(
+            logging.DEBUG if is_success else logging.ERROR,
+            "method=%s, url=%s, params=%s, success=%s, status_code=%s, message=%s",
+            call.method, call.url, call.params, is_success, status, _reason(response),
+        )
+        if is_success:
+            if call.cache_key is not None:
+                self._cache.store(call.cache_key, call.endpoint, response)
+            return model if model is not None else self._result(call.endpoint, data_out)
+        return self._failure(response)
+
+    def _failure(self, response):
+        # What a non-2xx response returns; the Forms and Documents clients
+        # return the error message
+        return exceptions.detect_http_error(response)
+
+    def _check_stream(self, response):
+        if response.status_code == 429:
+            raise exceptions.RateLimitException(exceptions.detect_http_error(response))
+        if not 299 >= response.status_code >= 200:
+            self._logger.error(msg=response.status_code)
+            raise FormstackException(exceptions.detect_http_error(response))
+
+    def _do(
+        self,
+        http_method: str,
+        endpoint: str,
+        params: Dict = None,
+        data: Dict = None,
+        enc_password: str = "",
+        cache: bool = True,
+    ):
+        call = self._prepare(http_method, endpoint, params, data, enc_password, cache)
+        if call.hit:
+            return self._cached_result(endpoint, call.cached)
+        self._begin(call)
+        try:
+            response = self._transport.request(**self._request_args(call))
+        except requests.exceptions.RequestException as e:
+            raise self._request_failed(call, e) from e
+        except BaseException as e:
+            # Raised before anything is sent (an open circuit breaker, an
+            # exhausted daily budget) or a cancellation; still ends the trace
+            self._finish(call, error=e)
+            raise
+        return self._complete(call, response)
+
+    def _stream(
+        self,
+        endpoint: str,
+        key: str,
+        params: Dict = None,
+        enc_password: str = "",
+        parser: ArrayParser = None,
+    ):
+        # GET a list endpoint and yield its items while the body downloads;
+        # the response cache is bypassed
+        call = self._prepare("GET", endpoint, params, enc_password=enc_password, cache=False)
+        self._begin(call, stream=True)
+        try:
+            response = self._transport.request(stream=True, **self._request_args(call))
+        except requests.exceptions.RequestException as e:
+            raise self._request_failed(call, e) from e
+        except BaseException as e:
+            self._finish(call, error=e)
+            raise
+        try:
+            self._check_stream(response)
+            yield from iter_items(
+                count_bytes(response.iter_content(STREAM_CHUNK_SIZE), call.trace),
+                key,
+                self._stream_wrapper(endpoint),
+                parser,
+            )
+        finally:
+            response.close()
+            self._finish(call, response, streamed=True)
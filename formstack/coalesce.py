@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+def request_key(
+    method: str, url: str, params: Dict = None, enc_password: str = "", credential_id: str = ""
+) -> tuple:
+    """Key under which identical requests are coalesced.
+
+    ``url`` includes the host and ``credential_id`` fingerprints the client's
+    credentials (see :func:`formstack.cache.credential_id`), so clients of
+    different hosts or accounts sharing a flight never share a response.
+    """
+    params_key = tuple(sorted((str(k), repr(v)) for k, v in params.items())) if params else ()
+    return method, url, params_key, enc_password, credential_id
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its outcome.
+
+    ``executed`` counts the calls actually made and ``saved`` the callers
+    that got the outcome of another one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.saved = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"executed": self.executed, "saved": self.saved, "in_flight": len(self._calls)}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.saved += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """asyncio version of :class:`SingleFlight` for use within one event loop.
+
+    The call runs in its own task, so a caller that is cancelled stops
+    waiting without cancelling it for the others; it is cancelled only once
+    every caller has gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _AsyncCall] = {}
+        self.executed = 0
+        self.saved = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"executed": self.executed, "saved": self.saved, "in_flight": len(self._calls)}
+
+    async def do(self, key: Hashable, fn: Callable[[], Any]):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+            self.executed += 1
+        else:
+            self.saved += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _AsyncCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -1,14 +1,30 @@
+import time
 import requests
 import requests.packages
 from requests.auth import HTTPBasicAuth
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 from . import exceptions
-from json import JSONDecodeError
-from formstack.models import Result
+from formstack.bulk import BulkRun
+from formstack.cache import ResponseCache, credential_id
+from formstack.client import BaseClient
+from formstack.coalesce import SingleFlight
+from formstack.instrumentation import Instrumentation
+from formstack.ratelimit import RateLimiter
+from formstack.retry import RetryPolicy
+from formstack.transport import Transport, default_transport
 import logging
 
+# Error messages (see exceptions.detect_http_error) returned when a merge is
+# rejected, which is what a stale document or route key looks like
+STALE_KEY_ERRORS = ("Unauthorized", "Forbidden", "Not Found")
 
-class DocsClient:
+
+def _is_stale_key_error(result) -> bool:
+    return isinstance(result, str) and result.startswith(STALE_KEY_ERRORS)
+
+
+class _DocsAPI(BaseClient):
+    # The Documents endpoints shared by DocsClient and AsyncDocsClient
     def __init__(
         self,
         hostname: str = "www.webmerge.me",
@@ -16,22 +32,43 @@ class DocsClient:
         api_key: str = "",
         ssl_verify: bool = True,
         logger: logging.Logger = None,
+        transport: Transport = None,
+        scheme: str = "https",
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        cache: ResponseCache = None,
+        key_ttl: float = 3600,
+        models: bool = False,
+        instrumentation: Instrumentation = None,
+        coalesce: SingleFlight = None,
     ):
         self._logger = logger or logging.getLogger(__name__)
-        self.url = "https://{}/".format(hostname)
+        self.url = "{}://{}/".format(scheme, hostname)
         self._secret = api_secret
         self._key = api_key
+        self._credential_id = credential_id(api_key, api_secret)
         self._ssl_verify = ssl_verify
+        self._transport = transport or default_transport()
+        self._rate_limiter = rate_limiter
+        self._retry = retry
+        self._cache = cache
+        self._models = models
+        self._instrumentation = instrumentation
+        self._flight = coalesce
+        self._key_ttl = key_ttl
+        self._merge_keys = {}
+        self._key_flight = SingleFlight()
+        self._auth = HTTPBasicAuth(self._key, self._secret)
+        self._headers = {
+            "content-type": "application/json",
+            "accept": "application/json",
+        }
         if not ssl_verify:
             # noinspection PyUnresolvedReferences
             requests.packages.urllib3.disable_warnings()
 
     def get(self, endpoint: str, enc_password: str = "", params: Dict = None):
-        return self._do(
-            http_method="GET",
-            endpoint=endpoint,
-            params=params,
-        )
+        return self._get(endpoint, params)
 
     def post(
         self,
@@ -62,54 +99,6 @@ class DocsClient:
             data=data,
         )
 
-    def _do(
-        self,
-        http_method: str,
-        endpoint: str,
-        params: Dict = None,
-        data: Dict = None,
-    ):
-        full_url = self.url + endpoint
-        headers = {
-            "content-type": "application/json",
-            "accept": "application/json",
-        }
-
-        log_line_pre = f"method={http_method}, url={full_url}, params={params}"
-        log_line_post = ", ".join(
-            (log_line_pre, "success={}, status_code={}, message={}")
-        )
-        # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions
-        try:
-            self._logger.debug(msg=log_line_pre)
-            response = requests.request(
-                auth=HTTPBasicAuth(self._key, self._secret),
-                method=http_method,
-                url=full_url,
-                verify=self._ssl_verify,
-                params=params,
-                json=data,
-            )
-        except requests.exceptions.RequestException as e:
-            self._logger.error(msg=(str(e)))
-            raise Exception("Reqest failed from e")
-        # Deserialize JSON output to Python object, or return failed Result on exception
-        try:
-            data_out = response.json()
-        except (ValueError, JSONDecodeError) as e:
-            # self._logger.error(msg=log_line_post.format(False, None, e))
-            raise Exception("Bad JSON in response") from e
-        # If status_code in 200-299 range, return success Result with data, otherwise raise exception
-        is_success = 299 >= response.status_code >= 200
-        log_line = log_line_post.format(
-            is_success, response.status_code, response.reason
-        )
-        if is_success:  # OK
-            self._logger.debug(msg=log_line)
-            return data_out
-        self._logger.error(msg=log_line)
-        return exceptions.detect_http_error(response)
-
     # Documents
     def get_document_key(self, id: int):
         doc = self.post(endpoint=f"api/documents/{id}")
@@ -119,6 +108,32 @@ class DocsClient:
         route = self.post(endpoint=f"api/routes/{id}")
         return route["key"]
 
+    def _cached_key(self, kind: str, id: int):
+        cached = self._merge_keys.get((kind, str(id)))
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        return None
+
+    def _remember_key(self, kind: str, id: int, key: str):
+        if self._key_ttl:
+            self._merge_keys[(kind, str(id))] = (key, time.monotonic() + self._key_ttl)
+        return key
+
+    def _merge_key(self, kind: str, id: int, refresh: bool = False):
+        # Keys are cached for key_ttl seconds; concurrent lookups for the same
+        # id share one request
+        if not refresh:
+            key = self._cached_key(kind, id)
+            if key is not None:
+                return key
+        fetch = self.get_document_key if kind == "document" else self.get_route_key
+        return self._key_flight.do(
+            (kind, str(id)), lambda: self._remember_key(kind, id, fetch(id=id))
+        )
+
+    def forget_merge_keys(self):
+        self._merge_keys.clear()
+
     def get_document(self, id: int = "", detail: str = ""):
         urlpath = ""
         if id != "":
@@ -143,8 +158,27 @@ class DocsClient:
         return self.post(endpoint=f"api/documents/{id}/deliveries", data=data)
 
     def merge_document(self, id: int, data: Dict):
-        key = self.get_document_key(id=id)
-        return self.post(endpoint=f"merge/{id}/{key}", data=data)
+        key = self._merge_key("document", id)
+        result = self.post(endpoint=f"merge/{id}/{key}", data=data)
+        if _is_stale_key_error(result):
+            key = self._merge_key("document", id, refresh=True)
+            result = self.post(endpoint=f"merge/{id}/{key}", data=data)
+        return result
+
+    def merge_many(
+        self,
+        items: Iterable[Tuple[int, Dict]],
+        workers: int = 8,
+        ordered: bool = False,
+        route: bool = False,
+    ) -> BulkRun:
+        merge = self.merge_data_route if route else self.merge_document
+        return BulkRun(
+            lambda item: merge(item[0], item[1]),
+            items,
+            workers=workers,
+            ordered=ordered,
+        )
 
     def get_data_route(self, id: int = "", detail: str = ""):
         urlpath = ""
@@ -159,8 +193,12 @@ class DocsClient:
         return self.put(endpoint=f"api/routes/{id}", data=data)
 
     def merge_data_route(self, id: int, data: Dict = None):
-        key = self.get_route_key(id=id)
-        return self.post(endpoint=f"route/{id}/{key}", data=data)
+        key = self._merge_key("route", id)
+        result = self.post(endpoint=f"route/{id}/{key}", data=data)
+        if _is_stale_key_error(result):
+            key = self._merge_key("route", id, refresh=True)
+            result = self.post(endpoint=f"route/{id}/{key}", data=data)
+        return result
 
     def combine_files(self, data: Dict = None):
         return self.post(endpoint=f"api/tools/combine", data=data)
@@ -176,3 +214,39 @@ class DocsClient:
 
     def split_pdf(self, data: Dict = None):
         return self.post(endpoint=f"api/tools/split_pdf", data=data)
+
+
+class DocsClient(_DocsAPI):
+    # The PDF pipeline pipes blocking responses between worker threads, so
+    # only the blocking client has it
+    def pdf_pipeline(self, steps, workers: int = 4, retries: int = 2):
+        """:class:`~formstack.pdf_tools.PdfPipeline` streaming files through
+        ``steps`` of the PDF tools."""
+        from formstack.pdf_tools import PdfPipeline
+
+        return PdfPipeline(self, steps, workers=workers, retries=retries)
+
+    def _stream_tool(self, tool: str, body: Iterable[bytes]) -> requests.Response:
+        # POST a generated body to a PDF tool and return the unread response.
+        # The body can only be sent once, so the transport is given neither the
+        # rate limiter nor the retry policy; PdfPipeline retries whole files
+        full_url = self.url + f"api/tools/{tool}"
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        try:
+            self._logger.debug("method=POST, url=%s, stream=True", full_url)
+            response = self._transport.request(
+                auth=self._auth,
+                method="POST",
+                url=full_url,
+                verify=self._ssl_verify,
+                headers=self._headers,
+                data=body,
+                stream=True,
+            )
+        except requests.exceptions.RequestException as e:
+            self._logger.error(msg=(str(e)))
+            raise exceptions.FormstackException("Request failed") from e
+        if self._rate_limiter is not None:
+            self._rate_limiter.update(response.headers)
+        return response
@@ -0,0 +1,67 @@
+import os
+from typing import BinaryIO, Dict, Union
+from formstack.exceptions import FormstackException, RateLimitException, detect_http_error
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class Destination:
+    """Where a streamed download is written.
+
+    ``dest`` is a path or a binary file-like object. A path is written as
+    ``<dest>.part`` and renamed to ``dest`` once the body is complete, so
+    ``dest`` never holds a partial file. With ``resume``, a ``.part`` left by
+    an interrupted download is continued with a ``Range`` request; if the
+    server ignores the range the file is rewritten.
+    """
+
+    def __init__(self, dest: Union[str, os.PathLike, BinaryIO], resume: bool = True):
+        self.dest = dest
+        self.is_path = not hasattr(dest, "write")
+        self.part = os.fspath(dest) + ".part" if self.is_path else None
+        self.offset = 0
+        if self.is_path and resume and os.path.exists(self.part):
+            self.offset = os.path.getsize(self.part)
+        self.written = 0
+        self._file = None
+
+    def range_headers(self) -> Dict[str, str]:
+        if self.offset:
+            return {"Range": f"bytes={self.offset}-"}
+        return {}
+
+    def begin(self, response) -> bool:
+        """Prepare for the body of ``response``; False if there is nothing to write."""
+        status = response.status_code
+        if status == 416 and self.offset:
+            # The partial file is already complete
+            return False
+        if status == 429:
+            raise RateLimitException(detect_http_error(response))
+        if status not in (200, 206):
+            raise FormstackException(detect_http_error(response) or f"{status} server error")
+        if not self.is_path:
+            self._file = self.dest
+        elif status == 206 and self.offset:
+            self._file = open(self.part, "ab")
+        else:
+            self.offset = 0
+            self._file = open(self.part, "wb")
+        return True
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self.written += len(chunk)
+
+    def close(self):
+        if self.is_path and self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close()
+        if exc_type is None and self.is_path and os.path.exists(self.part):
+            os.replace(self.part, self.dest)
@@ -9,6 +9,14 @@ class DocsException(Exception):
     pass
 
 
+class RateLimitException(FormstackException):
+    pass
+
+
+class CircuitOpenException(FormstackException):
+    pass
+
+
 def detect_http_error(response):
     if response.status_code == 401:
         return "Unauthorized - Valid OAuth2 credentials were not supplied"
@@ -28,4 +36,4 @@ def detect_http_error(response):
         )
 
     elif response.status_code >= 400:
-        return response.status_code + " server error"
+        return str(response.status_code) + " server error"
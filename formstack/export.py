@@ -0,0 +1,245 @@
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+from formstack.bulk import BulkRun
+from formstack.exceptions import FormstackException
+from formstack.models import unwrap
+from formstack.sync import Cursor
+
+
+def open_output(path: str, compress: bool = False, append: bool = False):
+    if compress:
+        return gzip.open(path, "at" if append else "wt", encoding="utf-8", newline="")
+    return open(path, "a" if append else "w", encoding="utf-8", newline="")
+
+
+def _has_content(path: str) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def field_values(submission: Dict) -> Dict[str, object]:
+    # Submission data is keyed by field id, as a dict or a list of
+    # {"field": ..., "value": ...} items depending on the endpoint
+    data = submission.get("data") or {}
+    items = data.values() if isinstance(data, dict) else data
+    return {str(item.get("field")): item.get("value") for item in items if isinstance(item, dict)}
+
+
+def _cell(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+
+class NDJSONWriter:
+    def __init__(self, fileobj):
+        self._file = fileobj
+
+    def write(self, form_id, submission: Dict):
+        self._file.write(json.dumps(submission, separators=(",", ":")))
+        self._file.write("\n")
+
+
+class CSVWriter:
+    """One row per submission and one column per field of a single form."""
+
+    def __init__(self, fileobj, field_ids: List[str], header: bool = True):
+        self._writer = csv.writer(fileobj)
+        self.field_ids = [str(f) for f in field_ids]
+        if header:
+            self._writer.writerow(["id", "form", "timestamp"] + self.field_ids)
+
+    def write(self, form_id, submission: Dict):
+        values = field_values(submission)
+        self._writer.writerow(
+            [submission.get("id"), form_id, submission.get("timestamp")]
+            + [_cell(values.get(f)) for f in self.field_ids]
+        )
+
+
+class LongCSVWriter:
+    """One row per field value, so submissions of many forms share a header."""
+
+    def __init__(self, fileobj, header: bool = True):
+        self._writer = csv.writer(fileobj)
+        if header:
+            self._writer.writerow(["form", "id", "timestamp", "field", "value"])
+
+    def write(self, form_id, submission: Dict):
+        head = [form_id, submission.get("id"), submission.get("timestamp")]
+        self._writer.writerows(
+            head + [field, _cell(value)] for field, value in field_values(submission).items()
+        )
+
+
+class ExportStats:
+    def __init__(self):
+        self.forms_done = 0
+        self.forms_failed = 0
+        self.records = 0
+        self.errors = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_records(self, count: int):
+        with self._lock:
+            self.records += count
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f"ExportStats(forms_done={self.forms_done}, forms_failed={self.forms_failed}, "
+            f"records={self.records}, records_per_second={self.records_per_second:.1f})"
+        )
+
+
+class SubmissionExporter:
+    """Export the submissions of many forms in parallel.
+
+    Forms are exported on ``workers`` threads, each paging through one form's
+    submissions and streaming them to ``output``: a directory with one
+    ``<form_id>.ndjson``/``.csv`` file per form, or with ``per_form=False`` a
+    single path or text file object all forms are written to. Memory stays
+    at a couple of pages per worker. ``progress`` is called with the
+    :class:`ExportStats` after every finished form.
+
+    With a cursor ``store`` (see :mod:`formstack.sync`) a rerun exports only
+    the submissions added since the last one: each form is read oldest
+    first from its cursor and the output files are appended to. The cursor
+    is saved every ``per_page`` records once they are flushed, so a failed
+    form resumes from its last save and may repeat the records written
+    after it.
+    """
+
+    def __init__(
+        self,
+        client,
+        output,
+        format: str = "ndjson",
+        compress: bool = False,
+        per_form: bool = True,
+        workers: int = 4,
+        per_page: int = 100,
+        params: Dict = None,
+        enc_password: str = "",
+        progress: Callable[[ExportStats], None] = None,
+        store=None,
+    ):
+        if format not in ("ndjson", "csv"):
+            raise ValueError("format must be 'ndjson' or 'csv'")
+        self.client = client
+        self.output = output
+        self.format = format
+        self.compress = compress
+        self.per_form = per_form
+        self.workers = workers
+        self.per_page = per_page
+        self.params = dict({"data": "true"}, **(params or {}))
+        self.enc_password = enc_password
+        self.progress = progress
+        self.store = store
+        self.stats = None
+        self._lock = threading.Lock()
+
+    def _path(self, form_id) -> str:
+        name = f"{form_id}.{self.format}" + (".gz" if self.compress else "")
+        return os.path.join(self.output, name)
+
+    def _form_writer(self, form_id, fileobj, header: bool = True):
+        if self.format == "ndjson":
+            return NDJSONWriter(fileobj)
+        fields = self.client.get_form_fields(id=form_id)
+        if not isinstance(fields, list):
+            raise FormstackException(fields)
+        return CSVWriter(fileobj, [field["id"] for field in fields], header)
+
+    def _export(self, form_id, write: Callable[[Dict], None], flush: Callable[[], None]) -> int:
+        cursor = None
+        params = self.params
+        if self.store is not None:
+            cursor = self.store.get(form_id) or Cursor()
+            params = dict(params, sort="ASC")
+            if cursor.timestamp:
+                params["min_time"] = cursor.timestamp
+        count = 0
+        for submission in self.client.iter_form_submissions(
+            id=form_id,
+            params=params,
+            enc_password=self.enc_password,
+            per_page=self.per_page,
+        ):
+            # Submission models (models=True) are written as their payload
+            submission = unwrap(submission)
+            if cursor is not None:
+                if cursor.seen(submission):
+                    continue
+                cursor.advance(submission)
+            write(submission)
+            self.stats.add_records(1)
+            count += 1
+            if cursor is not None and count % self.per_page == 0:
+                flush()
+                self.store.set(form_id, cursor)
+        if cursor is not None and count % self.per_page:
+            flush()
+            self.store.set(form_id, cursor)
+        return count
+
+    def _export_to_file(self, form_id) -> int:
+        path = self._path(form_id)
+        append = self.store is not None and _has_content(path)
+        with open_output(path, self.compress, append) as f:
+            writer = self._form_writer(form_id, f, header=not append)
+            return self._export(form_id, lambda s: writer.write(form_id, s), f.flush)
+
+    def _export_to_stream(self, writer, f, form_id) -> int:
+        def write(submission):
+            with self._lock:
+                writer.write(form_id, submission)
+
+        def flush():
+            with self._lock:
+                f.flush()
+
+        return self._export(form_id, write, flush)
+
+    def run(self, form_ids: Iterable = None) -> ExportStats:
+        if form_ids is None:
+            form_ids = (form["id"] for form in self.client.iter_forms())
+        self.stats = ExportStats()
+        if self.per_form:
+            os.makedirs(self.output, exist_ok=True)
+            self._run(self._export_to_file, form_ids)
+            return self.stats
+
+        is_path = not hasattr(self.output, "write")
+        append = is_path and self.store is not None and _has_content(self.output)
+        f = open_output(self.output, self.compress, append) if is_path else self.output
+        try:
+            writer = NDJSONWriter(f) if self.format == "ndjson" else LongCSVWriter(f, header=not append)
+            self._run(lambda form_id: self._export_to_stream(writer, f, form_id), form_ids)
+        finally:
+            if is_path:
+                f.close()
+        return self.stats
+
+    def _run(self, export: Callable, form_ids: Iterable):
+        for result in BulkRun(export, form_ids, workers=self.workers):
+            if result.ok:
+                self.stats.forms_done += 1
+            else:
+                self.stats.forms_failed += 1
+                self.stats.errors[str(result.item)] = result.error
+            if self.progress is not None:
+                self.progress(self.stats)
@@ -1,13 +1,23 @@
 import requests
 import requests.packages
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 from . import exceptions
-from json import JSONDecodeError
-from formstack.models import Result
+from formstack.bulk import BulkRun
+from formstack.cache import ResponseCache, credential_id
+from formstack.client import ENCRYPTION_HEADER, BaseClient
+from formstack.coalesce import SingleFlight
+from formstack.download import DEFAULT_CHUNK_SIZE, Destination
+from formstack.hierarchy import FolderIndex
+from formstack.instrumentation import Instrumentation
+from formstack.pagination import iter_pages, iter_stream_pages
+from formstack.ratelimit import RateLimiter
+from formstack.retry import RetryPolicy
+from formstack.smartlist import SmartlistUploader, UploadProgress
+from formstack.transport import Transport, default_transport
 import logging
 
 
-class FormsClient:
+class FormsClient(BaseClient):
     def __init__(
         self,
         hostname: str = "www.formstack.com",
@@ -15,22 +25,38 @@ class FormsClient:
         ver: str = "v2",
         ssl_verify: bool = True,
         logger: logging.Logger = None,
+        transport: Transport = None,
+        scheme: str = "https",
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        cache: ResponseCache = None,
+        models: bool = False,
+        instrumentation: Instrumentation = None,
+        coalesce: SingleFlight = None,
     ):
         self._logger = logger or logging.getLogger(__name__)
-        self.url = "https://{}/api/{}/".format(hostname, ver)
+        self.url = "{}://{}/api/{}/".format(scheme, hostname, ver)
         self._token = token
+        self._credential_id = credential_id(token)
         self._ssl_verify = ssl_verify
+        self._transport = transport or default_transport()
+        self._rate_limiter = rate_limiter
+        self._retry = retry
+        self._cache = cache
+        self._models = models
+        self._instrumentation = instrumentation
+        self._flight = coalesce
+        self._headers = {
+            "authorization": "Bearer " + self._token,
+            "content-type": "application/json",
+            "accept": "application/json",
+        }
         if not ssl_verify:
             # noinspection PyUnresolvedReferences
             requests.packages.urllib3.disable_warnings()
 
     def get(self, endpoint: str, enc_password: str = "", params: Dict = None):
-        return self._do(
-            http_method="GET",
-            endpoint=endpoint,
-            params=params,
-            enc_password=enc_password,
-        )
+        return self._get(endpoint, params, enc_password)
 
     def post(
         self,
@@ -63,55 +89,6 @@ class FormsClient:
             data=data,
         )
 
-    def _do(
-        self,
-        http_method: str,
-        endpoint: str,
-        enc_password: str = "",
-        params: Dict = None,
-        data: Dict = None,
-    ):
-        full_url = self.url + endpoint
-        headers = {
-            "authorization": "Bearer " + self._token,
-            "content-type": "application/json",
-            "accept": "application/json",
-        }
-        if enc_password != "":
-            headers["X-FS-ENCRYPTION-PASSWORD"] = enc_password
-
-        log_line_pre = f"method={http_method}, url={full_url}, params={params}"
-        log_line_post = ", ".join(
-            (log_line_pre, "success={}, status_code={}, message={}")
-        )
-        # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions
-        try:
-            self._logger.debug(msg=log_line_pre)
-            response = requests.request(
-                method=http_method,
-                url=full_url,
-                verify=self._ssl_verify,
-                headers=headers,
-                params=params,
-                json=data,
-            )
-        except requests.exceptions.RequestException as e:
-            self._logger.error(msg=(str(e)))
-            raise Exception("Reqest failed from e")
-        # Deserialize JSON output to Python object, or return failed Result on exception
-        try:
-            data_out = response.json()
-        except (ValueError, JSONDecodeError) as e:
-            self._logger.error(msg=log_line_post.format(False, None, e))
-            raise Exception("Bad JSON in response") from e
-        # If status_code in 200-299 range, return success Result with data, otherwise raise exception
-        is_success = 299 >= response.status_code >= 200
-        log_line = response.status_code
-        if is_success:  # OK
-            return data_out
-        self._logger.error(msg=log_line)
-        return exceptions.detect_http_error(response)
-
     # Forms
     def get_form(
         self,
@@ -127,6 +104,31 @@ class FormsClient:
             params=params,
         )
 
+    def iter_forms(
+        self,
+        params: Dict = None,
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        params = dict({"folders": "false"}, **(params or {}))
+        if stream:
+            return iter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    "form.json", "forms", page_params, parser=parser
+                ),
+                key="forms",
+                params=params,
+                per_page=per_page,
+            )
+        return iter_pages(
+            lambda page_params: self.get_form(params=page_params),
+            key="forms",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
     def create_form(self, params: Dict = None, data: Dict = None):
         return self.post(endpoint="form.json", params=params, data=data)
 
@@ -160,6 +162,22 @@ class FormsClient:
             urlpath = "/" + str(id)
         return self.get(endpoint=f"folder{urlpath}.json", params=params)
 
+    def iter_folders(self, params: Dict = None, per_page: int = 100, prefetch: bool = True):
+        return iter_pages(
+            lambda page_params: self.get_folder(params=page_params),
+            key="folders",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
+    def folder_index(self, max_age: float = 300) -> FolderIndex:
+        # Loads every folder and form (one paged listing each) into an
+        # index; call refresh() on it to pick up changes
+        index = FolderIndex(self, max_age=max_age)
+        index.refresh(force=True)
+        return index
+
     def create_folder(self, params: Dict = None, data: Dict = None):
         return self.post(endpoint="folder.json", params=params, data=data)
 
@@ -189,6 +207,38 @@ class FormsClient:
             enc_password=enc_password,
         )
 
+    def iter_form_submissions(
+        self,
+        id: int = "",
+        params: Dict = None,
+        enc_password: str = "",
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        if stream:
+            return iter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    f"form/{id}/submission.json",
+                    "submissions",
+                    page_params,
+                    enc_password,
+                    parser,
+                ),
+                key="submissions",
+                params=params,
+                per_page=per_page,
+            )
+        return iter_pages(
+            lambda page_params: self.get_form_submissions(
+                id=id, params=page_params, enc_password=enc_password
+            ),
+            key="submissions",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
     def create_form_submission(
         self, id: int = "", params: Dict = None, data: Dict = ""
     ):
@@ -200,10 +250,95 @@ class FormsClient:
     def download_form_submission(self, id: int, field_id: int):
         return self.post(endpoint=f"download/{id}/{field_id}.json")
 
+    def _download_request(self, id: int, field_id: int, target: Destination, enc_password: str):
+        headers = dict(self._headers, accept="*/*")
+        if enc_password != "":
+            headers[ENCRYPTION_HEADER] = enc_password
+        headers.update(target.range_headers())
+        return dict(
+            method="GET",
+            url=self.url + f"download/{id}/{field_id}.json",
+            verify=self._ssl_verify,
+            headers=headers,
+            rate_limiter=self._rate_limiter,
+            retry=self._retry,
+        )
+
+    def download_file(
+        self,
+        id: int,
+        field_id: int,
+        dest,
+        enc_password: str = "",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        resume: bool = True,
+    ) -> int:
+        # Streams the uploaded file to a path or binary file object in chunks
+        # and returns the number of bytes written
+        target = Destination(dest, resume=resume)
+        try:
+            response = self._transport.request(
+                stream=True, **self._download_request(id, field_id, target, enc_password)
+            )
+            with response, target:
+                if target.begin(response):
+                    for chunk in response.iter_content(chunk_size):
+                        target.write(chunk)
+        except requests.exceptions.RequestException as e:
+            # Includes a connection dropped mid-body; a rerun resumes the .part
+            self._logger.error(msg=(str(e)))
+            raise exceptions.FormstackException("Reqest failed from e") from e
+        return target.written
+
+    def download_files(
+        self,
+        items: Iterable[Tuple[int, int, str]],
+        workers: int = 4,
+        enc_password: str = "",
+        resume: bool = True,
+    ) -> BulkRun:
+        return BulkRun(
+            lambda item: self.download_file(
+                item[0], item[1], item[2], enc_password=enc_password, resume=resume
+            ),
+            items,
+            workers=workers,
+        )
+
     # Partial Submissions
     def get_form_partial_submissions(self, id: int = "", params: Dict = None):
         return self.get(endpoint=f"form/{id}/partialsubmission.json", params=params)
 
+    def iter_form_partial_submissions(
+        self,
+        id: int = "",
+        params: Dict = None,
+        per_page: int = 100,
+        prefetch: bool = True,
+        stream: bool = False,
+    ):
+        if stream:
+            return iter_stream_pages(
+                lambda page_params, parser: self._stream(
+                    f"form/{id}/partialsubmission.json",
+                    "partial_submissions",
+                    page_params,
+                    parser=parser,
+                ),
+                key="partial_submissions",
+                params=params,
+                per_page=per_page,
+            )
+        return iter_pages(
+            lambda page_params: self.get_form_partial_submissions(
+                id=id, params=page_params
+            ),
+            key="partial_submissions",
+            params=params,
+            per_page=per_page,
+            prefetch=prefetch,
+        )
+
     def get_partial_submission(self, id: int, params: Dict = None):
         return self.get(endpoint=f"partialsubmission/{id}.json", params=params)
 
@@ -238,7 +373,7 @@ class FormsClient:
 
     # Webhooks
     def create_webhook(self, id, data: Dict = None):
-        return self.delete(endpoint=f"form/{id}/webhook.json", data=data)
+        return self.post(endpoint=f"form/{id}/webhook.json", data=data)
 
     def get_webhook(self, id: int):
         return self.get(endpoint=f"webhook/{id}.json")
@@ -311,26 +446,38 @@ class FormsClient:
     def get_smartlist_options(self, id: int, params: Dict = None):
         return self.get(endpoint=f"smartlist/{id}/option", params=params)
 
+    def iter_smartlist_options(self, id: int, params: Dict = None, per_page: int = 100):
+        return iter_pages(
+            lambda page_params: self.get_smartlist_options(id=id, params=page_params),
+            key="options",
+            params=params,
+            per_page=per_page,
+        )
+
     def update_smartlist_options(self, id: int, data: Dict = None):
         return self.put(endpoint=f"smartlist/{id}/option", data=data)
 
     def get_smartlist_option(self, id: int, option_id: int):
-        return self.get(endpoint=f"smartlist/{id}/option{option_id}")
+        return self.get(endpoint=f"smartlist/{id}/option/{option_id}")
 
     def update_smartlist_option(self, id: int, option_id: int, data: Dict = None):
-        return self.put(endpoint=f"smartlist/{id}/option{option_id}", data=data)
+        return self.put(endpoint=f"smartlist/{id}/option/{option_id}", data=data)
 
     def delete_smartlist_option(self, id: int, option_id: int):
-        return self.delete(endpoint=f"smartlist/{id}/option{option_id}")
+        return self.delete(endpoint=f"smartlist/{id}/option/{option_id}")
 
     def update_smartlist_option_image(self, id: int, option_id: int):
-        return self.put(endpoint=f"smartlist/{id}/option{option_id}")
+        return self.put(endpoint=f"smartlist/{id}/option/{option_id}")
 
     def delete_smartlist_option_image(self, id: int, option_id: int, data: Dict = None):
-        return self.delete(endpoint=f"smartlist/{id}/option{option_id}", data=data)
+        return self.delete(endpoint=f"smartlist/{id}/option/{option_id}", data=data)
 
     def delete_smartlist_options(self, id: int):
         return self.put(endpoint=f"smartlist/{id}/alloptions")
 
     def update_smartlist_options_bulk(self, id: int, data: Dict = None):
         return self.put(endpoint=f"smartlist/{id}/bulkoptions", data=data)
+
+    def upload_smartlist_options(self, id: int, options: Iterable, **kwargs) -> UploadProgress:
+        # Chunked, resumable upload of a large option set; see SmartlistUploader
+        return SmartlistUploader(self, id, **kwargs).run(options)
@@ -1,34 +1,113 @@
+import json
 import requests
 import requests.packages
-from typing import List, Dict
+from typing import Dict, Iterable, List, Union
 from formstack.exceptions import FormstackException
-from json import JSONDecodeError
-from formstack.models import Result
+from formstack.cache import ResponseCache, credential_id
+from formstack.client import BaseClient, _reason
+from formstack.coalesce import SingleFlight
+from formstack.instrumentation import Instrumentation
+from formstack.pagination import iter_scim_pages, iter_scim_stream_pages
+from formstack.ratelimit import RateLimiter
+from formstack.retry import RetryPolicy
+from formstack.transport import Transport, default_transport
 import logging
 
+PATCH_OP = "urn:ietf:params:scim:api:messages:2.0:PatchOp"
+BULK_REQUEST = "urn:ietf:params:scim:api:messages:2.0:BulkRequest"
 
-class FormsSCIM:
+
+def patch_request(operations: List[Dict]) -> Dict:
+    return {"schemas": [PATCH_OP], "Operations": operations}
+
+
+def _filter_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (int, float)):
+        return str(value)
+    # JSON string syntax is SCIM's: quoted, with escaped quotes/backslashes
+    return json.dumps(str(value))
+
+
+def scim_filter(conditions: Dict) -> str:
+    """Build a SCIM filter from ``{attribute: value}`` conditions joined with
+    ``and``. Keys are compared with ``eq``; use an ``(attribute, operator)``
+    key for others, e.g. ``{("emails.value", "ew"): "@example.com"}`` or
+    ``{("externalId", "pr"): None}``."""
+    parts = []
+    for attribute, value in conditions.items():
+        operator = "eq"
+        if isinstance(attribute, tuple):
+            attribute, operator = attribute
+        if operator == "pr":
+            parts.append(f"{attribute} pr")
+        else:
+            parts.append(f"{attribute} {operator} {_filter_value(value)}")
+    return " and ".join(parts)
+
+
+def list_params(
+    params: Dict = None,
+    filter: Union[str, Dict] = None,
+    attributes: Iterable[str] = None,
+    excluded_attributes: Iterable[str] = None,
+) -> Dict:
+    params = dict(params or {})
+    if filter:
+        params["filter"] = filter if isinstance(filter, str) else scim_filter(filter)
+    if attributes:
+        params["attributes"] = attributes if isinstance(attributes, str) else ",".join(attributes)
+    if excluded_attributes:
+        params["excludedAttributes"] = (
+            excluded_attributes
+            if isinstance(excluded_attributes, str)
+            else ",".join(excluded_attributes)
+        )
+    return params
+
+
+class FormsSCIM(BaseClient):
     def __init__(
         self,
         hostname: str = "www.formstack.com",
         token: str = "",
         ssl_verify: bool = True,
         logger: logging.Logger = None,
+        transport: Transport = None,
+        scheme: str = "https",
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        cache: ResponseCache = None,
+        models: bool = False,
+        instrumentation: Instrumentation = None,
+        coalesce: SingleFlight = None,
     ):
         self._logger = logger or logging.getLogger(__name__)
-        self.url = "https://{}/scim/".format(hostname)
+        self.url = "{}://{}/scim/".format(scheme, hostname)
         self._token = token
+        self._credential_id = credential_id(token)
         self._ssl_verify = ssl_verify
+        self._transport = transport or default_transport()
+        self._rate_limiter = rate_limiter
+        self._retry = retry
+        self._cache = cache
+        self._models = models
+        self._instrumentation = instrumentation
+        self._flight = coalesce
+        self._headers = {
+            "authorization": "Bearer " + self._token,
+            "content-type": "application/json",
+            "accept": "application/json",
+        }
         if not ssl_verify:
             # noinspection PyUnresolvedReferences
             requests.packages.urllib3.disable_warnings()
 
-    def get(self, endpoint: str, params: Dict = None):
-        return self._do(
-            http_method="GET",
-            endpoint=endpoint,
-            params=params,
-        )
+    def get(self, endpoint: str, params: Dict = None, cache: bool = True):
+        return self._get(endpoint, params, cache=cache)
 
     def post(
         self,
@@ -51,6 +130,14 @@ class FormsSCIM:
             data=data,
         )
 
+    def patch(self, endpoint: str, params: Dict = None, data: Dict = None):
+        return self._do(
+            http_method="PATCH",
+            endpoint=endpoint,
+            params=params,
+            data=data,
+        )
+
     def delete(self, endpoint: str, params: Dict = None, data: Dict = None):
         return self._do(
             http_method="DELETE",
@@ -59,67 +146,59 @@ class FormsSCIM:
             data=data,
         )
 
-    def _do(
-        self,
-        http_method: str,
-        endpoint: str,
-        params: Dict = None,
-        data: Dict = None,
-    ):
-        full_url = self.url + endpoint
-        headers = {
-            "authorization": "Bearer " + self._token,
-            "content-type": "application/json",
-            "accept": "application/json",
-        }
+    def _failure(self, response):
+        raise FormstackException(f"{response.status_code}: {_reason(response)}")
 
-        log_line_pre = f"method={http_method}, url={full_url}, params={params}"
-        log_line_post = ", ".join(
-            (log_line_pre, "success={}, status_code={}, message={}")
-        )
-        # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions
-        try:
-            self._logger.debug(msg=log_line_pre)
-            response = requests.request(
-                method=http_method,
-                url=full_url,
-                verify=self._ssl_verify,
-                headers=headers,
+    def _iter(self, endpoint: str, params: Dict, count: int, workers: int, stream: bool, cache: bool = True):
+        # Streamed listings never use the response cache
+        if stream:
+            return iter_scim_stream_pages(
+                lambda page_params, parser: self._stream(endpoint, "Resources", page_params, parser=parser),
                 params=params,
-                json=data,
+                count=count,
             )
-        except requests.exceptions.RequestException as e:
-            self._logger.error(msg=(str(e)))
-            raise FormstackException("Reqest failed from e")
-        # Deserialize JSON output to Python object, or return failed Result on exception
-        try:
-            data_out = response.json()
-        except (ValueError, JSONDecodeError) as e:
-            self._logger.error(msg=log_line_post.format(False, None, e))
-            raise FormstackException("Bad JSON in response") from e
-        # If status_code in 200-299 range, return success Result with data, otherwise raise exception
-        is_success = 299 >= response.status_code >= 200
-        log_line = log_line_post.format(
-            is_success, response.status_code, response.reason
+        return iter_scim_pages(
+            lambda page_params: self.get(endpoint=endpoint, params=page_params, cache=cache),
+            params=params,
+            count=count,
+            workers=workers,
         )
-        if is_success:  # OK
-            self._logger.debug(msg=log_line)
-            return data_out
-        self._logger.error(msg=log_line)
-        raise Exception(f"{response.status_code}: {response.reason}")
 
     # Users
     def get_users(self, params: Dict = None):
         return self.get(endpoint=f"Users", params=params)
 
+    def iter_users(
+        self,
+        params: Dict = None,
+        count: int = 100,
+        filter: Union[str, Dict] = None,
+        attributes: Iterable[str] = None,
+        excluded_attributes: Iterable[str] = None,
+        workers: int = 1,
+        stream: bool = False,
+        cache: bool = True,
+    ):
+        return self._iter(
+            "Users",
+            list_params(params, filter, attributes, excluded_attributes),
+            count,
+            workers,
+            stream,
+            cache,
+        )
+
     def create_users(self, data: Dict = None):
-        return self.get(endpoint=f"Users", data=data)
+        return self.post(endpoint=f"Users", data=data)
 
     def get_user(self, id: int):
         return self.get(endpoint=f"Users/{id}")
 
     def update_user(self, id: int, data: Dict = None):
-        return self.get(endpoint=f"Users/{id}", data=data)
+        return self.put(endpoint=f"Users/{id}", data=data)
+
+    def patch_user(self, id: int, operations: List[Dict]):
+        return self.patch(endpoint=f"Users/{id}", data=patch_request(operations))
 
     def delete_user(self, id: int):
         return self.delete(endpoint=f"Users/{id}")
@@ -128,22 +207,73 @@ class FormsSCIM:
     def get_groups(self, params: Dict = None):
         return self.get(endpoint=f"Groups", params=params)
 
+    def iter_groups(
+        self,
+        params: Dict = None,
+        count: int = 100,
+        filter: Union[str, Dict] = None,
+        attributes: Iterable[str] = None,
+        excluded_attributes: Iterable[str] = None,
+        workers: int = 1,
+        stream: bool = False,
+        cache: bool = True,
+    ):
+        return self._iter(
+            "Groups",
+            list_params(params, filter, attributes, excluded_attributes),
+            count,
+            workers,
+            stream,
+            cache,
+        )
+
     def create_groups(self, data: Dict = None):
-        return self.get(endpoint=f"Groups", data=data)
+        return self.post(endpoint=f"Groups", data=data)
 
     def get_group(self, id: int):
         return self.get(endpoint=f"Groups/{id}")
 
     def update_group(self, id: int, data: Dict = None):
-        return self.get(endpoint=f"Groups/{id}", data=data)
+        return self.put(endpoint=f"Groups/{id}", data=data)
+
+    def patch_group(self, id: int, operations: List[Dict]):
+        return self.patch(endpoint=f"Groups/{id}", data=patch_request(operations))
 
     def delete_group(self, id: int):
         return self.delete(endpoint=f"Groups/{id}")
 
+    # Bulk
+    def get_service_provider_config(self):
+        return self.get(endpoint="ServiceProviderConfig")
+
+    def bulk(self, operations: List[Dict], fail_on_errors: int = None):
+        data = {"schemas": [BULK_REQUEST], "Operations": operations}
+        if fail_on_errors is not None:
+            data["failOnErrors"] = fail_on_errors
+        return self.post(endpoint="Bulk", data=data)
+
     # Forms
     def get_forms(self, params: Dict = None):
         return self.get(endpoint=f"Forms", params=params)
 
+    def iter_forms(
+        self,
+        params: Dict = None,
+        count: int = 100,
+        filter: Union[str, Dict] = None,
+        attributes: Iterable[str] = None,
+        excluded_attributes: Iterable[str] = None,
+        workers: int = 1,
+        stream: bool = False,
+    ):
+        return self._iter(
+            "Forms",
+            list_params(params, filter, attributes, excluded_attributes),
+            count,
+            workers,
+            stream,
+        )
+
     def get_form(self, id: int):
         return self.get(endpoint=f"Forms{id}")
 
@@ -151,5 +281,23 @@ class FormsSCIM:
     def get_folders(self, params: Dict = None):
         return self.get(endpoint=f"Folders", params=params)
 
+    def iter_folders(
+        self,
+        params: Dict = None,
+        count: int = 100,
+        filter: Union[str, Dict] = None,
+        attributes: Iterable[str] = None,
+        excluded_attributes: Iterable[str] = None,
+        workers: int = 1,
+        stream: bool = False,
+    ):
+        return self._iter(
+            "Folders",
+            list_params(params, filter, attributes, excluded_attributes),
+            count,
+            workers,
+            stream,
+        )
+
     def get_folder(self, id: int):
         return self.get(endpoint=f"Folders{id}")
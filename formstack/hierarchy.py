@@ -0,0 +1,240 @@
+import time
+from typing import Dict, Iterable, List, Optional
+from formstack.models import unwrap
+
+
+def _id(value) -> Optional[str]:
+    # Top-level folders have parent 0 (or none); forms outside any folder
+    # have folder 0
+    if value in (None, "", 0, "0"):
+        return None
+    return str(value)
+
+
+def _flatten(folders: Iterable[Dict], parent=None) -> Iterable[Dict]:
+    # folder.json nests subfolders inside their parent
+    for folder in folders:
+        # Folder models (models=True) are indexed as their payload dicts
+        folder = unwrap(folder)
+        if not isinstance(folder, dict):
+            continue
+        if parent is not None and not folder.get("parent"):
+            folder = dict(folder, parent=parent)
+        yield folder
+        yield from _flatten(folder.get("subfolders") or (), folder.get("id"))
+
+
+def _same_place(old: Dict, new: Dict, parent_key: str) -> bool:
+    return old.get("name") == new.get("name") and _id(old.get(parent_key)) == _id(new.get(parent_key))
+
+
+class FolderIndex:
+    """In-memory index of the folder tree and the forms in each folder.
+
+    Built from one listing of folders and one of forms (see
+    ``FormsClient.folder_index``). Lookups by id or name are dict lookups;
+    subtree queries use each folder's position in a depth-first ordering,
+    so the forms under a folder are one contiguous slice. ``refresh`` reloads
+    the listings once ``max_age`` seconds have passed and applies only what
+    changed; ``update_form``/``remove_form`` apply single changes, e.g. from
+    a webhook.
+    """
+
+    def __init__(self, client=None, max_age: float = 300):
+        self.client = client
+        self.max_age = max_age
+        self.loaded_at = None
+        self.folders = {}
+        self.forms = {}
+        self.children = {None: []}
+        self.folder_forms = {}
+        self._folder_names = {}
+        self._form_names = {}
+        # Depth-first order of the folders with each folder's (first, last)
+        # position in it, and the form ids ordered by their folder's position
+        self._folder_order = []
+        self._span = {}
+        self._form_order = []
+        self._form_range = {}
+        self._dirty = True
+
+    # Building
+    def load(self, folders: Iterable[Dict], forms: Iterable[Dict]) -> Dict[str, int]:
+        """Replace the index contents; returns counts of what changed."""
+        folders = {str(f["id"]): f for f in _flatten(folders)}
+        forms = {str(f["id"]): unwrap(f) for f in forms}
+        changes = {"folders": 0, "forms": 0}
+        for id in set(self.folders) - set(folders):
+            self._remove_folder(id)
+            changes["folders"] += 1
+        for id, folder in folders.items():
+            if self._apply_folder(id, folder):
+                changes["folders"] += 1
+        for id in set(self.forms) - set(forms):
+            self.remove_form(id)
+            changes["forms"] += 1
+        for id, form in forms.items():
+            if self.update_form(form):
+                changes["forms"] += 1
+        self.loaded_at = time.monotonic()
+        return changes
+
+    def _apply_folder(self, id: str, folder: Dict) -> bool:
+        folder = {k: v for k, v in folder.items() if k != "subfolders"}
+        old = self.folders.get(id)
+        if old == folder:
+            return False
+        self.folders[id] = folder
+        if old is not None:
+            if _same_place(old, folder, "parent"):
+                return True
+            self._unlink_folder(id, old)
+        self.children.setdefault(_id(folder.get("parent")), []).append(id)
+        self.children.setdefault(id, [])
+        self.folder_forms.setdefault(id, [])
+        self._folder_names.setdefault(folder.get("name"), []).append(id)
+        self._dirty = True
+        return True
+
+    def _unlink_folder(self, id: str, folder: Dict):
+        self.children.get(_id(folder.get("parent")), []).remove(id)
+        self._folder_names.get(folder.get("name"), []).remove(id)
+
+    def _remove_folder(self, id: str):
+        self._unlink_folder(id, self.folders.pop(id))
+        self._dirty = True
+
+    def update_form(self, form: Dict) -> bool:
+        """Add or replace one form; False if nothing changed."""
+        form = unwrap(form)
+        id = str(form["id"])
+        old = self.forms.get(id)
+        if old == form:
+            return False
+        self.forms[id] = form
+        if old is not None:
+            # Counts such as views change all the time; only a rename or a
+            # move needs the lookups and the ordering updated
+            if _same_place(old, form, "folder"):
+                return True
+            self._unlink_form(id, old)
+        self.folder_forms.setdefault(_id(form.get("folder")), []).append(id)
+        self._form_names.setdefault(form.get("name"), []).append(id)
+        self._dirty = True
+        return True
+
+    def _unlink_form(self, id: str, form: Dict):
+        self.folder_forms.get(_id(form.get("folder")), []).remove(id)
+        self._form_names.get(form.get("name"), []).remove(id)
+
+    def remove_form(self, id):
+        form = self.forms.pop(str(id), None)
+        if form is not None:
+            self._unlink_form(str(id), form)
+            self._dirty = True
+
+    def _order(self):
+        if not self._dirty:
+            return
+        folder_order = []
+        span = {}
+        form_order = list(self.folder_forms.get(None, ()))
+        form_range = {}
+        stack = [(id, False) for id in reversed(self.children.get(None, ()))]
+        while stack:
+            id, done = stack.pop()
+            if done:
+                span[id] = (span[id], len(folder_order) - 1)
+                form_range[id] = (form_range[id], len(form_order))
+                continue
+            span[id] = len(folder_order)
+            form_range[id] = len(form_order)
+            folder_order.append(id)
+            form_order.extend(self.folder_forms.get(id, ()))
+            stack.append((id, True))
+            stack.extend((child, False) for child in reversed(self.children.get(id, ())))
+        self._folder_order = folder_order
+        self._span = span
+        self._form_order = form_order
+        self._form_range = form_range
+        self._dirty = False
+
+    # Loading from the API
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.max_age
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        if not force and not self.stale():
+            return {"folders": 0, "forms": 0}
+        return self.load(self.client.iter_folders(), self.client.iter_forms())
+
+    async def arefresh(self, force: bool = False) -> Dict[str, int]:
+        # For the async clients, whose iterators are async
+        if not force and not self.stale():
+            return {"folders": 0, "forms": 0}
+        folders = [folder async for folder in self.client.iter_folders()]
+        forms = [form async for form in self.client.iter_forms()]
+        return self.load(folders, forms)
+
+    # Lookups
+    def folder_id(self, name: str) -> Optional[str]:
+        """Id of the folder called ``name`` (a ``/``-separated path to tell
+        apart folders of the same name)."""
+        parts = [p for p in name.split("/") if p] if "/" in name else [name]
+        ids = self._folder_names.get(parts[-1]) or []
+        if len(parts) > 1:
+            ids = [id for id in ids if self.path(id) == parts]
+        return ids[0] if ids else None
+
+    def form_id(self, name: str) -> Optional[str]:
+        ids = self._form_names.get(name)
+        return ids[0] if ids else None
+
+    def parent(self, folder_id) -> Optional[str]:
+        folder = self.folders.get(str(folder_id))
+        return _id(folder.get("parent")) if folder else None
+
+    def path(self, folder_id) -> List[str]:
+        names = []
+        id = str(folder_id) if folder_id is not None else None
+        while id is not None and id in self.folders:
+            names.append(self.folders[id].get("name"))
+            id = self.parent(id)
+        return names[::-1]
+
+    def subfolders(self, folder_id=None, recursive: bool = False) -> List[str]:
+        key = str(folder_id) if folder_id is not None else None
+        if not recursive:
+            return list(self.children.get(key, ()))
+        if key is None:
+            return list(self.folders)
+        self._order()
+        if key not in self._span:
+            return []
+        first, last = self._span[key]
+        return self._folder_order[first + 1 : last + 1]
+
+    def contains(self, ancestor, folder_id) -> bool:
+        """Whether ``folder_id`` is ``ancestor`` or inside it."""
+        self._order()
+        outer = self._span.get(str(ancestor))
+        inner = self._span.get(str(folder_id))
+        return bool(outer and inner) and outer[0] <= inner[0] <= outer[1]
+
+    def forms_in(self, folder_id=None, recursive: bool = True) -> List[str]:
+        """Ids of the forms in a folder (``None``: outside any folder), with
+        ``recursive`` including every subfolder."""
+        key = str(folder_id) if folder_id is not None else None
+        if key is None and recursive:
+            return list(self.forms)
+        if not recursive:
+            return list(self.folder_forms.get(key, ()))
+        self._order()
+        if key not in self._form_range:
+            return []
+        start, end = self._form_range[key]
+        return self._form_order[start:end]
+
+    def folder_of(self, form_id) -> Optional[str]:
+        form = self.forms.get(str(form_id))
+        return _id(form.get("folder")) if form else None
@@ -0,0 +1,304 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Endpoints whose ids do not alternate with resource names, checked in
+# order before the positional rule of endpoint_template
+_ROUTES = tuple(
+    (re.compile(pattern), template)
+    for pattern, template in (
+        (r"(merge|route)/[^/]+/[^/]+", r"\1/{id}/{key}"),
+        (r"download/[^/]+/[^/]+\.json", "download/{id}/{field_id}.json"),
+        (r"(Forms|Folders)/?[^/]+", r"\1{id}"),
+        # Tool names, not ids
+        (r"api/tools/[a-z_]+", r"\g<0>"),
+    )
+)
+
+
+@lru_cache(maxsize=4096)
+def endpoint_template(endpoint: str) -> str:
+    """``form/123/submission.json`` -> ``form/{id}/submission.json``.
+
+    Endpoints alternate resource names and ids (``smartlist/{id}/option/{id}``,
+    ``Users/{id}``, ``api/documents/{id}/copy``), so every segment in an id
+    position is replaced whatever it looks like and metrics are grouped per
+    endpoint rather than per resource.
+    """
+    for pattern, template in _ROUTES:
+        match = pattern.fullmatch(endpoint)
+        if match is not None:
+            return match.expand(template)
+    path, ext = endpoint, ""
+    if endpoint.endswith(".json"):
+        path, ext = endpoint[:-5], ".json"
+    segments = path.split("/")
+    # The Documents API puts its resources under api/
+    first = 2 if segments[0] == "api" else 1
+    for i in range(first, len(segments), 2):
+        if segments[i]:
+            segments[i] = "{id}"
+    return "/".join(segments) + ext
+
+
+class RequestTrace:
+    """What is known about one API request; filled in as it progresses.
+
+    Times are in seconds. ``connect`` (DNS, TCP and TLS of a new connection)
+    and ``ttfb`` (request sent to response headers) are None when the
+    transport cannot measure them; the ``requests`` transport reports
+    ``ttfb`` only. ``retries`` counts every repeated attempt, including
+    ones after a 429.
+    """
+
+    __slots__ = (
+        "method",
+        "endpoint",
+        "url",
+        "status",
+        "retries",
+        "bytes_sent",
+        "bytes_received",
+        "connect",
+        "ttfb",
+        "elapsed",
+        "error",
+        "started",
+        "context",
+    )
+
+    def __init__(self, method: str, endpoint: str, url: str):
+        self.method = method
+        self.endpoint = endpoint
+        self.url = url
+        self.status = None
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connect = None
+        self.ttfb = None
+        self.elapsed = None
+        self.error = None
+        self.started = time.monotonic()
+        # Per-request state for hooks, e.g. an open span
+        self.context = {}
+
+    def __repr__(self):
+        return (
+            f"RequestTrace({self.method} {self.endpoint} status={self.status} "
+            f"retries={self.retries} elapsed={self.elapsed})"
+        )
+
+
+class Instrumentation:
+    """Hooks called before and after every API request of a client.
+
+    A hook is an object with ``before(trace)`` and/or ``after(trace)``
+    methods, such as :class:`Metrics` or :class:`OpenTelemetryHook`; plain
+    functions can be added with ``on_request``/``on_response``. Pass the
+    instance to a client as ``instrumentation=``; without one the clients do
+    no tracing work at all.
+    """
+
+    def __init__(self, *hooks):
+        self.before = []
+        self.after = []
+        for hook in hooks:
+            self.add(hook)
+
+    def add(self, hook):
+        if hasattr(hook, "before"):
+            self.before.append(hook.before)
+        if hasattr(hook, "after"):
+            self.after.append(hook.after)
+        return hook
+
+    def on_request(self, fn: Callable[[RequestTrace], None]):
+        self.before.append(fn)
+        return fn
+
+    def on_response(self, fn: Callable[[RequestTrace], None]):
+        self.after.append(fn)
+        return fn
+
+    def start(self, method: str, endpoint: str, url: str) -> RequestTrace:
+        trace = RequestTrace(method, endpoint_template(endpoint), url)
+        for hook in self.before:
+            hook(trace)
+        return trace
+
+    def finish(self, trace: RequestTrace, response=None, error: Exception = None, streamed: bool = False):
+        """Call the ``after`` hooks. For a ``streamed`` response, call once
+        the body is read, through :func:`count_bytes`."""
+        trace.elapsed = time.monotonic() - trace.started
+        if response is not None:
+            trace.status = response.status_code
+            if not streamed:
+                trace.bytes_received = len(response.content)
+            if trace.ttfb is None:
+                try:
+                    elapsed = getattr(response, "elapsed", None)
+                except RuntimeError:
+                    # httpx sets it only once the body stream is closed
+                    elapsed = None
+                if elapsed is not None:
+                    trace.ttfb = elapsed.total_seconds()
+        trace.error = error
+        for hook in self.after:
+            hook(trace)
+
+
+def count_bytes(chunks: Iterator[bytes], trace: RequestTrace = None) -> Iterator[bytes]:
+    """Add the size of each chunk of a streamed body to ``trace``."""
+    if trace is None:
+        return chunks
+    return _counted(chunks, trace)
+
+
+def _counted(chunks, trace):
+    for chunk in chunks:
+        trace.bytes_received += len(chunk)
+        yield chunk
+
+
+def acount_bytes(chunks: AsyncIterator[bytes], trace: RequestTrace = None) -> AsyncIterator[bytes]:
+    """asyncio version of :func:`count_bytes`."""
+    if trace is None:
+        return chunks
+    return _acounted(chunks, trace)
+
+
+async def _acounted(chunks, trace):
+    async for chunk in chunks:
+        trace.bytes_received += len(chunk)
+        yield chunk
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf overflow
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), total
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Per-endpoint latency histograms and request, error and retry counters.
+
+    Add it to an :class:`Instrumentation`; ``to_prometheus`` renders the
+    Prometheus/OpenMetrics text format for a ``/metrics`` handler.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, prefix: str = "formstack"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.errors: Dict[Tuple[str, str, str], int] = {}
+        self.retries: Dict[Tuple[str, str], int] = {}
+        self.bytes_received: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def after(self, trace: RequestTrace):
+        key = (trace.method, trace.endpoint)
+        status = str(trace.status) if trace.status is not None else "error"
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(self.buckets)
+            histogram.observe(trace.elapsed)
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if trace.error is not None or trace.status >= 400:
+                kind = type(trace.error).__name__ if trace.error is not None else status
+                self.errors[key + (kind,)] = self.errors.get(key + (kind,), 0) + 1
+            if trace.retries:
+                self.retries[key] = self.retries.get(key, 0) + trace.retries
+            self.bytes_received[key] = self.bytes_received.get(key, 0) + trace.bytes_received
+
+    def to_prometheus(self) -> str:
+        name = self.prefix
+        lines = []
+
+        def labels(method, endpoint, **extra):
+            pairs = [("method", method), ("endpoint", endpoint)] + list(extra.items())
+            return ",".join(f'{k}="{_label(v)}"' for k, v in pairs)
+
+        with self._lock:
+            lines.append(f"# HELP {name}_request_duration_seconds API request latency, including retries")
+            lines.append(f"# TYPE {name}_request_duration_seconds histogram")
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        f"{name}_request_duration_seconds_bucket{{{labels(method, endpoint, le=bound)}}} {count}"
+                    )
+                lines.append(f"{name}_request_duration_seconds_sum{{{labels(method, endpoint)}}} {histogram.sum}")
+                lines.append(f"{name}_request_duration_seconds_count{{{labels(method, endpoint)}}} {histogram.count}")
+            for metric, help, values, extra in (
+                ("requests", "API requests by response status", self.requests, "status"),
+                ("request_errors", "Failed API requests by status or exception", self.errors, "error"),
+                ("request_retries", "Repeated attempts of API requests", self.retries, None),
+                ("response_bytes", "Response body bytes received", self.bytes_received, None),
+            ):
+                lines.append(f"# HELP {name}_{metric}_total {help}")
+                lines.append(f"# TYPE {name}_{metric}_total counter")
+                for key, value in sorted(values.items()):
+                    extra_labels = {extra: key[2]} if extra else {}
+                    lines.append(f"{name}_{metric}_total{{{labels(key[0], key[1], **extra_labels)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryHook:
+    """Record every request as an OpenTelemetry client span (needs
+    ``opentelemetry-api``)."""
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryHook requires opentelemetry-api") from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("formstack")
+
+    def before(self, trace: RequestTrace):
+        trace.context["span"] = self.tracer.start_span(
+            f"{trace.method} {trace.endpoint}",
+            kind=self._trace.SpanKind.CLIENT,
+            attributes={"http.request.method": trace.method, "url.full": trace.url},
+        )
+
+    def after(self, trace: RequestTrace):
+        span = trace.context.pop("span", None)
+        if span is None:
+            return
+        if trace.status is not None:
+            span.set_attribute("http.response.status_code", trace.status)
+        if trace.retries:
+            span.set_attribute("http.request.resend_count", trace.retries)
+        if trace.error is not None:
+            span.record_exception(trace.error)
+        if trace.error is not None or (trace.status or 0) >= 400:
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        span.end()
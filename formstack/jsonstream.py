@@ -0,0 +1,169 @@
+import codecs
+import json
+import re
+from typing import AsyncIterator, Callable, Iterable, Iterator, List
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+    loads = json.loads
+
+# Read size for streamed list responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"\s*")
+_decoder = json.JSONDecoder()
+
+# Parser states
+_START, _KEY, _COLON, _VALUE, _ITEMS, _DONE = range(6)
+
+
+class _Incomplete(Exception):
+    pass
+
+
+class ArrayParser:
+    """Push parser that decodes one JSON array of a document as it arrives.
+
+    ``key`` names the array in a top-level object (``"submissions"``); with
+    ``None`` the document itself is the array. ``feed`` takes the next chunk
+    of the body and returns every item completed by it, each decoded by the
+    C scanner of the ``json`` module. The other top-level values (``total``,
+    ``pages``, ...) are decoded into ``envelope``. Only the current item is
+    buffered.
+    """
+
+    def __init__(self, key: str = None):
+        self.key = key
+        self.envelope = {}
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._state = _START
+        self._last_key = None
+        # Buffered length needed before an incomplete value is retried, so a
+        # value spanning many chunks is not rescanned on every chunk
+        self._need = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> List:
+        buf = self._buf + self._text.decode(chunk, final)
+        if len(buf) < self._need and not final:
+            self._buf = buf
+            return []
+        items = []
+        pos = 0
+        try:
+            while self._state != _DONE:
+                pos = _WHITESPACE.match(buf, pos).end()
+                if pos == len(buf):
+                    break
+                pos = self._step(buf, pos, items, final)
+            self._need = 0
+        except _Incomplete:
+            self._need = 2 * (len(buf) - pos)
+        self._buf = buf[pos:]
+        return items
+
+    def _value(self, buf: str, pos: int, final: bool):
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            raise _Incomplete()
+        if end == len(buf) and not final:
+            # A number at the end of the buffer may continue in the next chunk
+            raise _Incomplete()
+        return value, end
+
+    def _step(self, buf: str, pos: int, items: List, final: bool) -> int:
+        state = self._state
+        char = buf[pos]
+        if state == _START:
+            if self.key is None and char == "[":
+                self._state = _ITEMS
+            elif self.key is not None and char == "{":
+                self._state = _KEY
+            else:
+                raise ValueError(f"Unexpected {char!r} at start of JSON document")
+            return pos + 1
+        if state == _ITEMS:
+            if char == ",":
+                return pos + 1
+            if char == "]":
+                self._state = _DONE if self.key is None else _KEY
+                return pos + 1
+            item, end = self._value(buf, pos, final)
+            items.append(item)
+            return end
+        if state == _KEY:
+            if char == ",":
+                return pos + 1
+            if char == "}":
+                self._state = _DONE
+                return pos + 1
+            self._last_key, end = self._value(buf, pos, final)
+            self._state = _COLON
+            return end
+        if state == _COLON:
+            if char != ":":
+                raise ValueError(f"Expected ':' after key {self._last_key!r}")
+            self._state = _VALUE
+            return pos + 1
+        # _VALUE
+        if char == "[" and self._last_key == self.key:
+            self._state = _ITEMS
+            return pos + 1
+        self.envelope[self._last_key], end = self._value(buf, pos, final)
+        self._state = _KEY
+        return end
+
+    def close(self) -> List:
+        """Finish the document; returns any items still buffered."""
+        items = self.feed(b"", final=True)
+        if self._state != _DONE:
+            raise ValueError("Truncated JSON document")
+        # A key holding an object instead of an array (or no key at all) is
+        # left in the envelope; its values are the items
+        value = self.envelope.pop(self.key, None) if self.key is not None else None
+        if isinstance(value, dict):
+            items.extend(value.values())
+        elif isinstance(value, list):
+            items.extend(value)
+        return items
+
+
+def iter_items(
+    chunks: Iterable[bytes],
+    key: str = None,
+    wrap: Callable = None,
+    parser: ArrayParser = None,
+) -> Iterator:
+    """Yield the items of a JSON array while ``chunks`` arrive, passed
+    through ``wrap`` if given.
+
+    Pass a ``parser`` to read its ``envelope`` once the items are consumed.
+    """
+    parser = parser or ArrayParser(key)
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield wrap(item) if wrap else item
+    for item in parser.close():
+        yield wrap(item) if wrap else item
+
+
+async def aiter_items(
+    chunks: AsyncIterator[bytes],
+    key: str = None,
+    wrap: Callable = None,
+    parser: ArrayParser = None,
+) -> AsyncIterator:
+    """asyncio version of :func:`iter_items`."""
+    parser = parser or ArrayParser(key)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield wrap(item) if wrap else item
+    for item in parser.close():
+        yield wrap(item) if wrap else item
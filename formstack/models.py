@@ -1,7 +1,255 @@
-from typing import List, Dict
+import re
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from formstack.jsonstream import loads
 
-class Result:
-    def __init__(self, status_code: int, message: str = '', data: List[Dict] = None):
-        self.status_code = int(status_code)
-        self.message = str(message)
-        self.data = data if data else []
\ No newline at end of file
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def _timestamp(value):
+    # Forms API timestamps look like "2023-01-31 14:05:00"
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+class attribute:
+    """A model attribute read from the raw payload on first access.
+
+    ``key`` defaults to the attribute name. Values with a ``convert``
+    function are converted once and kept; plain values are read straight
+    from the payload each time.
+    """
+
+    __slots__ = ("key", "convert", "name")
+
+    def __init__(self, key: str = None, convert: Callable = None):
+        self.key = key
+        self.convert = convert
+        self.name = key
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        if self.key is None:
+            self.key = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = obj._payload().get(self.key)
+        if self.convert is None or value is None:
+            return value
+        converted = obj._converted
+        if converted is None:
+            converted = obj._converted = {}
+        try:
+            return converted[self.name]
+        except KeyError:
+            value = converted[self.name] = self.convert(value)
+            return value
+
+
+class Model:
+    """Typed, read-only view over one API object.
+
+    ``raw`` is the decoded payload or its undecoded JSON text; text is only
+    parsed when an attribute is first read. Models also behave like the
+    payload dict for reads (``get``, ``[]``, ``in``), so code written for
+    the plain responses keeps working.
+    """
+
+    __slots__ = ("_raw", "_converted")
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._converted = None
+
+    def _payload(self) -> Dict:
+        raw = self._raw
+        if isinstance(raw, (bytes, str)):
+            raw = self._raw = loads(raw)
+        return raw
+
+    def get(self, key: str, default=None):
+        return self._payload().get(key, default)
+
+    def __getitem__(self, key: str):
+        return self._payload()[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._payload()
+
+    def to_dict(self) -> Dict:
+        return self._payload()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.get('id')!r})"
+
+
+def _models(model: type) -> Callable[[List], List]:
+    return lambda items: [model(item) for item in items]
+
+
+class Field(Model):
+    __slots__ = ()
+    id = attribute(convert=_int)
+    label = attribute()
+    type = attribute()
+    required = attribute(convert=_bool)
+    hidden = attribute(convert=_bool)
+    sort = attribute(convert=_int)
+    options = attribute()
+
+
+class Form(Model):
+    __slots__ = ()
+    id = attribute(convert=_int)
+    name = attribute()
+    url = attribute()
+    folder = attribute(convert=_int)
+    created = attribute(convert=_timestamp)
+    updated = attribute(convert=_timestamp)
+    deleted = attribute(convert=_bool)
+    submissions = attribute(convert=_int)
+    views = attribute(convert=_int)
+    fields = attribute(convert=_models(Field))
+
+
+class Submission(Model):
+    __slots__ = ()
+    id = attribute(convert=_int)
+    form = attribute(convert=_int)
+    timestamp = attribute(convert=_timestamp)
+    remote_addr = attribute()
+    data = attribute()
+
+    def values(self) -> Dict[str, object]:
+        # Field id to value, whichever shape ``data`` has on this endpoint
+        data = self.data or {}
+        items = data.values() if isinstance(data, dict) else data
+        return {str(item.get("field")): item.get("value") for item in items if isinstance(item, dict)}
+
+
+class Folder(Model):
+    __slots__ = ()
+    id = attribute(convert=_int)
+    name = attribute()
+    parent = attribute(convert=_int)
+    subfolders = attribute(convert=lambda items: [Folder(item) for item in items])
+
+
+class User(Model):
+    __slots__ = ()
+    id = attribute()
+    user_name = attribute("userName")
+    external_id = attribute("externalId")
+    display_name = attribute("displayName")
+    active = attribute(convert=_bool)
+    emails = attribute()
+    groups = attribute()
+
+
+class Group(Model):
+    __slots__ = ()
+    id = attribute()
+    display_name = attribute("displayName")
+    external_id = attribute("externalId")
+    members = attribute()
+
+
+class Document(Model):
+    __slots__ = ()
+    id = attribute(convert=_int)
+    name = attribute()
+    key = attribute()
+    type = attribute()
+    output = attribute()
+    active = attribute(convert=_bool)
+    folder = attribute()
+
+
+# Endpoint pattern, list key in the response (None for a single object or a
+# bare list) and model, checked in order against the request endpoint
+ROUTES = (
+    (r"form\.json", "forms", Form),
+    (r"form/\d+(/(basic)?)?\.json", None, Form),
+    (r"form/\d+/field\.json", None, Field),
+    (r"field/\d+\.json", None, Field),
+    (r"form/\d+/submission\.json", "submissions", Submission),
+    (r"submission/\d+\.json", None, Submission),
+    (r"form/\d+/partialsubmission\.json", "partial_submissions", Submission),
+    (r"partialsubmission/\d+\.json", None, Submission),
+    (r"folder\.json", "folders", Folder),
+    (r"folder/\d+\.json", None, Folder),
+    (r"Users", "Resources", User),
+    (r"Users/[^/]+", None, User),
+    (r"Groups", "Resources", Group),
+    (r"Groups/[^/]+", None, Group),
+    (r"api/documents", None, Document),
+    (r"api/documents/\d+", None, Document),
+)
+_ROUTES = tuple((re.compile(pattern), key, model) for pattern, key, model in ROUTES)
+
+
+def model_for(endpoint: str) -> Optional[tuple]:
+    for pattern, key, model in _ROUTES:
+        if pattern.fullmatch(endpoint):
+            return key, model
+    return None
+
+
+_OBJECT = re.compile(rb"\s*{")
+
+
+def wrap_body(endpoint: str, body: bytes):
+    """Wrap the undecoded body of a single-object response of ``endpoint``
+    in its model, to be parsed when an attribute is first read.
+
+    Returns ``None`` for list responses and endpoints without a model;
+    decode those and :func:`wrap` them.
+    """
+    route = model_for(endpoint)
+    if route is None or route[0] is not None or not _OBJECT.match(body):
+        return None
+    return route[1](body)
+
+
+def wrap(endpoint: str, data):
+    """Wrap a decoded response of ``endpoint`` in its model.
+
+    List responses keep their envelope (paging counts etc.) with the list
+    replaced by models; endpoints without a model are returned unchanged.
+    """
+    route = model_for(endpoint)
+    if route is None:
+        return data
+    key, model = route
+    if isinstance(data, list):
+        return [model(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    if key is None:
+        return model(data)
+    if isinstance(data.get(key), list):
+        data = dict(data)
+        data[key] = [model(item) for item in data[key]]
+    return data
+
+
+def unwrap(item):
+    """The payload of a model; anything else is returned unchanged. For
+    consumers that serialize or compare responses whether or not the
+    client has models on."""
+    return item.to_dict() if isinstance(item, Model) else item
@@ -0,0 +1,296 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterator, AsyncIterator
+from formstack.exceptions import FormstackException
+from formstack.jsonstream import ArrayParser
+
+
+def _page_items(result, key: str, page: int, per_page: int):
+    # Returns the page's items and whether another page follows. Error
+    # responses come back from the clients as a message string.
+    if not isinstance(result, dict):
+        raise FormstackException(result)
+    items = result.get(key) or []
+    return items, _has_next(result, len(items), page, per_page)
+
+
+def _has_next(envelope: Dict, count: int, page: int, per_page: int) -> bool:
+    if not count:
+        return False
+    if envelope.get("pages") is not None:
+        return page < int(envelope["pages"])
+    if envelope.get("total") is not None:
+        return page * per_page < int(envelope["total"])
+    return count >= per_page
+
+
+def iter_pages(
+    fetch: Callable[[Dict], Dict],
+    key: str,
+    params: Dict = None,
+    per_page: int = 100,
+    prefetch: bool = True,
+) -> Iterator[Dict]:
+    """Yield items from every page of a ``page``/``per_page`` list endpoint.
+
+    ``fetch`` is called with the request params and returns one page. With
+    ``prefetch`` the next page is requested in the background while the
+    caller works through the current one, so at most two pages are held.
+    """
+    params = dict(params or {})
+    params["per_page"] = per_page
+    page = int(params.get("page") or 1)
+
+    def fetch_page(number):
+        return fetch(dict(params, page=number))
+
+    if not prefetch:
+        while True:
+            items, has_next = _page_items(fetch_page(page), key, page, per_page)
+            yield from items
+            if not has_next:
+                return
+            page += 1
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(fetch_page, page)
+        try:
+            while pending is not None:
+                items, has_next = _page_items(pending.result(), key, page, per_page)
+                pending = None
+                if has_next:
+                    page += 1
+                    pending = executor.submit(fetch_page, page)
+                yield from items
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+
+async def aiter_pages(
+    fetch: Callable,
+    key: str,
+    params: Dict = None,
+    per_page: int = 100,
+    prefetch: bool = True,
+) -> AsyncIterator[Dict]:
+    """asyncio version of :func:`iter_pages`; ``fetch`` returns an awaitable."""
+    params = dict(params or {})
+    params["per_page"] = per_page
+    page = int(params.get("page") or 1)
+
+    def fetch_page(number):
+        return asyncio.ensure_future(fetch(dict(params, page=number)))
+
+    pending = fetch_page(page)
+    try:
+        while pending is not None:
+            items, has_next = _page_items(await pending, key, page, per_page)
+            pending = None
+            if has_next and prefetch:
+                page += 1
+                pending = fetch_page(page)
+            for item in items:
+                yield item
+            if has_next and not prefetch:
+                page += 1
+                pending = fetch_page(page)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def iter_stream_pages(
+    stream: Callable[[Dict, ArrayParser], Iterator],
+    key: str,
+    params: Dict = None,
+    per_page: int = 100,
+) -> Iterator:
+    """Like :func:`iter_pages`, but each page is decoded item by item while
+    it downloads. ``stream`` is called with the request params and an
+    :class:`ArrayParser`, whose envelope says whether another page follows.
+    """
+    params = dict(params or {})
+    params["per_page"] = per_page
+    page = int(params.get("page") or 1)
+    while True:
+        parser = ArrayParser(key)
+        count = 0
+        for item in stream(dict(params, page=page), parser):
+            count += 1
+            yield item
+        if not _has_next(parser.envelope, count, page, per_page):
+            return
+        page += 1
+
+
+async def aiter_stream_pages(
+    stream: Callable,
+    key: str,
+    params: Dict = None,
+    per_page: int = 100,
+) -> AsyncIterator:
+    """asyncio version of :func:`iter_stream_pages`; ``stream`` returns an
+    async iterator."""
+    params = dict(params or {})
+    params["per_page"] = per_page
+    page = int(params.get("page") or 1)
+    while True:
+        parser = ArrayParser(key)
+        count = 0
+        async for item in stream(dict(params, page=page), parser):
+            count += 1
+            yield item
+        if not _has_next(parser.envelope, count, page, per_page):
+            return
+        page += 1
+
+
+def _scim_has_next(result, start_index: int, count: int) -> bool:
+    # SCIM list responses carry totalResults; startIndex is 1-based
+    if result.get("totalResults") is not None:
+        return start_index - 1 + count < int(result["totalResults"])
+    return count > 0
+
+
+def _scim_resources(result):
+    if not isinstance(result, dict):
+        raise FormstackException(result)
+    return result.get("Resources") or []
+
+
+def _scim_starts(result, start_index: int, received: int):
+    # Start indexes of the remaining pages, once the first page gives the
+    # total and the server's page size (which may be below ``count``)
+    if not received or result.get("totalResults") is None:
+        return None
+    return range(start_index + received, int(result["totalResults"]) + 1, received)
+
+
+def iter_scim_pages(
+    fetch: Callable[[Dict], Dict],
+    params: Dict = None,
+    count: int = 100,
+    workers: int = 1,
+) -> Iterator[Dict]:
+    """Yield the resources of every page of a SCIM list endpoint, paging with
+    ``startIndex``/``count``.
+
+    With ``workers`` above 1 the pages after the first are fetched
+    concurrently once ``totalResults`` is known, and still yielded in order.
+    """
+    params = dict(params or {})
+    params["count"] = count
+    start_index = int(params.get("startIndex") or 1)
+    result = fetch(dict(params, startIndex=start_index))
+    resources = _scim_resources(result)
+    yield from resources
+    starts = _scim_starts(result, start_index, len(resources)) if workers > 1 else None
+    if starts is not None:
+        starts = iter(starts)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def submit(start):
+                return executor.submit(fetch, dict(params, startIndex=start))
+
+            pending = deque(submit(start) for start in islice(starts, workers * 2))
+            try:
+                while pending:
+                    resources = _scim_resources(pending.popleft().result())
+                    start = next(starts, None)
+                    if start is not None:
+                        pending.append(submit(start))
+                    yield from resources
+            finally:
+                for future in pending:
+                    future.cancel()
+        return
+    while resources and _scim_has_next(result, start_index, len(resources)):
+        start_index += len(resources)
+        result = fetch(dict(params, startIndex=start_index))
+        resources = _scim_resources(result)
+        yield from resources
+
+
+async def aiter_scim_pages(
+    fetch: Callable,
+    params: Dict = None,
+    count: int = 100,
+    workers: int = 1,
+) -> AsyncIterator[Dict]:
+    """asyncio version of :func:`iter_scim_pages`."""
+    params = dict(params or {})
+    params["count"] = count
+    start_index = int(params.get("startIndex") or 1)
+    result = await fetch(dict(params, startIndex=start_index))
+    resources = _scim_resources(result)
+    for resource in resources:
+        yield resource
+    starts = _scim_starts(result, start_index, len(resources)) if workers > 1 else None
+    if starts is not None:
+        starts = iter(starts)
+
+        def submit(start):
+            return asyncio.ensure_future(fetch(dict(params, startIndex=start)))
+
+        pending = deque(submit(start) for start in islice(starts, workers))
+        try:
+            while pending:
+                resources = _scim_resources(await pending.popleft())
+                start = next(starts, None)
+                if start is not None:
+                    pending.append(submit(start))
+                for resource in resources:
+                    yield resource
+        finally:
+            for future in pending:
+                future.cancel()
+        return
+    while resources and _scim_has_next(result, start_index, len(resources)):
+        start_index += len(resources)
+        result = await fetch(dict(params, startIndex=start_index))
+        resources = _scim_resources(result)
+        for resource in resources:
+            yield resource
+
+
+def iter_scim_stream_pages(
+    stream: Callable[[Dict, ArrayParser], Iterator],
+    params: Dict = None,
+    count: int = 100,
+) -> Iterator[Dict]:
+    """Like :func:`iter_scim_pages`, decoding each page while it downloads."""
+    params = dict(params or {})
+    params["count"] = count
+    start_index = int(params.get("startIndex") or 1)
+    while True:
+        parser = ArrayParser("Resources")
+        received = 0
+        for item in stream(dict(params, startIndex=start_index), parser):
+            received += 1
+            yield item
+        if not received or not _scim_has_next(parser.envelope, start_index, received):
+            return
+        start_index += received
+
+
+async def aiter_scim_stream_pages(
+    stream: Callable,
+    params: Dict = None,
+    count: int = 100,
+) -> AsyncIterator[Dict]:
+    """asyncio version of :func:`iter_scim_stream_pages`."""
+    params = dict(params or {})
+    params["count"] = count
+    start_index = int(params.get("startIndex") or 1)
+    while True:
+        parser = ArrayParser("Resources")
+        received = 0
+        async for item in stream(dict(params, startIndex=start_index), parser):
+            received += 1
+            yield item
+        if not received or not _scim_has_next(parser.envelope, start_index, received):
+            return
+        start_index += received
@@ -0,0 +1,359 @@
+import base64
+import io
+import json
+import os
+import re
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Sequence, Tuple, Union
+import requests
+from formstack.bulk import BulkRun
+from formstack.exceptions import FormstackException, RateLimitException, detect_http_error
+from formstack.ratelimit import _parse_delay
+
+Source = Union[str, os.PathLike, bytes, BinaryIO]
+
+# Bytes read per chunk; a multiple of 3 so each chunk encodes on its own
+ENCODE_CHUNK_SIZE = 48 * 1024
+# Key of the base64 file contents in the tools' requests and responses
+CONTENTS_KEY = "contents"
+
+_CONTENTS = re.compile(rb'"(?:file_)?contents"\s*:\s*"')
+# Escapes a JSON encoder may put in a base64 string (PHP escapes "/")
+_ESCAPES = re.compile(rb"\\[/nr]")
+
+
+def encode_chunks(stream: BinaryIO, chunk_size: int = ENCODE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Base64 of ``stream``, encoded ``chunk_size`` bytes at a time."""
+    chunk_size -= chunk_size % 3
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield base64.b64encode(chunk)
+
+
+class ContentsExtractor:
+    """Push parser pulling the base64 file contents out of a tool response.
+
+    ``feed`` takes the next chunk of the JSON body and returns the base64
+    text found in it, so the contents are never held whole. ``files`` counts
+    the contents values seen (one per file, several for ``split_pdf``).
+    """
+
+    def __init__(self):
+        self.files = 0
+        self._inside = False
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> List[Tuple[int, bytes]]:
+        """Returns (file number, base64 text) pieces."""
+        buf = self._tail + chunk
+        self._tail = b""
+        out = []
+        pos = 0
+        while pos < len(buf):
+            if not self._inside:
+                match = _CONTENTS.search(buf, pos)
+                if match is None:
+                    # Keep enough to match a key split across chunks
+                    self._tail = buf[max(pos, len(buf) - 32) :]
+                    return out
+                self._inside = True
+                self.files += 1
+                pos = match.end()
+                continue
+            end = buf.find(b'"', pos)
+            piece = buf[pos : end if end >= 0 else len(buf)]
+            if piece.endswith(b"\\"):
+                # An escape split across chunks
+                self._tail = b"\\"
+                piece = piece[:-1]
+            if b"\\" in piece:
+                piece = _ESCAPES.sub(lambda m: b"/" if m.group() == b"\\/" else b"", piece)
+            if piece:
+                out.append((self.files, piece))
+            if end < 0:
+                return out
+            self._inside = False
+            pos = end + 1
+        return out
+
+
+class Base64Writer:
+    """Decode base64 text arriving in pieces of any length into ``file``."""
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.written = 0
+        self._rest = b""
+
+    def write(self, text: bytes):
+        text = self._rest + text
+        usable = len(text) - len(text) % 4
+        self._rest = text[usable:]
+        if usable:
+            data = base64.b64decode(text[:usable])
+            self.file.write(data)
+            self.written += len(data)
+
+    def close(self):
+        if self._rest:
+            self.write(b"=" * (-len(self._rest) % 4))
+
+
+class _Throttled(RateLimitException):
+    def __init__(self, message: str, delay: float):
+        super().__init__(message)
+        self.delay = delay
+
+
+class Step:
+    """One call of a Documents PDF tool; ``options`` go into the request
+    (``password`` for ``encrypt_pdf``, page ranges for ``split_pdf``, ...)."""
+
+    TOOLS = ("combine", "convert_to_pdf", "compress_pdf", "encrypt_pdf", "split_pdf")
+
+    def __init__(self, tool: str, **options):
+        if tool not in self.TOOLS:
+            raise ValueError(f"Unknown tool {tool!r}; expected one of {', '.join(self.TOOLS)}")
+        self.tool = tool
+        self.options = options
+
+    def __repr__(self):
+        return f"Step({self.tool})"
+
+
+def combine(**options) -> Step:
+    return Step("combine", **options)
+
+
+def convert(**options) -> Step:
+    return Step("convert_to_pdf", **options)
+
+
+def compress(**options) -> Step:
+    return Step("compress_pdf", **options)
+
+
+def encrypt(password: str, **options) -> Step:
+    return Step("encrypt_pdf", password=password, **options)
+
+
+def split(**options) -> Step:
+    return Step("split_pdf", **options)
+
+
+def _name(source: Source, default: str = "file.pdf") -> str:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(os.fspath(source))
+    return os.path.basename(getattr(source, "name", "") or default)
+
+
+class _Input:
+    # A source that can be read again from the start when a file is retried
+    def __init__(self, source: Source):
+        self.source = source
+        self.name = _name(source)
+        self._start = None
+
+    def open(self) -> BinaryIO:
+        if isinstance(self.source, (str, os.PathLike)):
+            return open(self.source, "rb")
+        if isinstance(self.source, (bytes, bytearray)):
+            return io.BytesIO(self.source)
+        if self._start is None:
+            self._start = self.source.tell()
+        else:
+            self.source.seek(self._start)
+        return _Unclosed(self.source)
+
+
+class _Unclosed:
+    # Leaves a caller's stream open
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def close(self):
+        pass
+
+
+def _body(step: Step, files: Sequence[Tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    # The JSON request with each file's base64 contents streamed in
+    options = json.dumps(step.options)[1:-1]
+    yield b"{" + (options.encode() + b"," if options else b"")
+    yield b'"files":[' if step.tool == "combine" else b'"file":'
+    for n, (name, contents) in enumerate(files):
+        name_json = json.dumps(name).encode()
+        yield (b"," if n else b"") + b'{"name":' + name_json + b',"' + CONTENTS_KEY.encode() + b'":"'
+        yield from contents
+        yield b'"}'
+    yield b"]}" if step.tool == "combine" else b"}"
+
+
+class PdfPipeline:
+    """Run files through a chain of Documents PDF tools, streaming throughout.
+
+    Inputs are base64-encoded while they are uploaded. Each step's response
+    is piped into the next step's request as it downloads, and the last
+    response is decoded straight into the output, so memory per file is a
+    few chunks whatever the file size. Files run on ``workers`` threads.
+
+    Pass steps such as ``[convert(), compress(), encrypt("secret")]``.
+    ``combine`` may only come first and takes several inputs; ``split``
+    may only come last and writes one file per part. The request bodies are
+    sent with chunked transfer encoding. A failed file is retried from its
+    input up to ``retries`` times, after any ``Retry-After`` delay of a 429.
+    """
+
+    def __init__(
+        self,
+        client,
+        steps: Sequence[Step],
+        workers: int = 4,
+        retries: int = 2,
+        chunk_size: int = ENCODE_CHUNK_SIZE,
+    ):
+        steps = list(steps)
+        if not steps:
+            raise ValueError("A pipeline needs at least one step")
+        if any(s.tool == "combine" for s in steps[1:]):
+            raise ValueError("combine can only be the first step")
+        if any(s.tool == "split_pdf" for s in steps[:-1]):
+            raise ValueError("split_pdf can only be the last step")
+        self.client = client
+        self.steps = steps
+        self.workers = workers
+        self.retries = retries
+        self.chunk_size = chunk_size
+
+    def _contents(self, response) -> Iterator[Tuple[int, bytes]]:
+        # (file number, base64 text) pieces of a streamed tool response
+        extractor = ContentsExtractor()
+        for chunk in response.iter_content(self.chunk_size):
+            yield from extractor.feed(chunk)
+        if not extractor.files:
+            raise FormstackException("No file contents in the tool response")
+
+    def _check(self, response):
+        if response.status_code == 429:
+            response.close()
+            limiter = self.client._rate_limiter
+            if limiter is not None:
+                delay = limiter.retry_after(response.headers)
+            else:
+                delay = _parse_delay(response.headers.get("Retry-After"))
+            raise _Throttled(detect_http_error(response), 1.0 if delay is None else delay)
+        if not 299 >= response.status_code >= 200:
+            message = detect_http_error(response) or f"{response.status_code} error"
+            response.close()
+            raise FormstackException(message)
+
+    def _run_once(self, inputs: List[_Input], write: Callable[[Iterator[Tuple[int, bytes]]], int]) -> int:
+        opened, responses = [], []
+        try:
+            for i in inputs:
+                opened.append(i.open())
+            files = [(i.name, encode_chunks(f, self.chunk_size)) for i, f in zip(inputs, opened)]
+            name = inputs[0].name
+            for step in self.steps:
+                if responses:
+                    # The previous response is read while this request is sent
+                    pieces = self._contents(responses[-1])
+                    files = [(name, (piece for _, piece in pieces))]
+                if step.tool == "convert_to_pdf":
+                    name = os.path.splitext(name)[0] + ".pdf"
+                responses.append(self.client._stream_tool(step.tool, _body(step, files)))
+                self._check(responses[-1])
+            return write(self._contents(responses[-1]))
+        finally:
+            for response in responses:
+                response.close()
+            for f in opened:
+                f.close()
+
+    def process(self, source: Union[Source, Sequence[Source]], dest) -> int:
+        """Run one file (several for ``combine``) through the steps into
+        ``dest``; returns the bytes written.
+
+        ``dest`` is a path or a binary stream, or for ``split`` a directory
+        (parts are named ``<input>-<n>.pdf``) or a callable from part number
+        to path.
+        """
+        many = self.steps[0].tool == "combine"
+        sources = list(source) if many else [source]
+        inputs = [_Input(s) for s in sources]
+        write = self._split_writer(inputs[0].name, dest) if self.steps[-1].tool == "split_pdf" else self._writer(dest)
+        attempt = 0
+        while True:
+            try:
+                return self._run_once(inputs, write)
+            except _Throttled as e:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(e.delay)
+            except (FormstackException, requests.exceptions.RequestException):
+                # Includes a connection dropped while a response streams in
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+
+    def _writer(self, dest):
+        def write(pieces) -> int:
+            if not isinstance(dest, (str, os.PathLike)):
+                if hasattr(dest, "seek"):
+                    dest.seek(0)
+                    dest.truncate()
+                writer = Base64Writer(dest)
+                for _, piece in pieces:
+                    writer.write(piece)
+                writer.close()
+                return writer.written
+            # Written next to the destination and renamed once complete
+            part = os.fspath(dest) + ".part"
+            with open(part, "wb") as f:
+                writer = Base64Writer(f)
+                for _, piece in pieces:
+                    writer.write(piece)
+                writer.close()
+            os.replace(part, dest)
+            return writer.written
+
+        return write
+
+    def _split_writer(self, name: str, dest):
+        stem = os.path.splitext(name)[0]
+
+        def path(n: int) -> str:
+            return dest(n) if callable(dest) else os.path.join(dest, f"{stem}-{n}.pdf")
+
+        def write(pieces) -> int:
+            total = 0
+            current, f, writer = None, None, None
+            try:
+                for n, piece in pieces:
+                    if n != current:
+                        if writer is not None:
+                            writer.close()
+                            f.close()
+                            total += writer.written
+                        current = n
+                        f = open(path(n), "wb")
+                        writer = Base64Writer(f)
+                    writer.write(piece)
+                if writer is not None:
+                    writer.close()
+                    total += writer.written
+            finally:
+                if f is not None:
+                    f.close()
+            return total
+
+        return write
+
+    def run(self, jobs: Iterable[Tuple[Union[Source, Sequence[Source]], object]], ordered: bool = False) -> BulkRun:
+        """Process ``(source, dest)`` pairs on the worker pool. Jobs are read
+        lazily; iterate the returned :class:`BulkRun` for the results."""
+        return BulkRun(lambda job: self.process(job[0], job[1]), jobs, workers=self.workers, ordered=ordered)
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping
+from formstack.exceptions import RateLimitException
+
+
+class RateLimiter:
+    """Client-side token bucket with a daily request budget.
+
+    Share one instance between every request of a client (or several clients
+    hitting the same account). ``rate`` is requests per second, ``burst`` the
+    bucket size and ``daily_limit`` the number of requests allowed per UTC day.
+    Any of them may be ``None`` to disable that limit. Rate-limit headers on
+    responses tighten the budget, and 429 responses are retried up to
+    ``max_retries`` times after the delay the server asks for, as long as that
+    delay is no longer than ``max_retry_after`` seconds.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: int = None,
+        daily_limit: int = None,
+        max_retries: int = 3,
+        default_retry_after: float = 1.0,
+        max_retry_after: float = 300.0,
+    ):
+        self.rate = rate
+        self.burst = burst or (max(1, int(rate)) if rate else 1)
+        self.daily_limit = daily_limit
+        self.max_retries = max_retries
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day = self._today()
+        self._used_today = 0
+        self._server_remaining = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    @property
+    def remaining(self):
+        """Requests left in today's budget, or ``None`` when unknown."""
+        with self._lock:
+            self._roll_day()
+            return self._remaining()
+
+    def _remaining(self):
+        local = None
+        if self.daily_limit is not None:
+            local = max(0, self.daily_limit - self._used_today)
+        if self._server_remaining is None:
+            return local
+        if local is None:
+            return self._server_remaining
+        return min(local, self._server_remaining)
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+            self._server_remaining = None
+
+    def reserve(self) -> float:
+        """Take one request slot and return how long to wait before sending."""
+        with self._lock:
+            self._roll_day()
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                raise RateLimitException(
+                    "Too Many Requests - The daily request budget is exhausted"
+                )
+            self._used_today += 1
+            if self._server_remaining is not None:
+                self._server_remaining -= 1
+            now = time.monotonic()
+            delay = max(0.0, self._paused_until - now)
+            if self.rate:
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / self.rate)
+            return delay
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def aacquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, headers: Mapping[str, str]):
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            try:
+                with self._lock:
+                    self._server_remaining = int(remaining)
+            except ValueError:
+                pass
+
+    def retry_after(self, headers: Mapping[str, str]) -> float:
+        """Delay requested by a 429 response; also pauses the whole bucket."""
+        delay = _parse_delay(headers.get("Retry-After"))
+        if delay is None:
+            reset = _parse_delay(headers.get("X-RateLimit-Reset"), epoch=True)
+            delay = reset if reset is not None else self.default_retry_after
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            # The request that got the 429 did not count against the budget
+            self._used_today = max(0, self._used_today - 1)
+        return delay
+
+
+def _parse_delay(value: str, epoch: bool = False):
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    if epoch and seconds > 1e9:
+        return max(0.0, seconds - time.time())
+    return max(0.0, seconds)
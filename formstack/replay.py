@@ -0,0 +1,346 @@
+import asyncio
+import base64
+import datetime
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlencode
+import requests
+from requests.structures import CaseInsensitiveDict
+from formstack.bulk import BulkRun
+from formstack.jsonstream import loads
+from formstack.transport import AsyncTransport, Transport
+
+ARCHIVE_VERSION = 1
+REDACTED = "REDACTED"
+# Lower-case names of the headers never written to an archive
+SECRET_HEADERS = frozenset(("authorization", "x-fs-encryption-password", "cookie", "set-cookie"))
+
+
+def redact(headers) -> Dict[str, str]:
+    return {
+        name: REDACTED if name.lower() in SECRET_HEADERS else value
+        for name, value in (headers or {}).items()
+    }
+
+
+def request_key(method: str, url: str, params: Dict = None) -> tuple:
+    """Key a recorded response is looked up by: method, URL and sorted params."""
+    if params:
+        url = url + "?" + urlencode(sorted((str(k), str(v)) for k, v in params.items()))
+    return method.upper(), url
+
+
+def _encode_body(content: bytes):
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(body) -> bytes:
+    if isinstance(body, dict):
+        return base64.b64decode(body["base64"])
+    return (body or "").encode("utf-8")
+
+
+class Archive:
+    """Writer for a gzip-compressed NDJSON archive of requests and responses.
+
+    The first line is a header; every other line is one exchange with its
+    start offset ``t`` and duration ``elapsed`` in seconds. Secret headers
+    are replaced with ``REDACTED``.
+    """
+
+    def __init__(self, path: str, compresslevel: int = 6):
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel)
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.records = 0
+        self._write({"version": ARCHIVE_VERSION, "recorded_at": time.time()})
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def add(
+        self,
+        started: float,
+        elapsed: float,
+        method: str,
+        url: str,
+        params: Dict,
+        headers: Dict,
+        data,
+        status: int,
+        reason: str,
+        response_headers,
+        content: bytes,
+    ):
+        self._write({
+            "t": round(started - self.started, 6),
+            "elapsed": round(elapsed, 6),
+            "method": method.upper(),
+            "url": url,
+            "params": params or None,
+            "headers": redact(headers),
+            "json": data,
+            "status": status,
+            "reason": reason,
+            "response_headers": redact(response_headers),
+            "body": _encode_body(content),
+        })
+        self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    """Yield the exchanges of an archive in recording order."""
+    with gzip.open(path, "rb") as f:
+        header = loads(f.readline())
+        if header.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version {header.get('version')!r}")
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+class RecordingTransport(Transport):
+    """:class:`Transport` that also writes every exchange to an :class:`Archive`.
+
+    Response bodies are read in full to be recorded, so streamed responses
+    are buffered while recording. Call ``close`` to finish the archive.
+    """
+
+    def __init__(self, path: str, compresslevel: int = 6, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = Archive(path, compresslevel)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        started = time.monotonic()
+        response = super().request(method, url, **kwargs)
+        self.archive.add(
+            started,
+            time.monotonic() - started,
+            method,
+            url,
+            kwargs.get("params"),
+            kwargs.get("headers"),
+            kwargs.get("json"),
+            response.status_code,
+            response.reason,
+            response.headers,
+            response.content,
+        )
+        return response
+
+    def close(self):
+        super().close()
+        self.archive.close()
+
+
+class AsyncRecordingTransport(AsyncTransport):
+    """asyncio version of :class:`RecordingTransport`; call ``aclose`` to
+    finish the archive."""
+
+    def __init__(self, path: str, compresslevel: int = 6, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = Archive(path, compresslevel)
+
+    async def request(self, method: str, url: str, **kwargs):
+        started = time.monotonic()
+        response = await super().request(method, url, **kwargs)
+        content = await response.aread()
+        self.archive.add(
+            started,
+            time.monotonic() - started,
+            method,
+            url,
+            kwargs.get("params"),
+            kwargs.get("headers"),
+            kwargs.get("json"),
+            response.status_code,
+            response.reason_phrase,
+            response.headers,
+            content,
+        )
+        return response
+
+    async def aclose(self):
+        await super().aclose()
+        self.archive.close()
+
+
+class _Recorded:
+    __slots__ = ("status", "reason", "headers", "content", "elapsed")
+
+    def __init__(self, record: Dict):
+        self.status = record["status"]
+        self.reason = record.get("reason")
+        self.headers = CaseInsensitiveDict(record.get("response_headers") or {})
+        self.content = _decode_body(record.get("body"))
+        self.elapsed = record.get("elapsed") or 0.0
+
+
+class _ReplayRequest:
+    __slots__ = ("method", "url", "headers")
+
+    def __init__(self, method: str, url: str, headers):
+        self.method = method
+        self.url = url
+        self.headers = headers
+
+
+class ReplayResponse:
+    """The parts of ``requests.Response`` the clients use, without the cost
+    of building a real one for every replayed request."""
+
+    __slots__ = ("status_code", "reason", "headers", "content", "url", "elapsed", "request")
+
+    def __init__(self, recorded: _Recorded, method: str, url: str, headers):
+        self.status_code = recorded.status
+        self.reason = recorded.reason
+        # Shared between replays of the same recorded response
+        self.headers = recorded.headers
+        self.content = recorded.content
+        self.url = url
+        self.elapsed = datetime.timedelta(seconds=recorded.elapsed)
+        self.request = _ReplayRequest(method, url, headers or {})
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return loads(self.content)
+
+    def iter_content(self, chunk_size: int = 1, decode_unicode: bool = False):
+        if not chunk_size:
+            yield self.content
+            return
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class ReplayIndex:
+    """Recorded responses by :func:`request_key`, served in recording order.
+
+    Bodies are decoded once at load time, so a lookup is a dict access and a
+    deque pop. When the responses for a key run out the last one is repeated;
+    a request that was never recorded raises ``KeyError``.
+    """
+
+    def __init__(self, path: str):
+        self._queues: Dict[tuple, deque] = {}
+        self._last: Dict[tuple, _Recorded] = {}
+        self._lock = threading.Lock()
+        for record in read_archive(path):
+            key = request_key(record["method"], record["url"], record.get("params"))
+            self._queues.setdefault(key, deque()).append(_Recorded(record))
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def next(self, method: str, url: str, params: Dict = None) -> _Recorded:
+        key = request_key(method, url, params)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                recorded = self._last[key] = queue.popleft()
+                return recorded
+            recorded = self._last.get(key)
+        if recorded is None:
+            raise KeyError(f"No recorded response for {key[0]} {key[1]}")
+        return recorded
+
+
+class ReplayTransport(Transport):
+    """:class:`Transport` serving responses from an archive without any
+    network I/O.
+
+    ``speed`` None answers at once; otherwise each response is delayed by its
+    recorded duration divided by ``speed`` (1.0 for the original timing).
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.index = ReplayIndex(path)
+        self.speed = speed
+
+    def request(self, method: str, url: str, params: Dict = None, trace=None, **kwargs) -> ReplayResponse:
+        recorded = self.index.next(method, url, params)
+        if self.speed:
+            time.sleep(recorded.elapsed / self.speed)
+        return ReplayResponse(recorded, method, url, kwargs.get("headers"))
+
+
+class AsyncReplayTransport(AsyncTransport):
+    """asyncio version of :class:`ReplayTransport` (needs ``httpx`` for the
+    response objects)."""
+
+    def __init__(self, path: str, speed: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.index = ReplayIndex(path)
+        self.speed = speed
+
+    async def request(self, method: str, url: str, params: Dict = None, trace=None, **kwargs):
+        recorded = self.index.next(method, url, params)
+        if self.speed:
+            await asyncio.sleep(recorded.elapsed / self.speed)
+        if trace is not None:
+            trace.ttfb = recorded.elapsed
+        httpx = self._httpx
+        return httpx.Response(
+            recorded.status,
+            headers=recorded.headers,
+            content=recorded.content,
+            request=httpx.Request(method, url, headers=kwargs.get("headers")),
+        )
+
+
+def replay_traffic(client, path: str, speed: Optional[float] = None, workers: int = 8) -> BulkRun:
+    """Re-issue the requests of an archive through ``client`` (a blocking
+    client, typically on a :class:`ReplayTransport` of the same archive).
+
+    With ``speed`` each request starts at its recorded offset divided by
+    ``speed``; without, requests go out as fast as ``workers`` allow. Returns
+    the :class:`BulkRun`; iterate it to drive the replay.
+    """
+    records = [
+        r for r in read_archive(path) if r["url"].startswith(client.url)
+    ]
+    started = time.monotonic()
+
+    def send(record: Dict):
+        if speed:
+            delay = started + record["t"] / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        method = record["method"].lower()
+        kwargs = {"endpoint": record["url"][len(client.url) :], "params": record.get("params")}
+        if method != "get":
+            kwargs["data"] = record.get("json")
+        return getattr(client, method)(**kwargs)
+
+    return BulkRun(send, records, workers=workers)
@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from typing import Iterable
+from formstack.exceptions import CircuitOpenException
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for failed requests.
+
+    Only idempotent methods are retried by default; add ``"POST"`` to
+    ``methods`` to opt in for calls such as ``create_form_submission``.
+    Connection errors and the ``statuses`` listed are retried up to
+    ``max_retries`` times, waiting a random time between zero and
+    ``backoff_factor * 2 ** attempt`` seconds (capped at ``max_backoff``).
+    """
+
+    DEFAULT_METHODS = frozenset(("GET", "PUT", "DELETE"))
+    DEFAULT_STATUSES = frozenset((500, 502, 503, 504))
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        jitter: bool = True,
+        methods: Iterable[str] = DEFAULT_METHODS,
+        statuses: Iterable[int] = DEFAULT_STATUSES,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.methods = frozenset(m.upper() for m in methods)
+        self.statuses = frozenset(statuses)
+
+    def allows(self, method: str, attempt: int) -> bool:
+        return attempt < self.max_retries and method.upper() in self.methods
+
+    def should_retry_status(self, method: str, status_code: int, attempt: int) -> bool:
+        return status_code in self.statuses and self.allows(method, attempt)
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
+
+
+class CircuitBreaker:
+    """Fail fast while a host keeps failing.
+
+    After ``failure_threshold`` consecutive connection errors or 5xx responses
+    the circuit opens and requests raise :class:`CircuitOpenException` for
+    ``reset_timeout`` seconds. Then a single trial request is let through; its
+    outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_request(self, host: str = "") -> bool:
+        """Raise while the circuit is open; returns True for the trial request."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenException(
+                    f"Circuit open for {host or 'host'} after {self.failures} failures"
+                )
+            self._trial = True
+            return True
+
+    def release_trial(self):
+        # The trial request ended without an outcome (it was cancelled or
+        # never sent), so the next request becomes the trial
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def record(self, status_code: int):
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
@@ -0,0 +1,142 @@
+import json
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+from formstack.exceptions import FormstackException
+
+NUMERIC_TYPES = frozenset(("number", "rating"))
+MULTI_TYPES = frozenset(("checkbox",))
+META_COLUMNS = ("id", "timestamp")
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _multi(value):
+    if value in (None, ""):
+        return ()
+    if isinstance(value, (list, tuple)):
+        return tuple(str(v) for v in value)
+    return tuple(v for v in str(value).split("\n") if v)
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _data_items(submission: Dict):
+    data = submission.get("data") or ()
+    return data.values() if isinstance(data, dict) else data
+
+
+class FieldIndex:
+    """Column layout for the submissions of one form.
+
+    Build it once from ``get_form_fields`` and reuse it for every submission
+    of the form. ``columns`` is ``id``, ``timestamp`` and then one column per
+    field in form order; values are converted by field type (numbers to
+    ``float``, checkboxes to tuples, structured values to JSON text).
+    """
+
+    __slots__ = ("field_ids", "labels", "types", "columns", "_positions", "_converters")
+
+    def __init__(self, fields: List[Dict]):
+        if not isinstance(fields, list):
+            raise FormstackException(fields)
+        self.field_ids = tuple(str(f["id"]) for f in fields)
+        self.labels = tuple(f.get("label") or str(f["id"]) for f in fields)
+        self.types = tuple(f.get("type") or f.get("field_type") or "" for f in fields)
+        self.columns = META_COLUMNS + self.field_ids
+        offset = len(META_COLUMNS)
+        self._positions = {fid: offset + i for i, fid in enumerate(self.field_ids)}
+        self._converters = tuple(self._converter(t) for t in self.types)
+
+    @classmethod
+    def for_form(cls, client, form_id) -> "FieldIndex":
+        return cls(client.get_form_fields(id=form_id))
+
+    @staticmethod
+    def _converter(field_type: str):
+        if field_type in NUMERIC_TYPES:
+            return _number
+        if field_type in MULTI_TYPES:
+            return _multi
+        return _text
+
+    def label(self, column: str) -> str:
+        position = self._positions.get(column)
+        if position is None:
+            return column
+        return self.labels[position - len(META_COLUMNS)]
+
+    def to_row(self, submission: Dict) -> Tuple:
+        row = [submission.get("id"), submission.get("timestamp")]
+        row.extend([None] * len(self.field_ids))
+        offset = len(META_COLUMNS)
+        for item in _data_items(submission):
+            position = self._positions.get(str(item.get("field")))
+            if position is not None:
+                row[position] = self._converters[position - offset](item.get("value"))
+        return tuple(row)
+
+    def rows(self, submissions: Iterable[Dict]) -> Iterator[Tuple]:
+        for submission in submissions:
+            yield self.to_row(submission)
+
+    def to_columns(self, submissions: Iterable[Dict]) -> Dict[str, object]:
+        """Convert a batch into one sequence per column.
+
+        Numeric fields become ``array('d')`` with NaN for missing values, so
+        they can be handed to NumPy/pandas without per-cell objects.
+        """
+        offset = len(META_COLUMNS)
+        numeric = [t in NUMERIC_TYPES for t in self.types]
+        columns = [[] for _ in META_COLUMNS]
+        columns += [array("d") if n else [] for n in numeric]
+        nan = float("nan")
+        count = 0
+        for submission in submissions:
+            columns[0].append(submission.get("id"))
+            columns[1].append(submission.get("timestamp"))
+            count += 1
+            for item in _data_items(submission):
+                position = self._positions.get(str(item.get("field")))
+                if position is None:
+                    continue
+                column = columns[position]
+                if len(column) == count:
+                    continue
+                # Pad fields missing from earlier submissions
+                missing = count - 1 - len(column)
+                if missing:
+                    column.extend([nan if numeric[position - offset] else None] * missing)
+                value = self._converters[position - offset](item.get("value"))
+                column.append(nan if value is None and numeric[position - offset] else value)
+        for i, column in enumerate(columns[offset:]):
+            missing = count - len(column)
+            if missing:
+                column.extend([nan if numeric[i] else None] * missing)
+        return dict(zip(self.columns, columns))
+
+    def to_frame(self, submissions: Iterable[Dict], labels: bool = False):
+        # Requires pandas; numeric columns are wrapped without copying cells
+        import numpy
+        import pandas
+
+        columns = self.to_columns(submissions)
+        frame = pandas.DataFrame(
+            {
+                name: numpy.frombuffer(col, dtype=numpy.float64) if isinstance(col, array) else col
+                for name, col in columns.items()
+            }
+        )
+        if labels:
+            frame.columns = [self.label(c) for c in frame.columns]
+        return frame
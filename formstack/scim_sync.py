@@ -0,0 +1,320 @@
+from typing import Callable, Dict, Iterable, List, Optional
+from formstack.bulk import BulkResult, BulkRun, BulkStats
+from formstack.exceptions import FormstackException
+from formstack.forms_scim import patch_request
+
+# Attributes the server owns or never returns, so they are not compared
+IGNORED_ATTRIBUTES = frozenset(("id", "schemas", "meta", "password", "groups", "members"))
+
+
+def _fold(value) -> Optional[str]:
+    # userName is case-insensitive in SCIM
+    return value.lower() if isinstance(value, str) else value
+
+
+class Change:
+    """One create, update or delete of a SCIM resource."""
+
+    __slots__ = ("action", "resource", "id", "key", "data")
+
+    def __init__(self, action: str, resource: str, id: str = None, key: str = None, data=None):
+        self.action = action
+        self.resource = resource
+        self.id = id
+        self.key = key
+        # Full resource for "create", PATCH operations for "update"
+        self.data = data
+
+    def request(self):
+        """The change as (method, path, body)."""
+        if self.action == "create":
+            return "POST", self.resource, self.data
+        if self.action == "update":
+            return "PATCH", f"{self.resource}/{self.id}", self.data
+        return "DELETE", f"{self.resource}/{self.id}", None
+
+    def __repr__(self):
+        return f"Change({self.action} {self.resource} {self.key or self.id})"
+
+
+class SyncPlan:
+    __slots__ = ("creates", "updates", "deletes", "unchanged")
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = 0
+
+    def __iter__(self):
+        yield from self.creates
+        yield from self.updates
+        yield from self.deletes
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def __repr__(self):
+        return (
+            f"SyncPlan(creates={len(self.creates)}, updates={len(self.updates)}, "
+            f"deletes={len(self.deletes)}, unchanged={self.unchanged})"
+        )
+
+
+class SyncReport:
+    def __init__(self):
+        self.users = SyncPlan()
+        self.groups = SyncPlan()
+        self.stats = BulkStats()
+        self.errors = []
+
+    def record(self, result: BulkResult):
+        self.stats.record(result)
+        if not result.ok:
+            self.errors.append(result)
+
+    def __repr__(self):
+        return f"SyncReport(users={self.users!r}, groups={self.groups!r}, errors={len(self.errors)})"
+
+
+class UserIndex:
+    """Existing users by id, userName and externalId."""
+
+    def __init__(self, users: Iterable[Dict] = ()):
+        self.by_id = {}
+        self.by_name = {}
+        self.by_external_id = {}
+        for user in users:
+            self.add(user)
+
+    def add(self, user: Dict):
+        self.by_id[user["id"]] = user
+        if user.get("userName"):
+            self.by_name[_fold(user["userName"])] = user
+        if user.get("externalId"):
+            self.by_external_id[user["externalId"]] = user
+
+    def find(self, user: Dict) -> Optional[Dict]:
+        if user.get("externalId") and user["externalId"] in self.by_external_id:
+            return self.by_external_id[user["externalId"]]
+        return self.by_name.get(_fold(user.get("userName")))
+
+    def resolve(self, member: str) -> Optional[str]:
+        # Group members are given as userName or externalId
+        user = self.by_name.get(_fold(member)) or self.by_external_id.get(member)
+        return user["id"] if user else None
+
+
+def _matches(current, desired) -> bool:
+    # Complex attributes match if every desired sub-attribute does, so values
+    # the server fills in (name.formatted, ...) do not count as changes
+    if isinstance(desired, dict) and isinstance(current, dict):
+        return all(_matches(current.get(k), v) for k, v in desired.items())
+    return current == desired
+
+
+def diff_attributes(current: Dict, desired: Dict) -> List[Dict]:
+    """PATCH ``replace`` operations for the desired attributes that differ."""
+    operations = []
+    for name, value in desired.items():
+        if name in IGNORED_ATTRIBUTES:
+            continue
+        if name == "userName" and _fold(current.get(name)) == _fold(value):
+            continue
+        if not _matches(current.get(name), value):
+            operations.append({"op": "replace", "path": name, "value": value})
+    return operations
+
+
+class DirectorySync:
+    """Make the SCIM users and groups of a Formstack account match a desired state.
+
+    ``users`` are SCIM user resources (``userName`` required, matched on
+    ``externalId`` first). ``groups`` have a ``displayName`` and ``members``
+    given as userNames or externalIds; members that match no user are
+    skipped. Existing resources are paged in once and indexed; only the
+    needed creates, PATCH updates and deletes are sent, on ``workers``
+    threads and under the client's rate limiter. With
+    ``bulk`` (default: when ServiceProviderConfig says it is supported) the
+    changes go out as SCIM Bulk requests of up to ``bulk_size`` operations.
+    Users missing from ``users`` are deleted, deactivated
+    (``deprovision="deactivate"``) or left alone (``None``).
+    """
+
+    def __init__(
+        self,
+        client,
+        workers: int = 8,
+        bulk: bool = None,
+        bulk_size: int = 100,
+        deprovision: Optional[str] = "delete",
+        count: int = 100,
+    ):
+        if deprovision not in ("delete", "deactivate", None):
+            raise ValueError("deprovision must be 'delete', 'deactivate' or None")
+        self.client = client
+        self.workers = workers
+        self.bulk = bulk
+        self.bulk_size = bulk_size
+        self.deprovision = deprovision
+        self.count = count
+
+    def _bulk_supported(self) -> bool:
+        if self.bulk is None:
+            try:
+                config = self.client.get_service_provider_config()
+            except Exception:
+                config = None
+            bulk = config.get("bulk") if isinstance(config, dict) else None
+            self.bulk = bool(bulk and bulk.get("supported"))
+            if self.bulk and bulk.get("maxOperations"):
+                self.bulk_size = min(self.bulk_size, int(bulk["maxOperations"]))
+        return self.bulk
+
+    def load_users(self, desired: List[Dict] = ()) -> UserIndex:
+        # Only request the attributes that are compared
+        names = {"userName", "externalId"}
+        if self.deprovision == "deactivate":
+            names.add("active")
+        for user in desired:
+            names.update(n for n in user if n not in IGNORED_ATTRIBUTES)
+        return UserIndex(
+            # The plan is diffed against the live directory, never a cached listing
+            self.client.iter_users(
+                count=self.count, attributes=sorted(names), workers=self.workers, cache=False
+            )
+        )
+
+    def load_groups(self) -> Dict[str, Dict]:
+        return {
+            group["displayName"]: group
+            for group in self.client.iter_groups(count=self.count, workers=self.workers, cache=False)
+        }
+
+    def plan_users(self, desired: Iterable[Dict], index: UserIndex) -> SyncPlan:
+        plan = SyncPlan()
+        matched = set()
+        for user in desired:
+            current = index.find(user)
+            if current is None:
+                plan.creates.append(Change("create", "Users", key=user.get("userName"), data=user))
+                continue
+            matched.add(current["id"])
+            operations = diff_attributes(current, user)
+            if operations:
+                plan.updates.append(Change("update", "Users", current["id"], user.get("userName"), operations))
+            else:
+                plan.unchanged += 1
+        if self.deprovision is not None:
+            for id, current in index.by_id.items():
+                if id in matched:
+                    continue
+                if self.deprovision == "delete":
+                    plan.deletes.append(Change("delete", "Users", id, current.get("userName")))
+                elif current.get("active", True):
+                    operations = [{"op": "replace", "path": "active", "value": False}]
+                    plan.updates.append(Change("update", "Users", id, current.get("userName"), operations))
+        return plan
+
+    def plan_groups(
+        self, desired: Iterable[Dict], current: Dict[str, Dict], index: UserIndex
+    ) -> SyncPlan:
+        plan = SyncPlan()
+        wanted = set()
+        for group in desired:
+            name = group["displayName"]
+            wanted.add(name)
+            members = {index.resolve(m) for m in group.get("members", ())}
+            members.discard(None)
+            existing = current.get(name)
+            if existing is None:
+                data = {k: v for k, v in group.items() if k != "members"}
+                data["members"] = [{"value": m} for m in sorted(members)]
+                plan.creates.append(Change("create", "Groups", key=name, data=data))
+                continue
+            have = {m["value"] for m in existing.get("members") or ()}
+            operations = diff_attributes(existing, {k: v for k, v in group.items() if k != "displayName"})
+            added = sorted(members - have)
+            if added:
+                operations.append({"op": "add", "path": "members", "value": [{"value": m} for m in added]})
+            for m in sorted(have - members):
+                operations.append({"op": "remove", "path": f'members[value eq "{m}"]'})
+            if operations:
+                plan.updates.append(Change("update", "Groups", existing["id"], name, operations))
+            else:
+                plan.unchanged += 1
+        if self.deprovision == "delete":
+            for name, existing in current.items():
+                if name not in wanted:
+                    plan.deletes.append(Change("delete", "Groups", existing["id"], name))
+        return plan
+
+    def _send(self, change: Change):
+        method, path, body = change.request()
+        if method == "POST":
+            return self.client.post(endpoint=path, data=body)
+        if method == "PATCH":
+            return self.client.patch(endpoint=path, data=patch_request(body))
+        return self.client.delete(endpoint=path)
+
+    def _send_bulk(self, changes: List[Change]) -> List[Dict]:
+        operations = []
+        for n, change in enumerate(changes):
+            method, path, body = change.request()
+            operation = {"method": method, "path": "/" + path, "bulkId": str(n)}
+            if method == "PATCH":
+                operation["data"] = patch_request(body)
+            elif body is not None:
+                operation["data"] = body
+            operations.append(operation)
+        response = self.client.bulk(operations)
+        if not isinstance(response, dict):
+            raise FormstackException(response)
+        results = response.get("Operations") or []
+        failed = [r for r in results if int(r.get("status", 200)) >= 400]
+        if failed:
+            raise FormstackException(failed)
+        return results
+
+    def apply(self, changes: List[Change], report: SyncReport, on_created: Callable = None):
+        """Send ``changes`` and record every outcome in ``report``."""
+        if not changes:
+            return
+        if self._bulk_supported():
+            chunks = [changes[i : i + self.bulk_size] for i in range(0, len(changes), self.bulk_size)]
+            for result in BulkRun(self._send_bulk, chunks, workers=self.workers):
+                report.record(result)
+                if result.ok and on_created is not None:
+                    for change, outcome in zip(result.item, result.result):
+                        if change.action == "create" and outcome.get("location"):
+                            on_created(change, {"id": outcome["location"].rstrip("/").rsplit("/", 1)[-1]})
+            return
+        for result in BulkRun(self._send, changes, workers=self.workers):
+            report.record(result)
+            if result.ok and on_created is not None and result.item.action == "create":
+                on_created(result.item, result.result)
+
+    def run(self, users: Iterable[Dict], groups: Iterable[Dict] = None, dry_run: bool = False) -> SyncReport:
+        """Plan and apply the sync. With ``dry_run`` only the plans are built.
+
+        Users are created and updated first so new members can be added to
+        groups; users are deleted last.
+        """
+        users = list(users)
+        report = SyncReport()
+        index = self.load_users(users)
+        report.users = self.plan_users(users, index)
+
+        def created(change: Change, resource):
+            if isinstance(resource, dict) and resource.get("id"):
+                index.add(dict(change.data, id=resource["id"]))
+
+        if not dry_run:
+            self.apply(report.users.creates + report.users.updates, report, on_created=created)
+        if groups is not None:
+            report.groups = self.plan_groups(groups, self.load_groups(), index)
+            if not dry_run:
+                self.apply(list(report.groups), report)
+        if not dry_run:
+            self.apply(report.users.deletes, report)
+        return report
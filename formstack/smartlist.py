@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable, Dict, Iterable, Union
+from formstack.bulk import AsyncBulkRun, BulkResult, BulkRun
+
+Option = Union[str, Dict]
+
+
+def _option(option: Option) -> Dict:
+    if isinstance(option, dict):
+        return option
+    return {"label": str(option), "value": str(option)}
+
+
+def _key(option: Dict):
+    label = option.get("label")
+    value = option.get("value", label)
+    return (str(label), str(value))
+
+
+def _desired(options: Iterable[Option]) -> Dict:
+    desired = {}
+    for option in map(_option, options):
+        desired.setdefault(_key(option), option)
+    return desired
+
+
+class UploadProgress:
+    def __init__(self, chunks_total: int, unchanged: int):
+        self.chunks_total = chunks_total
+        self.chunks_done = 0
+        self.chunks_failed = 0
+        self.options_sent = 0
+        self.options_deleted = 0
+        self.unchanged = unchanged
+        self.errors = []
+
+    def __repr__(self):
+        return (
+            f"UploadProgress(chunks_done={self.chunks_done}/{self.chunks_total}, "
+            f"chunks_failed={self.chunks_failed}, options_sent={self.options_sent}, "
+            f"options_deleted={self.options_deleted}, unchanged={self.unchanged})"
+        )
+
+
+class _Upload:
+    # Chunks of one run and the bookkeeping shared by run and arun
+    def __init__(self, uploader: "SmartlistUploader", add, unchanged: int):
+        self.uploader = uploader
+        size = uploader.chunk_size
+        self.chunks = [add[i : i + size] for i in range(0, len(add), size)]
+        # Chunks are identified by position within this exact set of options
+        self.fingerprint = hashlib.sha1(
+            json.dumps([uploader.id, size, [_key(o) for o in add]]).encode()
+        ).hexdigest()
+        self.done = uploader._load_state(self.fingerprint)
+        self.progress = UploadProgress(len(self.chunks), unchanged)
+        self.progress.chunks_done = len(self.done)
+
+    def todo(self):
+        return (i for i in range(len(self.chunks)) if i not in self.done)
+
+    def send(self, index: int):
+        chunk = self.chunks[index]
+        return self.uploader.client.update_smartlist_options_bulk(id=self.uploader.id, data={"options": chunk})
+
+    def sent(self, result: BulkResult):
+        progress = self.progress
+        if result.ok:
+            progress.chunks_done += 1
+            progress.options_sent += len(self.chunks[result.item])
+            self.done.add(result.item)
+            self.uploader._save_state(self.fingerprint, self.done)
+        else:
+            progress.chunks_failed += 1
+            progress.errors.append(result)
+        if self.uploader.progress is not None:
+            self.uploader.progress(progress)
+
+    def delete(self, option: Dict):
+        return self.uploader.client.delete_smartlist_option(id=self.uploader.id, option_id=option["id"])
+
+    def deleted(self, result: BulkResult):
+        if result.ok:
+            self.progress.options_deleted += 1
+        else:
+            self.progress.errors.append(result)
+
+
+class SmartlistUploader:
+    """Upload a large option set to a smartlist in chunks.
+
+    Options already in the smartlist (same label and value, read with
+    ``get_smartlist_options``) are skipped; the rest are sent with
+    ``update_smartlist_options_bulk`` in chunks of ``chunk_size`` on
+    ``workers`` threads. With ``delete_missing`` options not in the input are
+    deleted. With ``state_path`` finished chunks are recorded, so a rerun
+    after a failure skips them even without the diff (``diff=False``).
+    ``progress`` is called with the :class:`UploadProgress` after each chunk.
+    With the asyncio clients, await :meth:`arun` instead of calling ``run``.
+    """
+
+    def __init__(
+        self,
+        client,
+        id: int,
+        chunk_size: int = 500,
+        workers: int = 4,
+        diff: bool = True,
+        delete_missing: bool = False,
+        state_path: str = None,
+        progress: Callable[[UploadProgress], None] = None,
+    ):
+        self.client = client
+        self.id = id
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.diff = diff
+        self.delete_missing = delete_missing
+        self.state_path = state_path
+        self.progress = progress
+
+    def current(self) -> Dict:
+        return {_key(option): option for option in self.client.iter_smartlist_options(self.id)}
+
+    async def acurrent(self) -> Dict:
+        return {_key(option): option async for option in self.client.iter_smartlist_options(self.id)}
+
+    def _diff(self, desired: Dict, current: Dict):
+        add = [option for key, option in desired.items() if key not in current]
+        delete = []
+        if self.delete_missing:
+            delete = [option for key, option in current.items() if key not in desired]
+        return add, delete, len(desired) - len(add)
+
+    def plan(self, options: Iterable[Option]):
+        """Split the input into (options to add, options to delete, unchanged count)."""
+        desired = _desired(options)
+        if not self.diff:
+            return list(desired.values()), [], 0
+        return self._diff(desired, self.current())
+
+    async def aplan(self, options: Iterable[Option]):
+        desired = _desired(options)
+        if not self.diff:
+            return list(desired.values()), [], 0
+        return self._diff(desired, await self.acurrent())
+
+    def _load_state(self, fingerprint: str) -> set:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return set()
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get("fingerprint") != fingerprint:
+            return set()
+        return set(state.get("done", ()))
+
+    def _save_state(self, fingerprint: str, done: set):
+        if not self.state_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"fingerprint": fingerprint, "done": sorted(done)}, f)
+        os.replace(tmp, self.state_path)
+
+    def run(self, options: Iterable[Option]) -> UploadProgress:
+        add, delete, unchanged = self.plan(options)
+        upload = _Upload(self, add, unchanged)
+        for result in BulkRun(upload.send, upload.todo(), workers=self.workers):
+            upload.sent(result)
+        for result in BulkRun(upload.delete, delete, workers=self.workers):
+            upload.deleted(result)
+        return upload.progress
+
+    async def arun(self, options: Iterable[Option]) -> UploadProgress:
+        """:meth:`run` for the asyncio clients."""
+        add, delete, unchanged = await self.aplan(options)
+        upload = _Upload(self, add, unchanged)
+        async for result in AsyncBulkRun(upload.send, upload.todo(), workers=self.workers):
+            upload.sent(result)
+        async for result in AsyncBulkRun(upload.delete, delete, workers=self.workers):
+            upload.deleted(result)
+        return upload.progress
@@ -0,0 +1,352 @@
+import asyncio
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict
+from urllib.parse import urlsplit
+from formstack.ratelimit import RateLimiter
+from formstack.retry import CircuitBreaker, RetryPolicy
+
+
+class _Breakers:
+    # One circuit breaker per host; disabled when failure_threshold is None
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str):
+        if self.failure_threshold is None:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+
+class _Attempts:
+    # Retry bookkeeping shared by the sync and async request loops. The
+    # on_* methods return a delay before the next attempt, or None to stop.
+    def __init__(self, method, host, breaker, rate_limiter, retry):
+        self.method = method
+        self.host = host
+        self.breaker = breaker
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.retries = 0
+        self.throttled = 0
+        self.trial = False
+
+    def before(self):
+        if self.breaker is not None:
+            self.trial = self.breaker.before_request(self.host)
+
+    def abandon(self):
+        # Called when an attempt ends; a trial request with no recorded
+        # outcome gives up its slot rather than keep the circuit open
+        if self.trial:
+            self.trial = False
+            self.breaker.release_trial()
+
+    def on_error(self):
+        self.trial = False
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if self.retry is None or not self.retry.allows(self.method, self.retries):
+            return None
+        delay = self.retry.backoff(self.retries)
+        self.retries += 1
+        return delay
+
+    def on_response(self, status_code: int, headers):
+        self.trial = False
+        if self.breaker is not None:
+            self.breaker.record(status_code)
+        limiter = self.rate_limiter
+        if limiter is not None:
+            limiter.update(headers)
+            if status_code == 429 and self.throttled < limiter.max_retries:
+                delay = limiter.retry_after(headers)
+                if delay <= limiter.max_retry_after:
+                    self.throttled += 1
+                    return delay
+        retry = self.retry
+        if retry is not None and retry.should_retry_status(
+            self.method, status_code, self.retries
+        ):
+            delay = retry.backoff(self.retries)
+            self.retries += 1
+            return delay
+        return None
+
+    def report(self, trace, response=None):
+        if trace is not None:
+            trace.retries = self.retries + self.throttled
+            if response is not None:
+                trace.bytes_sent = int(response.request.headers.get("content-length", 0))
+
+
+def _httpx_trace(trace):
+    # httpx "trace" extension callback filling in connect time (DNS, TCP and
+    # TLS of a new connection) and time to the response headers
+    started = {}
+
+    async def callback(event: str, info):
+        name, _, stage = event.rpartition(".")
+        now = time.monotonic()
+        if stage == "started":
+            started[name] = now
+            return
+        if stage != "complete" or name not in started:
+            return
+        if name == "connection.connect_tcp":
+            trace.connect = now - started[name]
+        elif name == "connection.start_tls":
+            trace.connect = (trace.connect or 0) + now - started[name]
+        elif name.endswith(".receive_response_headers"):
+            sent = next((t for n, t in started.items() if n.endswith(".send_request_headers")), None)
+            if sent is not None:
+                trace.ttfb = now - sent
+
+    return callback
+
+
+class Transport:
+    """Pooled, keep-alive HTTP transport shared by the Formstack clients.
+
+    One ``requests.Session`` is kept per host so that every client talking to
+    the same host reuses the same connection pool instead of opening a new
+    TCP+TLS connection for each call. Setting ``failure_threshold`` enables a
+    per-host :class:`~formstack.retry.CircuitBreaker`.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keep_alive: bool = True,
+        timeout: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = 30.0,
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._breakers = _Breakers(failure_threshold, reset_timeout)
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str):
+        return self._breakers.get(urlsplit(url).netloc)
+
+    def session(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[host] = session
+        return session
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        trace=None,
+        **kwargs,
+    ) -> requests.Response:
+        """``trace``, a :class:`~formstack.instrumentation.RequestTrace`,
+        gets the retry count and request size."""
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        session = self.session(url)
+        attempts = _Attempts(
+            method, host, self._breakers.get(host), rate_limiter, retry
+        )
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            attempts.before()
+            try:
+                response = session.request(method=method, url=url, **kwargs)
+            except requests.exceptions.RequestException:
+                delay = attempts.on_error()
+                if delay is None:
+                    attempts.report(trace)
+                    raise
+                time.sleep(delay)
+                continue
+            finally:
+                attempts.abandon()
+            delay = attempts.on_response(response.status_code, response.headers)
+            if delay is None:
+                attempts.report(trace, response)
+                return response
+            response.close()
+            time.sleep(delay)
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def default_transport() -> Transport:
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport
+
+
+class AsyncTransport:
+    """asyncio counterpart of :class:`Transport` built on ``httpx``.
+
+    ``httpx.AsyncClient`` pools connections per origin, so one client is kept
+    per ``verify`` setting. It must be used from a single event loop, and
+    httpx errors are re-raised as the matching ``requests`` exceptions.
+    ``httpx_transport`` replaces the network layer of those clients, e.g.
+    with an ``httpx.MockTransport``.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keep_alive: bool = True,
+        timeout: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = 30.0,
+        httpx_transport=None,
+    ):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("AsyncTransport requires httpx (pip install httpx)") from e
+        self._httpx = httpx
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections if keep_alive else 0,
+        )
+        self.timeout = timeout
+        self._httpx_transport = httpx_transport
+        self._clients = {}
+        self._breakers = _Breakers(failure_threshold, reset_timeout)
+
+    def breaker(self, url: str):
+        return self._breakers.get(urlsplit(url).netloc)
+
+    def client(self, verify: bool = True):
+        client = self._clients.get(verify)
+        if client is None:
+            client = self._httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self.timeout,
+                verify=verify,
+                transport=self._httpx_transport,
+            )
+            self._clients[verify] = client
+        return client
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        trace=None,
+        **kwargs,
+    ):
+        client = self.client(verify)
+        if trace is not None:
+            kwargs["extensions"] = {"trace": _httpx_trace(trace)}
+        host = urlsplit(url).netloc
+        attempts = _Attempts(
+            method, host, self._breakers.get(host), rate_limiter, retry
+        )
+        while True:
+            if rate_limiter is not None:
+                await rate_limiter.aacquire()
+            attempts.before()
+            try:
+                response = await self._send(client, method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                delay = attempts.on_error()
+                if delay is None:
+                    attempts.report(trace)
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                attempts.abandon()
+            delay = attempts.on_response(response.status_code, response.headers)
+            if delay is None:
+                attempts.report(trace, response)
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+    async def _send(self, client, method: str, url: str, stream: bool = False, **kwargs):
+        # Surface httpx failures as requests exceptions so the sync and async
+        # clients handle transport errors the same way.
+        httpx = self._httpx
+        try:
+            if stream:
+                auth = kwargs.pop("auth", None)
+                request = client.build_request(method=method, url=url, **kwargs)
+                return await client.send(request, auth=auth, stream=True)
+            return await client.request(method=method, url=url, **kwargs)
+        except httpx.HTTPError as e:
+            raise self._translate(e) from e
+
+    async def aiter_bytes(self, response, chunk_size: int = None):
+        # A connection dropped while the body downloads raises a requests
+        # exception too, as iter_content does for the blocking clients
+        try:
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+        except self._httpx.HTTPError as e:
+            raise self._translate(e) from e
+
+    def _translate(self, e) -> requests.exceptions.RequestException:
+        httpx = self._httpx
+        if isinstance(e, httpx.TimeoutException):
+            return requests.exceptions.Timeout(str(e))
+        if isinstance(e, httpx.TransportError):
+            return requests.exceptions.ConnectionError(str(e))
+        return requests.exceptions.RequestException(str(e))
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
@@ -0,0 +1,423 @@
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl
+from formstack.jsonstream import loads
+from formstack.sync import SubmissionSync
+
+SIGNATURE_HEADER = "X-FS-Signature"
+# Keys of a webhook payload that are not field values
+FORM_KEY = "FormID"
+ID_KEY = "UniqueID"
+HANDSHAKE_KEY = "HandshakeKey"
+META_KEYS = frozenset((FORM_KEY, ID_KEY, HANDSHAKE_KEY))
+
+_STOP = object()
+
+
+class WebhookError(Exception):
+    """A delivery that is rejected; ``status`` is the HTTP status to answer."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Check a hex HMAC-SHA256 of ``body`` (optionally ``sha256=``-prefixed)."""
+    if not signature:
+        return False
+    signature = signature.split("=", 1)[1] if signature.startswith("sha256=") else signature
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected.encode(), signature.strip().lower().encode())
+
+
+def parse_payload(body: bytes, content_type: str = "") -> Dict:
+    """Decode a webhook body sent as JSON or as a URL-encoded form."""
+    try:
+        if "json" in content_type or body[:1] in (b"{", b"["):
+            payload = loads(body)
+        else:
+            payload = dict(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise WebhookError(f"Malformed payload: {e}") from e
+    if not isinstance(payload, dict):
+        raise WebhookError("Malformed payload: expected an object")
+    return payload
+
+
+def to_submission(payload: Dict, received: datetime = None) -> Dict:
+    """A webhook payload in the shape ``get_form_submissions`` returns.
+
+    Field values are keyed by field id, as webhooks send them by default;
+    with "include field type" each value is an object with ``value`` and
+    ``type``. Webhooks carry no submission time, so ``timestamp`` is the time
+    the delivery was received (UTC).
+    """
+    if ID_KEY not in payload:
+        raise WebhookError(f"Payload has no {ID_KEY}")
+    data = {}
+    for key, value in payload.items():
+        if key in META_KEYS:
+            continue
+        field = {"field": key, "value": value}
+        if isinstance(value, dict) and "value" in value and ("type" in value or "field_type" in value):
+            field = {"field": key, "value": value["value"], "type": value.get("type") or value.get("field_type")}
+        data[key] = field
+    received = received or datetime.now(timezone.utc)
+    return {
+        "id": str(payload[ID_KEY]),
+        "form": str(payload.get(FORM_KEY, "")),
+        "timestamp": received.strftime("%Y-%m-%d %H:%M:%S"),
+        "data": data,
+    }
+
+
+def _submission_id(submission: Dict) -> str:
+    # Webhook payloads and API listings may give the id as a str or an int
+    return str(submission.get("id"))
+
+
+class _RecentIds:
+    # Bounded set of the most recently delivered submission ids
+    def __init__(self, size: int):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, id) -> bool:
+        return id in self._ids
+
+    def add(self, ids: Iterable[str]):
+        with self._lock:
+            for id in ids:
+                self._ids[id] = None
+                self._ids.move_to_end(id)
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+
+class WebhookReceiver:
+    """Receive submission webhooks and hand them to sinks in batches.
+
+    ``handle`` checks a delivery against ``handshake_key`` (the key set on
+    the webhook, sent back in the payload) and/or ``secret`` (HMAC-SHA256 of
+    the body in the ``X-FS-Signature`` header), converts it with
+    :func:`to_submission` and puts it on a queue of at most ``max_queue``
+    submissions. It never waits on the sinks; a full queue answers 503 so the
+    delivery is retried later. ``workers`` threads take up to ``batch_size``
+    submissions at a time, or whatever arrived within ``max_wait`` seconds,
+    and pass the list to every sink. A sink that raises or returns ``False``
+    is retried ``sink_retries`` times with backoff.
+
+    Deliveries can repeat, and :meth:`reconcile` may return submissions that
+    were delivered before a restart, so sinks should be idempotent by
+    submission id. The receiver is a WSGI application, or call :meth:`serve`
+    for a standalone server.
+    """
+
+    def __init__(
+        self,
+        *sinks: Callable[[List[Dict]], Optional[bool]],
+        handshake_key: str = None,
+        secret: str = None,
+        batch_size: int = 500,
+        max_wait: float = 1.0,
+        max_queue: int = 10000,
+        workers: int = 1,
+        sink_retries: int = 3,
+        retry_delay: float = 0.5,
+        remember: int = 100000,
+        logger: logging.Logger = None,
+    ):
+        if not sinks:
+            raise ValueError("WebhookReceiver needs at least one sink")
+        self.sinks = list(sinks)
+        self.handshake_key = handshake_key
+        self.secret = secret
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.sink_retries = sink_retries
+        self.retry_delay = retry_delay
+        self._logger = logger or logging.getLogger(__name__)
+        self._queue = queue.Queue(max_queue)
+        self._delivered = _RecentIds(remember)
+        self._threads = []
+        self._accepting = False
+        self._lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.duplicates = 0
+        self.backfilled = 0
+        self.failed = 0
+        self.batches = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "delivered": self.delivered,
+            "duplicates": self.duplicates,
+            "backfilled": self.backfilled,
+            "failed": self.failed,
+        }
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    # Receiving
+    def verify(self, body: bytes, headers: Mapping[str, str], payload: Dict):
+        if self.secret is not None and not verify_signature(body, headers.get(SIGNATURE_HEADER), self.secret):
+            raise WebhookError("Invalid signature", 401)
+        if self.handshake_key is not None and not hmac.compare_digest(
+            str(payload.get(HANDSHAKE_KEY, "")).encode(), self.handshake_key.encode()
+        ):
+            raise WebhookError("Invalid handshake key", 401)
+
+    def handle(self, body: bytes, headers: Mapping[str, str]) -> Tuple[int, Dict]:
+        """Validate and enqueue one delivery; returns the status and body to
+        answer with. ``headers`` must look names up case-insensitively."""
+        try:
+            if not self._accepting:
+                raise WebhookError("Receiver is not running", 503)
+            payload = parse_payload(body, headers.get("Content-Type") or "")
+            self.verify(body, headers, payload)
+            submission = to_submission(payload)
+        except WebhookError as e:
+            self._count("rejected")
+            self._logger.warning("webhook rejected, status=%s, message=%s", e.status, e)
+            return e.status, {"error": str(e)}
+        try:
+            self._queue.put_nowait(submission)
+        except queue.Full:
+            self._count("dropped")
+            return 503, {"error": "Queue full"}
+        self._count("received")
+        return 200, {"id": submission["id"]}
+
+    def __call__(self, environ, start_response):
+        # WSGI entry point; GET answers a health check
+        if environ.get("REQUEST_METHOD") == "POST":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            body = environ["wsgi.input"].read(length) if length else b""
+            headers = _WSGIHeaders(environ)
+            status, data = self.handle(body, headers)
+        else:
+            status, data = (200 if self._accepting else 503), self.stats()
+        out = json.dumps(data).encode()
+        response_headers = [("Content-Type", "application/json"), ("Content-Length", str(len(out)))]
+        if status == 503:
+            response_headers.append(("Retry-After", "1"))
+        start_response(f"{status} {_REASONS.get(status, '')}".rstrip(), response_headers)
+        return [out]
+
+    def serve(self, host: str = "0.0.0.0", port: int = 8080) -> "WebhookServer":
+        """Start the workers and a threaded HTTP server; stop it with
+        ``server.stop()``."""
+        return WebhookServer(self, (host, port)).start()
+
+    # Delivering
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            self._threads = [
+                threading.Thread(target=self._work, name=f"webhook-sink-{n}", daemon=True)
+                for n in range(self.workers)
+            ]
+            self._accepting = True
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """Stop accepting deliveries, then deliver what is queued."""
+        with self._lock:
+            self._accepting = False
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _work(self):
+        get = self._queue.get
+        while True:
+            item = get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                    try:
+                        item = get(timeout=wait)
+                    except queue.Empty:
+                        break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+            if stop:
+                return
+
+    def _deliver(self, batch: List[Dict]) -> bool:
+        # A retried delivery may arrive in the same batch as the original
+        fresh = {}
+        for submission in batch:
+            id = _submission_id(submission)
+            if id not in fresh and id not in self._delivered:
+                fresh[id] = submission
+        if len(fresh) < len(batch):
+            self._count("duplicates", len(batch) - len(fresh))
+        if not fresh:
+            return True
+        ids, fresh = list(fresh), list(fresh.values())
+        for sink in self.sinks:
+            if not self._send(sink, fresh):
+                self._count("failed", len(fresh))
+                return False
+        self._delivered.add(ids)
+        self._count("batches")
+        self._count("delivered", len(fresh))
+        return True
+
+    def _send(self, sink, batch: List[Dict]) -> bool:
+        for attempt in range(self.sink_retries + 1):
+            try:
+                if sink(batch) is not False:
+                    return True
+                self._logger.warning("sink=%r refused batch, size=%s", sink, len(batch))
+            except Exception:
+                self._logger.exception("sink=%r failed, size=%s", sink, len(batch))
+            if attempt < self.sink_retries:
+                time.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    # Backfill
+    def reconcile(self, client, store, form_ids: Iterable, **kwargs) -> Dict[str, int]:
+        """Fetch submissions added since the last reconcile of each form with
+        :class:`~formstack.sync.SubmissionSync` and send the ones no webhook
+        delivered to the sinks.
+
+        ``store`` holds the per-form cursors. Run it at startup and then
+        periodically to cover deliveries missed while the receiver was down.
+        A batch the sinks refuse leaves the cursor in place. Returns the
+        submissions fetched per form.
+        """
+        sync = SubmissionSync(client, store, **kwargs)
+
+        def sink(batch: List[Dict]) -> bool:
+            missed = [s for s in batch if _submission_id(s) not in self._delivered]
+            if not missed:
+                return True
+            if not self._deliver(missed):
+                return False
+            self._count("backfilled", len(missed))
+            return True
+
+        return sync.run_all(form_ids, sink)
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 503: "Service Unavailable"}
+
+
+class _WSGIHeaders:
+    # Case-insensitive header lookup over a WSGI environ
+    def __init__(self, environ):
+        self.environ = environ
+
+    def get(self, name: str, default=None):
+        key = name.upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        return self.environ.get(key, default)
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, data: Dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self._send(*self.server.receiver.handle(body, self.headers))
+
+    def do_GET(self):
+        receiver = self.server.receiver
+        self._send(200 if receiver._accepting else 503, receiver.stats())
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """Threaded keep-alive HTTP server feeding a :class:`WebhookReceiver`."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, receiver: WebhookReceiver, address=("0.0.0.0", 8080)):
+        super().__init__(address, _WebhookHandler)
+        self.receiver = receiver
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.receiver.start()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.receiver.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
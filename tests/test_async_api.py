@@ -0,0 +1,138 @@
+import asyncio
+import json
+import httpx
+import pytest
+from formstack.async_api import AsyncDocsClient, AsyncFormsClient, AsyncFormsSCIM
+from formstack.cache import ResponseCache
+from formstack.exceptions import FormstackException
+from formstack.instrumentation import Instrumentation, Metrics
+from formstack.transport import AsyncTransport
+
+
+class Server:
+    # httpx.MockTransport handler answering from a dict of (method, path)
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        reply = self.routes[(request.method, request.url.path)]
+        if isinstance(reply, list):
+            # Scripted replies; the last one repeats
+            reply = reply.pop(0) if len(reply) > 1 else reply[0]
+        status, body = reply
+        return httpx.Response(status, content=json.dumps(body).encode(), headers={"content-type": "application/json"})
+
+    def transport(self):
+        return AsyncTransport(httpx_transport=httpx.MockTransport(self))
+
+
+def test_async_forms_client_requests_and_caches():
+    server = Server({
+        ("GET", "/api/v2/form/1/.json"): (200, {"id": "1", "name": "Intake"}),
+        ("PUT", "/api/v2/form/1.json"): (200, {"id": "1"}),
+    })
+    metrics = Metrics()
+
+    async def main():
+        async with AsyncFormsClient(
+            token="t", transport=server.transport(), cache=ResponseCache(), instrumentation=Instrumentation(metrics)
+        ) as fs:
+            first = await fs.get_form(id=1)
+            second = await fs.get_form(id=1)
+            await fs.update_form(id=1, data={"name": "New"})
+            third = await fs.get_form(id=1)
+            return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert first == second == third == {"id": "1", "name": "Intake"}
+    assert [r.method for r in server.requests] == ["GET", "PUT", "GET"]
+    assert server.requests[0].headers["authorization"] == "Bearer t"
+    assert sum(metrics.requests.values()) == 3
+
+
+def test_async_forms_client_streams_submissions():
+    server = Server({
+        ("GET", "/api/v2/form/1/submission.json"): (200, {"total": 2, "pages": 1, "submissions": [{"id": "a"}, {"id": "b"}]}),
+    })
+
+    async def main():
+        fs = AsyncFormsClient(token="t", transport=server.transport())
+        try:
+            return [s["id"] async for s in fs.iter_form_submissions(id=1, stream=True)]
+        finally:
+            await fs.aclose()
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+
+def test_async_smartlist_upload_sends_only_missing_options():
+    server = Server({
+        ("GET", "/api/v2/smartlist/7/option"): (200, {"total": 2, "pages": 1, "options": [
+            {"id": 1, "label": "a", "value": "a"},
+            {"id": 2, "label": "old", "value": "old"},
+        ]}),
+        ("PUT", "/api/v2/smartlist/7/bulkoptions"): (200, {"success": 1}),
+        ("DELETE", "/api/v2/smartlist/7/option/2"): (200, {"success": 1}),
+    })
+
+    async def main():
+        async with AsyncFormsClient(token="t", transport=server.transport()) as fs:
+            labels = [o["label"] async for o in fs.iter_smartlist_options(7)]
+            progress = await fs.upload_smartlist_options(7, ["a", "b", "c"], chunk_size=1, delete_missing=True)
+            return labels, progress
+
+    labels, progress = asyncio.run(main())
+    assert labels == ["a", "old"]
+    assert (progress.chunks_done, progress.options_sent, progress.options_deleted, progress.unchanged) == (2, 2, 1, 1)
+    sent = sorted(json.loads(r.content)["options"][0]["label"] for r in server.requests if r.method == "PUT")
+    assert sent == ["b", "c"]
+
+
+def test_async_docs_client_merges_with_basic_auth():
+    server = Server({
+        ("POST", "/api/documents/5"): (200, {"id": 5, "key": "k1"}),
+        ("POST", "/merge/5/k1"): (201, {"success": 1}),
+    })
+
+    async def main():
+        async with AsyncDocsClient(api_key="key", api_secret="secret", transport=server.transport()) as docs:
+            return await docs.merge_document(5, {"name": "x"})
+
+    assert asyncio.run(main()) == {"success": 1}
+    assert server.requests[1].headers["authorization"].startswith("Basic ")
+    assert json.loads(server.requests[1].content) == {"name": "x"}
+
+
+def test_async_docs_client_refetches_a_stale_key():
+    server = Server({
+        ("POST", "/api/documents/5"): [(200, {"key": "k1"}), (200, {"key": "k2"})],
+        ("POST", "/merge/5/k1"): [(201, {"success": 1}), (404, {})],
+        ("POST", "/merge/5/k2"): (201, {"success": 2}),
+    })
+
+    async def main():
+        async with AsyncDocsClient(api_key="key", api_secret="secret", transport=server.transport()) as docs:
+            return [await docs.merge_document(5, {}), await docs.merge_document(5, {})]
+
+    assert asyncio.run(main()) == [{"success": 1}, {"success": 2}]
+    assert [r.url.path for r in server.requests] == [
+        "/api/documents/5", "/merge/5/k1", "/merge/5/k1", "/api/documents/5", "/merge/5/k2",
+    ]
+
+
+def test_async_scim_client_lists_and_raises_on_errors():
+    server = Server({
+        ("GET", "/scim/Users"): (200, {"totalResults": 1, "itemsPerPage": 1, "startIndex": 1, "Resources": [{"id": "u1"}]}),
+        ("GET", "/scim/Users/missing"): (404, {"detail": "Not found"}),
+    })
+
+    async def main():
+        async with AsyncFormsSCIM(token="t", transport=server.transport()) as scim:
+            users = [u["id"] async for u in scim.iter_users(stream=True)]
+            with pytest.raises(FormstackException):
+                await scim.get_user("missing")
+            return users
+
+    assert asyncio.run(main()) == ["u1"]
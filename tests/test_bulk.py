@@ -0,0 +1,49 @@
+import asyncio
+import time
+from formstack.bulk import AsyncBulkRun, BulkRun
+
+
+def flaky(n):
+    time.sleep(0.001 * (n % 3))
+    if n == 3:
+        raise ValueError("boom")
+    if n == 4:
+        return "Not Found - The resource requested could not be found"
+    return n * 2
+
+
+def test_bulk_run_ordered_results_and_stats():
+    run = BulkRun(flaky, range(10), workers=4, ordered=True)
+    results = list(run)
+    assert [r.index for r in results] == list(range(10))
+    assert results[0].result == 0
+    assert not results[3].ok and not results[4].ok
+    assert (run.stats.succeeded, run.stats.failed) == (8, 2)
+
+
+def test_bulk_run_pulls_input_lazily():
+    pulled = []
+
+    def source():
+        for n in range(1000):
+            pulled.append(n)
+            yield n
+
+    results = iter(BulkRun(lambda n: n, source(), workers=2))
+    next(results)
+    assert len(pulled) <= 5
+    results.close()
+
+
+def test_async_bulk_run():
+    async def double(n):
+        await asyncio.sleep(0)
+        return n * 2
+
+    async def collect():
+        run = AsyncBulkRun(double, range(20), workers=5)
+        return sorted([r.result async for r in run]), run.stats
+
+    results, stats = asyncio.run(collect())
+    assert results == [n * 2 for n in range(20)]
+    assert stats.succeeded == 20
@@ -0,0 +1,162 @@
+from formstack.cache import CacheEntry, MemoryBackend, ResponseCache, SQLiteBackend
+from formstack.docs_api import DocsClient
+from formstack.forms_api import FormsClient
+
+
+class FakeResponse:
+    def __init__(self, body, headers=None):
+        self.content = body
+        self.headers = headers or {}
+
+
+class AccountTransport:
+    # Answers with the credentials the request was sent with
+    def __init__(self):
+        self.calls = 0
+
+    def request(self, headers=None, auth=None, **kwargs):
+        self.calls += 1
+        who = auth.username if auth is not None else headers["authorization"]
+        response = FakeResponse(('{"owner": "%s"}' % who).encode())
+        response.status_code = 200
+        response.reason = "OK"
+        return response
+
+
+def cache_endpoints(cache, *endpoints):
+    for endpoint in endpoints:
+        cache.store(endpoint, endpoint, FakeResponse(b"{}"))
+
+
+def test_only_metadata_endpoints_are_cached():
+    cache = ResponseCache()
+    assert cache.ttl("form/1/.json")
+    assert cache.ttl("form/1/field.json")
+    assert cache.ttl("form/1/submission.json") is None
+
+
+def test_writes_invalidate_matching_entries():
+    cache = ResponseCache()
+    cache_endpoints(cache, "form.json", "form/1/.json", "form/12/.json", "form/1/field.json")
+    cache.invalidate("form/1.json")
+    assert len(cache.backend) == 1
+    assert cache.backend.get("form/12/.json") is not None
+    cache_endpoints(cache, "form/12/field.json")
+    cache.invalidate("field/5.json")
+    assert cache.backend.get("form/12/field.json") is None
+
+
+def test_lru_eviction_by_size():
+    backend = MemoryBackend(max_entries=10, max_bytes=400)
+    for key in "abc":
+        backend.set(key, CacheEntry(key, b"x" * 50, expires=1e12))
+    backend.get("a")
+    backend.set("d", CacheEntry("d", b"x" * 50, expires=1e12))
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.evictions == 1
+    assert backend.bytes <= 400
+
+
+def test_hit_and_miss_counters():
+    cache = ResponseCache()
+    key = cache.key("https://x/form/1/.json", {"a": 1}, "secret")
+    assert "secret" not in key
+    assert cache.lookup(key) is None
+    cache.store(key, "form/1/.json", FakeResponse(b'{"id": 1}', {"ETag": '"1"'}))
+    entry = cache.lookup(key)
+    assert cache.load(entry) == {"id": 1}
+    assert entry.validators() == {"If-None-Match": '"1"'}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_clients_of_different_accounts_do_not_share_entries():
+    cache = ResponseCache()
+    transport = AccountTransport()
+    alice = FormsClient(token="alice", transport=transport, cache=cache)
+    bob = FormsClient(token="bob", transport=transport, cache=cache)
+    assert alice.get_form(id=1) == {"owner": "Bearer alice"}
+    assert bob.get_form(id=1) == {"owner": "Bearer bob"}
+    assert alice.get_form(id=1) == {"owner": "Bearer alice"}
+    assert transport.calls == 2
+    assert not any("alice" in key or "bob" in key for key in cache.backend._entries)
+    docs = [DocsClient(api_key=key, api_secret="s", transport=transport, cache=cache) for key in ("k1", "k2")]
+    assert [d.get("api/documents") for d in docs] == [{"owner": "k1"}, {"owner": "k2"}]
+
+
+def test_sqlite_backend_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteBackend(path, max_entries=3, evict_every=1)
+    for key in "abcd":
+        backend.set(key, CacheEntry("form/1/.json", key.encode() * 2000, expires=1e12))
+    assert len(backend) == 3
+    assert backend.get("a") is None
+    warm = SQLiteBackend(path)
+    entry = warm.get("d")
+    assert entry.body == b"d" * 2000
+    assert entry.fresh
+
+
+ENDPOINTS = [
+    "form.json", "form/1/.json", "form/1/basic.json", "form/12/.json", "form/1/field.json",
+    "form/12/field.json", "folder.json", "folder/3.json", "smartlist", "smartlist/5",
+    "smartlist/5/option", "smartlist/50", "Users", "Users/u1", "Groups", "Groups/g1",
+]
+
+
+def test_sqlite_invalidation_matches_memory_backend(tmp_path):
+    writes = ["form/1.json", "form.json", "field/5.json", "smartlist/5", "Users/u1", "Bulk", "folder/3.json"]
+    for n, write in enumerate(writes):
+        memory = ResponseCache()
+        sqlite = ResponseCache(backend=SQLiteBackend(str(tmp_path / f"{n}.db"), evict_every=1000))
+        for cache in (memory, sqlite):
+            cache_endpoints(cache, *ENDPOINTS)
+            cache.invalidate(write)
+        assert isinstance(sqlite.backend, SQLiteBackend)
+        kept = [e for e in ENDPOINTS if sqlite.backend.get(e) is not None]
+        assert kept == [e for e in ENDPOINTS if memory.backend.get(e) is not None], write
+        assert len(kept) < len(ENDPOINTS), write
+
+
+def test_sqlite_invalidation_reads_only_the_endpoint_index(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    plan = backend._connect().execute(
+        "EXPLAIN QUERY PLAN SELECT key, endpoint FROM cache WHERE endpoint >= ? AND endpoint < ?", ("a", "b")
+    ).fetchall()
+    assert "cache_endpoint" in str(plan)
+
+
+def test_writes_to_uncached_kinds_skip_invalidation():
+    deletes = []
+    backend = MemoryBackend()
+    backend.delete = lambda match, ranges=None: deletes.append(ranges)
+    cache = ResponseCache(backend=backend)
+    cache.invalidate("submission/5.json")
+    cache.invalidate("merge/1/key")
+    assert deletes == []
+    cache.invalidate("form/1.json")
+    cache.invalidate("Bulk")
+    assert len(deletes) == 2
+    backend = MemoryBackend()
+    backend.delete = lambda match, ranges=None: deletes.append(ranges)
+    ResponseCache(backend=backend, default_ttl=60).invalidate("submission/5.json")
+    assert len(deletes) == 3
+
+
+def test_sqlite_access_times_are_written_in_batches(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"), max_entries=2, evict_every=1000, touch_every=3)
+    for key in "abc":
+        backend.set(key, CacheEntry("form/1/.json", b"{}", expires=1e12))
+    conn = backend._connect()
+    with conn:
+        conn.execute("UPDATE cache SET accessed = 0")
+    backend.get("a")
+    backend.get("a")
+    assert dict(conn.execute("SELECT key, accessed FROM cache")) == {"a": 0, "b": 0, "c": 0}
+    backend.get("b")
+    accessed = dict(conn.execute("SELECT key, accessed FROM cache"))
+    assert accessed["a"] > 0 and accessed["b"] > 0 and accessed["c"] == 0
+    backend.get("c")
+    backend.get("a")
+    backend.evict()  # flushes the pending reads first, so "b" is the least recent
+    assert backend.get("b") is None and backend.get("a") is not None
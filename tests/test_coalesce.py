@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from formstack.coalesce import AsyncSingleFlight, SingleFlight, request_key
+from formstack.forms_api import FormsClient
+
+
+class FakeResponse:
+    status_code = 200
+    reason = "OK"
+    headers = {}
+    content = b'{"id": "1"}'
+
+
+class SlowTransport:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def request(self, headers=None, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        response = FakeResponse()
+        response.content = ('{"id": "1", "token": "%s"}' % headers["authorization"][7:]).encode()
+        return response
+
+
+def test_concurrent_identical_gets_share_one_request():
+    transport = SlowTransport()
+    flight = SingleFlight()
+    fs = FormsClient(transport=transport, coalesce=flight)
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(fs.get, "form/1.json", params={"a": 1}) for _ in range(8)]
+        while flight.executed + flight.saved < 8:
+            time.sleep(0.001)
+        transport.release.set()
+        results = [f.result() for f in futures]
+    assert transport.calls == 1
+    assert results == [{"id": "1", "token": ""}] * 8
+    assert flight.stats() == {"executed": 1, "saved": 7, "in_flight": 0}
+
+
+def test_keys_differ_by_params_and_password():
+    assert request_key("GET", "form/1.json", {"a": 1, "b": 2}) == request_key("GET", "form/1.json", {"b": 2, "a": 1})
+    assert request_key("GET", "form/1.json", {"a": 1}) != request_key("GET", "form/1.json", {"a": "1"})
+    assert request_key("GET", "form/1.json", None, "pw") != request_key("GET", "form/1.json")
+
+
+def test_clients_of_different_accounts_or_hosts_do_not_share():
+    transport = SlowTransport()
+    flight = SingleFlight()
+    clients = [
+        FormsClient(token="alice", transport=transport, coalesce=flight),
+        FormsClient(token="bob", transport=transport, coalesce=flight),
+        FormsClient(token="alice", hostname="eu.formstack.com", transport=transport, coalesce=flight),
+    ]
+    with ThreadPoolExecutor(3) as executor:
+        futures = [executor.submit(fs.get, "form/1.json") for fs in clients]
+        while flight.executed + flight.saved < 3:
+            time.sleep(0.001)
+        transport.release.set()
+        results = [f.result()["token"] for f in futures]
+    assert results == ["alice", "bob", "alice"]
+    assert (transport.calls, flight.saved) == (3, 0)
+
+
+def test_async_waiters_share_the_error():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.saved == 4
+
+
+def test_async_cancelled_leader_does_not_cancel_the_others():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "key"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("k", slow)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        return results
+
+    assert asyncio.run(main()) == ["key"] * 3
+    assert calls == 1
+    assert flight.stats() == {"executed": 1, "saved": 3, "in_flight": 0}
+
+
+def test_async_call_is_cancelled_once_every_caller_has_gone():
+    flight = AsyncSingleFlight()
+
+    async def main():
+        started, stopped = asyncio.Event(), asyncio.Event()
+
+        async def slow():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        callers = [asyncio.ensure_future(flight.do("k", slow)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(stopped.wait(), 1)
+        await asyncio.sleep(0)
+        return flight.stats()["in_flight"]
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,64 @@
+import json
+from formstack.docs_api import DocsClient
+
+
+class FakeResponse:
+    reason = ""
+    headers = {}
+
+    def __init__(self, status_code: int, body):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+
+
+class ScriptedTransport:
+    # Answers each path with the next of its scripted (status, body) replies
+    def __init__(self, replies):
+        self.replies = replies
+        self.paths = []
+
+    def request(self, method, url, **kwargs):
+        path = url.split("/", 3)[3]
+        self.paths.append(path)
+        replies = self.replies[path]
+        status, body = replies.pop(0) if len(replies) > 1 else replies[0]
+        return FakeResponse(status, body)
+
+
+def _client(replies):
+    transport = ScriptedTransport(replies)
+    return DocsClient(api_key="key", api_secret="secret", transport=transport), transport
+
+
+def test_merge_reuses_the_key_until_it_goes_stale():
+    docs, transport = _client({
+        "api/documents/5": [(200, {"key": "k1"}), (200, {"key": "k2"})],
+        "merge/5/k1": [(201, {"success": 1}), (201, {"success": 1}), (404, {})],
+        "merge/5/k2": [(201, {"success": 2})],
+    })
+    assert docs.merge_document(5, {"name": "a"}) == {"success": 1}
+    # The key rotates between the second and third merge
+    assert docs.merge_document(5, {"name": "b"}) == {"success": 1}
+    assert docs.merge_document(5, {"name": "c"}) == {"success": 2}
+    assert transport.paths == [
+        "api/documents/5", "merge/5/k1", "merge/5/k1", "merge/5/k1", "api/documents/5", "merge/5/k2",
+    ]
+
+
+def test_route_merge_refetches_after_unauthorized():
+    docs, transport = _client({
+        "api/routes/9": [(200, {"key": "old"}), (200, {"key": "new"})],
+        "route/9/old": [(401, {})],
+        "route/9/new": [(201, {"success": 1})],
+    })
+    assert docs.merge_data_route(9, {"name": "a"}) == {"success": 1}
+    assert transport.paths == ["api/routes/9", "route/9/old", "api/routes/9", "route/9/new"]
+
+
+def test_other_errors_do_not_refetch_the_key():
+    docs, transport = _client({
+        "api/documents/5": [(200, {"key": "k1"})],
+        "merge/5/k1": [(500, {})],
+    })
+    assert docs.merge_document(5, {}).startswith("5xx")
+    assert transport.paths == ["api/documents/5", "merge/5/k1"]
@@ -0,0 +1,89 @@
+import asyncio
+import io
+import os
+import pytest
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.exceptions import FormstackException
+from formstack.forms_api import FormsClient
+
+SIZE = 200_000
+
+
+def _client(server):
+    return FormsClient(hostname=server.hostname, token="t", scheme="http")
+
+
+def test_dropped_download_resumes_with_a_range(tmp_path):
+    dest = str(tmp_path / "upload.pdf")
+    with FormstackStubServer(StubConfig(download_size=SIZE, download_drop_after=50_000)) as server:
+        fs = _client(server)
+        with pytest.raises(FormstackException):
+            fs.download_file(7, 3, dest, chunk_size=1024)
+        partial = os.path.getsize(dest + ".part")
+        assert 0 < partial <= 50_000
+        assert not os.path.exists(dest)
+        assert fs.download_file(7, 3, dest, chunk_size=1024) == SIZE - partial
+        assert server.statuses[206] == 1
+        with open(dest, "rb") as f:
+            assert f.read() == server.data.file(7, 3)
+    assert not os.path.exists(dest + ".part")
+
+
+def test_range_ignored_by_the_server_restarts_from_zero(tmp_path):
+    dest = str(tmp_path / "upload.pdf")
+    config = StubConfig(download_size=SIZE, download_drop_after=50_000, download_ranges=False)
+    with FormstackStubServer(config) as server:
+        fs = _client(server)
+        with pytest.raises(FormstackException):
+            fs.download_file(7, 3, dest, chunk_size=1024)
+        assert os.path.getsize(dest + ".part") > 0
+        assert fs.download_file(7, 3, dest, chunk_size=1024) == SIZE
+        assert server.statuses == {200: 2}
+        with open(dest, "rb") as f:
+            assert f.read() == server.data.file(7, 3)
+
+
+def test_destination_is_replaced_only_when_complete(tmp_path):
+    dest = tmp_path / "upload.pdf"
+    dest.write_bytes(b"previous version")
+    with FormstackStubServer(StubConfig(download_size=SIZE, download_drop_after=50_000)) as server:
+        fs = _client(server)
+        with pytest.raises(FormstackException):
+            fs.download_file(7, 3, str(dest))
+        assert dest.read_bytes() == b"previous version"
+        fs.download_file(7, 3, str(dest))
+        assert dest.read_bytes() == server.data.file(7, 3)
+        # A .part that is already complete is answered with 416 and renamed
+        part = tmp_path / "other.pdf.part"
+        part.write_bytes(server.data.file(8, 1))
+        assert fs.download_file(8, 1, str(tmp_path / "other.pdf")) == 0
+        assert server.statuses[416] == 1
+        assert (tmp_path / "other.pdf").read_bytes() == server.data.file(8, 1)
+        assert not part.exists()
+
+
+def test_download_to_a_file_object():
+    with FormstackStubServer(StubConfig(download_size=SIZE)) as server:
+        buffer = io.BytesIO()
+        assert _client(server).download_file(7, 3, buffer) == SIZE
+        assert buffer.getvalue() == server.data.file(7, 3)
+
+
+def test_async_download_resumes_after_a_dropped_connection(tmp_path):
+    from formstack.async_api import AsyncFormsClient
+
+    dest = str(tmp_path / "upload.pdf")
+
+    async def run(server):
+        async with AsyncFormsClient(hostname=server.hostname, token="t", scheme="http") as fs:
+            with pytest.raises(FormstackException):
+                await fs.download_file(7, 3, dest, chunk_size=1024)
+            assert not os.path.exists(dest)
+            partial = os.path.getsize(dest + ".part")
+            assert await fs.download_file(7, 3, dest, chunk_size=1024) == SIZE - partial
+
+    with FormstackStubServer(StubConfig(download_size=SIZE, download_drop_after=50_000)) as server:
+        asyncio.run(run(server))
+        with open(dest, "rb") as f:
+            assert f.read() == server.data.file(7, 3)
+    assert not os.path.exists(dest + ".part")
@@ -0,0 +1,155 @@
+import csv
+import gzip
+import io
+import json
+from formstack.export import SubmissionExporter
+from formstack.forms_api import FormsClient
+from formstack.pagination import iter_pages
+from formstack.sync import JSONCursorStore
+
+FIELDS = [{"id": "11"}, {"id": "12"}, {"id": "13"}]
+
+
+def submission(form_id, n, timestamp=None):
+    return {
+        "id": str(form_id * 1000 + n),
+        "timestamp": timestamp or f"2024-01-01 00:{n:02d}:00",
+        "data": {
+            # Listed out of field order on purpose
+            "12": {"field": "12", "value": f"b{n}"},
+            "11": {"field": "11", "value": {"first": "A", "last": str(n)}},
+        },
+    }
+
+
+class FakeClient:
+    # Pages each form's submissions the way FormsClient does
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.pages = []
+
+    def get_form_fields(self, id):
+        return FIELDS
+
+    def iter_forms(self):
+        return iter([{"id": form_id} for form_id in self.submissions])
+
+    def _page(self, form_id, params):
+        self.pages.append((form_id, params))
+        items = [
+            s for s in self.submissions[form_id]
+            if s["timestamp"] >= params.get("min_time", "")
+        ]
+        start = (params["page"] - 1) * params["per_page"]
+        return {"total": len(items), "submissions": items[start : start + params["per_page"]]}
+
+    def iter_form_submissions(self, id, params=None, enc_password="", per_page=100):
+        return iter_pages(lambda p: self._page(id, p), "submissions", params, per_page, prefetch=False)
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_ndjson_per_form_over_several_pages(tmp_path):
+    client = FakeClient({1: [submission(1, n) for n in range(7)], 2: [submission(2, n) for n in range(3)]})
+    stats = SubmissionExporter(client, str(tmp_path), per_page=3, workers=2).run()
+    assert (stats.forms_done, stats.forms_failed, stats.records) == (2, 0, 10)
+    assert read_ndjson(tmp_path / "1.ndjson") == client.submissions[1]
+    assert read_ndjson(tmp_path / "2.ndjson") == client.submissions[2]
+    assert len([p for p in client.pages if p[0] == 1]) == 3
+
+
+def test_csv_columns_follow_the_form_fields(tmp_path):
+    client = FakeClient({5: [submission(5, n) for n in range(4)]})
+    SubmissionExporter(client, str(tmp_path), format="csv", compress=True, per_page=3).run([5])
+    with gzip.open(tmp_path / "5.csv.gz", "rt", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["id", "form", "timestamp", "11", "12", "13"]
+    assert rows[2] == ["5001", "5", "2024-01-01 00:01:00", '{"first":"A","last":"1"}', "b1", ""]
+    assert len(rows) == 5
+
+
+def test_single_long_csv_stream(tmp_path):
+    client = FakeClient({1: [submission(1, 0)], 2: [submission(2, 0)]})
+    out = io.StringIO()
+    SubmissionExporter(client, out, format="csv", per_form=False).run([1, 2])
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == ["form", "id", "timestamp", "field", "value"]
+    assert sorted(row[:2] + row[3:4] for row in rows[1:]) == [
+        ["1", "1000", "11"], ["1", "1000", "12"], ["2", "2000", "11"], ["2", "2000", "12"],
+    ]
+
+
+def test_rerun_resumes_from_the_cursor(tmp_path):
+    client = FakeClient({1: [submission(1, n) for n in range(5)]})
+    store = JSONCursorStore(str(tmp_path / "cursors.json"))
+    out = tmp_path / "out"
+    SubmissionExporter(client, str(out), format="csv", per_page=2, store=store).run([1])
+    assert store.get(1).timestamp == "2024-01-01 00:04:00"
+
+    # One more at the boundary timestamp and one later
+    client.submissions[1] += [submission(1, 5, "2024-01-01 00:04:00"), submission(1, 6)]
+    client.pages.clear()
+    reopened = JSONCursorStore(str(tmp_path / "cursors.json"))
+    stats = SubmissionExporter(client, str(out), format="csv", per_page=2, store=reopened).run([1])
+    assert stats.records == 2
+    assert all(p[1]["min_time"] == "2024-01-01 00:04:00" and p[1]["sort"] == "ASC" for p in client.pages)
+    with open(out / "1.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][0] == "id"
+    assert [row[0] for row in rows[1:]] == [str(1000 + n) for n in range(7)]
+
+
+def test_failed_form_keeps_its_last_saved_cursor(tmp_path):
+    class Failing(FakeClient):
+        def _page(self, form_id, params):
+            if params["page"] == 3:
+                raise RuntimeError("connection reset")
+            return super()._page(form_id, params)
+
+    client = Failing({1: [submission(1, n) for n in range(6)]})
+    store = JSONCursorStore(str(tmp_path / "cursors.json"))
+    stats = SubmissionExporter(client, str(tmp_path), per_page=2, store=store).run([1])
+    assert stats.forms_failed == 1
+    assert store.get(1).timestamp == "2024-01-01 00:03:00"
+    assert [s["id"] for s in read_ndjson(tmp_path / "1.ndjson")] == ["1000", "1001", "1002", "1003"]
+
+
+class FakeResponse:
+    status_code = 200
+    reason = "OK"
+    headers = {}
+
+    def __init__(self, body: bytes):
+        self.content = body
+
+
+class SubmissionTransport:
+    # Form 5's fields and submissions for a real FormsClient
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def request(self, url, params=None, **kwargs):
+        endpoint = url.split("/api/v2/", 1)[1]
+        if endpoint == "form/5/field.json":
+            body = FIELDS
+        else:
+            start = (params["page"] - 1) * params["per_page"]
+            body = {
+                "total": len(self.submissions),
+                "submissions": self.submissions[start : start + params["per_page"]],
+            }
+        return FakeResponse(json.dumps(body).encode())
+
+
+def test_export_from_a_models_client(tmp_path):
+    submissions = [submission(5, n) for n in range(5)]
+    fs = FormsClient(token="t", models=True, transport=SubmissionTransport(submissions))
+    stats = SubmissionExporter(fs, str(tmp_path), per_page=2).run([5])
+    assert (stats.forms_done, stats.forms_failed, stats.records) == (1, 0, 5)
+    assert read_ndjson(tmp_path / "5.ndjson") == submissions
+    SubmissionExporter(fs, str(tmp_path), format="csv", per_page=2).run([5])
+    with open(tmp_path / "5.csv", newline="") as f:
+        assert list(csv.reader(f))[1][4] == "b0"
@@ -0,0 +1,77 @@
+import json
+from formstack.forms_api import FormsClient
+from formstack.hierarchy import FolderIndex
+from formstack.models import Form
+
+FOLDERS = [
+    {"id": "1", "name": "Sales", "parent": "0", "subfolders": [
+        {"id": "2", "name": "EMEA", "subfolders": [{"id": "3", "name": "UK"}]},
+        {"id": "4", "name": "US"},
+    ]},
+    {"id": "5", "name": "HR", "parent": "0"},
+    {"id": "6", "name": "UK", "parent": "5"},
+]
+FORMS = [
+    {"id": "10", "name": "Lead", "folder": "3"},
+    {"id": "11", "name": "Quote", "folder": "1"},
+    {"id": "12", "name": "Leave", "folder": "6"},
+    {"id": "13", "name": "Loose", "folder": "0"},
+]
+
+
+def test_lookups_and_subtrees():
+    index = FolderIndex()
+    index.load(FOLDERS, FORMS)
+    assert index.folder_id("Sales/EMEA/UK") == "3"
+    assert index.folder_id("HR/UK") == "6"
+    assert index.form_id("Quote") == "11"
+    assert index.subfolders("1") == ["2", "4"]
+    assert index.subfolders("1", recursive=True) == ["2", "3", "4"]
+    assert sorted(index.forms_in("1")) == ["10", "11"]
+    assert index.forms_in("1", recursive=False) == ["11"]
+    assert index.forms_in(None, recursive=False) == ["13"]
+    assert index.contains("1", "3") and not index.contains("2", "4")
+
+
+def test_reload_applies_only_changes():
+    index = FolderIndex()
+    index.load(FOLDERS, FORMS)
+    moved = [dict(FORMS[0], folder="4"), dict(FORMS[1], views=5)] + FORMS[2:3]
+    assert index.load(FOLDERS, moved) == {"folders": 0, "forms": 3}
+    assert index.forms_in("2") == []
+    assert index.forms_in("4") == ["10"]
+    assert index.form_id("Loose") is None
+
+
+class FakeResponse:
+    status_code = 200
+    reason = "OK"
+    headers = {}
+
+    def __init__(self, body: bytes):
+        self.content = body
+
+
+class ListingTransport:
+    # One page of folders and one of forms; views change on every listing
+    def __init__(self):
+        self.listings = 0
+
+    def request(self, url, **kwargs):
+        endpoint = url.split("/api/v2/", 1)[1]
+        if endpoint == "folder.json":
+            body = {"folders": FOLDERS, "total": len(FOLDERS)}
+        else:
+            self.listings += 1
+            forms = [dict(FORMS[0], views=str(self.listings))] + FORMS[1:]
+            body = {"forms": forms, "total": len(forms)}
+        return FakeResponse(json.dumps(body).encode())
+
+
+def test_index_from_a_models_client():
+    fs = FormsClient(token="t", models=True, transport=ListingTransport())
+    index = fs.folder_index(max_age=0)
+    assert index.folder_id("Sales/EMEA/UK") == "3"
+    assert sorted(index.forms_in("1")) == ["10", "11"]
+    assert index.refresh() == {"folders": 0, "forms": 1}
+    assert index.update_form(Form(json.dumps(FORMS[1]))) is False
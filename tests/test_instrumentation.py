@@ -0,0 +1,110 @@
+import datetime
+import pytest
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.exceptions import CircuitOpenException, RateLimitException
+from formstack.forms_api import FormsClient
+from formstack.instrumentation import Instrumentation, Metrics, RequestTrace, endpoint_template
+from formstack.ratelimit import RateLimiter
+from formstack.transport import Transport
+
+
+class FakeRequest:
+    headers = {"content-length": "7"}
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"{}"):
+        self.status_code = status_code
+        self.content = body
+        self.headers = {}
+        self.reason = "OK"
+        self.request = FakeRequest()
+        self.elapsed = datetime.timedelta(milliseconds=20)
+
+
+class FakeTransport:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+
+    def request(self, trace=None, **kwargs):
+        if trace is not None:
+            trace.retries = 1
+        return FakeResponse(self.statuses.pop(0))
+
+
+def test_endpoint_template():
+    assert endpoint_template("form/123/submission.json") == "form/{id}/submission.json"
+    assert endpoint_template("form.json") == "form.json"
+    assert endpoint_template("form/123/.json") == "form/{id}/.json"
+    assert endpoint_template("merge/12/k3y") == "merge/{id}/{key}"
+    assert endpoint_template("route/7/abcdef") == "route/{id}/{key}"
+    assert endpoint_template("Users/2819c223-7f76") == "Users/{id}"
+    assert endpoint_template("Groups/admins") == "Groups/{id}"
+    assert endpoint_template("api/documents/abc/copy") == "api/documents/{id}/copy"
+    assert endpoint_template("smartlist/ab/option/cd") == "smartlist/{id}/option/{id}"
+    assert endpoint_template("download/5/6.json") == "download/{id}/{field_id}.json"
+    assert endpoint_template("api/tools/compress_pdf") == "api/tools/compress_pdf"
+    assert endpoint_template("Bulk") == "Bulk"
+
+
+def test_hooks_and_metrics():
+    metrics = Metrics()
+    instrumentation = Instrumentation(metrics)
+    seen = []
+    instrumentation.on_request(lambda trace: seen.append(("before", trace.endpoint)))
+    instrumentation.on_response(lambda trace: seen.append(("after", trace.status, trace.retries)))
+    client = FormsClient(transport=FakeTransport(200, 404), instrumentation=instrumentation)
+    client.get("form/1.json")
+    client.get("form/2.json")
+    assert seen == [
+        ("before", "form/{id}.json"),
+        ("after", 200, 1),
+        ("before", "form/{id}.json"),
+        ("after", 404, 1),
+    ]
+    assert metrics.latency[("GET", "form/{id}.json")].count == 2
+    assert metrics.errors == {("GET", "form/{id}.json", "404"): 1}
+    assert metrics.retries == {("GET", "form/{id}.json"): 2}
+
+
+def _counting_client(server, **kwargs):
+    instrumentation = Instrumentation()
+    seen = {"before": 0, "after": []}
+    instrumentation.on_request(lambda trace: seen.__setitem__("before", seen["before"] + 1))
+    instrumentation.on_response(lambda trace: seen["after"].append(type(trace.error).__name__ if trace.error else trace.status))
+    client = FormsClient(hostname=server.hostname, token="t", scheme="http", instrumentation=instrumentation, **kwargs)
+    return client, seen
+
+
+def test_trace_finishes_when_daily_budget_is_spent():
+    with FormstackStubServer(StubConfig()) as server:
+        client, seen = _counting_client(server, transport=Transport(), rate_limiter=RateLimiter(daily_limit=1))
+        client.get_form(id=1)
+        with pytest.raises(RateLimitException):
+            client.get_form(id=1)
+    assert seen == {"before": 2, "after": [200, "RateLimitException"]}
+
+
+def test_trace_finishes_when_circuit_is_open():
+    with FormstackStubServer(StubConfig(error_5xx=1.0)) as server:
+        client, seen = _counting_client(server, transport=Transport(failure_threshold=1, reset_timeout=60))
+        client.get_form(id=1)
+        with pytest.raises(CircuitOpenException):
+            client.get_form(id=1)
+    assert seen == {"before": 2, "after": [503, "CircuitOpenException"]}
+
+
+def test_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    for elapsed, status in ((0.05, 200), (0.5, 200), (5.0, 500)):
+        trace = RequestTrace("GET", 'form/{id}.json', "")
+        trace.elapsed, trace.status = elapsed, status
+        metrics.after(trace)
+    text = metrics.to_prometheus()
+    labels = 'method="GET",endpoint="form/{id}.json"'
+    assert f'formstack_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'formstack_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'formstack_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"formstack_request_duration_seconds_count{{{labels}}} 3" in text
+    assert f'formstack_requests_total{{{labels},status="200"}} 2' in text
+    assert f'formstack_request_errors_total{{{labels},error="500"}} 1' in text
@@ -0,0 +1,34 @@
+import json
+import pytest
+from formstack.jsonstream import ArrayParser, iter_items
+from formstack.pagination import iter_stream_pages
+
+DOC = {
+    "total": 3,
+    "submissions": [{"id": "1", "value": 'a,"]}[\\é'}, {"id": "2", "n": 2.5}, 12345],
+    "pages": 1,
+    "meta": {"nested": [1, {"b": "]"}]},
+}
+
+
+@pytest.mark.parametrize("size", [1, 3, 16, 4096])
+def test_items_decoded_across_chunk_boundaries(size):
+    body = json.dumps(DOC, ensure_ascii=False).encode()
+    parser = ArrayParser("submissions")
+    chunks = (body[i : i + size] for i in range(0, len(body), size))
+    assert list(iter_items(chunks, parser=parser)) == DOC["submissions"]
+    assert parser.envelope == {"total": 3, "pages": 1, "meta": DOC["meta"]}
+
+
+def test_truncated_document_raises():
+    with pytest.raises(ValueError):
+        list(iter_items([b'{"submissions": [1, 2'], "submissions"))
+
+
+def test_stream_pages_follow_envelope():
+    def stream(params, parser):
+        page = params["page"]
+        body = json.dumps({"submissions": [page * 10, page * 10 + 1], "pages": 2}).encode()
+        return iter_items([body], parser=parser)
+
+    assert list(iter_stream_pages(stream, "submissions", per_page=2)) == [10, 11, 20, 21]
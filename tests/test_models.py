@@ -0,0 +1,67 @@
+from datetime import datetime
+from formstack.cache import ResponseCache
+from formstack.forms_api import FormsClient
+from formstack.models import Field, Folder, Form, Submission, User, wrap
+
+
+class FakeResponse:
+    status_code = 200
+    reason = "OK"
+    headers = {}
+
+    def __init__(self, body: bytes):
+        self.content = body
+
+
+class RouteTransport:
+    # Answers by request path
+    def __init__(self, bodies):
+        self.bodies = bodies
+
+    def request(self, url, **kwargs):
+        return FakeResponse(self.bodies[url.split("/api/v2/", 1)[1]])
+
+
+def test_attributes_are_typed_and_decoded_lazily():
+    form = Form(b'{"id": "12", "name": "Intake", "created": "2024-01-31 14:05:00", "deleted": "0"}')
+    assert isinstance(form._raw, bytes)
+    assert form.id == 12
+    assert form.name == "Intake"
+    assert form.created == datetime(2024, 1, 31, 14, 5)
+    assert form.deleted is False
+    assert form.views is None
+    assert form["name"] == "Intake" and form.get("missing", 1) == 1
+
+
+def test_wrap_keeps_list_envelope():
+    page = wrap("form/5/submission.json", {"total": 1, "pages": 1, "submissions": [{"id": "9"}]})
+    assert page["total"] == 1
+    assert isinstance(page["submissions"][0], Submission)
+    assert page["submissions"][0].id == 9
+    users = wrap("Users", {"totalResults": 1, "Resources": [{"userName": "ada"}]})
+    assert isinstance(users["Resources"][0], User)
+    assert users["Resources"][0].user_name == "ada"
+    assert wrap("merge/1/abc", {"ok": True}) == {"ok": True}
+
+
+def test_client_methods_return_models():
+    fs = FormsClient(token="t", models=True, cache=ResponseCache(), transport=RouteTransport({
+        "form/7/.json": b'{"id": "7", "name": "Intake"}',
+        "form/7/basic.json": b'{"id": "7", "name": "Intake"}',
+        "form/7/field.json": b'[{"id": "3", "label": "Name"}]',
+        "form/7/submission.json": b'{"total": 1, "pages": 1, "submissions": [{"id": "9"}]}',
+        "folder/4.json": b'{"id": "4", "name": "HR"}',
+        "folder.json": b'{"total": 1, "folders": [{"id": "4"}]}',
+    }))
+    form = fs.get_form(id=7)
+    assert isinstance(form, Form) and isinstance(form._raw, bytes)
+    assert form.id == 7 and form.name == "Intake"
+    cached = fs.get_form(id=7)
+    assert isinstance(cached, Form) and cached.name == "Intake"
+    assert isinstance(fs.get_form(id=7, detail="basic"), Form)
+    fields = fs.get_form_fields(7)
+    assert isinstance(fields[0], Field) and fields[0].id == 3
+    submissions = fs.get_form_submissions(7)
+    assert submissions["total"] == 1 and submissions["submissions"][0].id == 9
+    assert isinstance(fs.get_folder(4), Folder)
+    assert isinstance(fs.get_folder()["folders"][0], Folder)
@@ -0,0 +1,60 @@
+import asyncio
+from formstack.forms_scim import scim_filter
+from formstack.pagination import iter_pages, aiter_pages, iter_scim_pages
+
+
+def fake_pages(total, per_page):
+    calls = []
+
+    def fetch(params):
+        calls.append(params["page"])
+        start = (params["page"] - 1) * per_page
+        items = [{"id": i} for i in range(start, min(start + per_page, total))]
+        pages = -(-total // per_page)
+        return {"total": total, "pages": pages, "submissions": items}
+
+    return fetch, calls
+
+
+def test_iter_pages_yields_every_item():
+    for prefetch in (True, False):
+        fetch, calls = fake_pages(total=25, per_page=10)
+        ids = [s["id"] for s in iter_pages(fetch, "submissions", per_page=10, prefetch=prefetch)]
+        assert ids == list(range(25))
+        assert calls == [1, 2, 3]
+
+
+def test_aiter_pages_yields_every_item():
+    fetch, calls = fake_pages(total=25, per_page=10)
+
+    async def afetch(params):
+        return fetch(params)
+
+    async def collect():
+        return [s["id"] async for s in aiter_pages(afetch, "submissions", per_page=10)]
+
+    assert asyncio.run(collect()) == list(range(25))
+    assert calls == [1, 2, 3]
+
+
+def test_iter_scim_pages_concurrent_in_order():
+    starts = []
+
+    def fetch(params):
+        # The server returns at most 7 resources whatever count asks for
+        starts.append(params["startIndex"])
+        first = params["startIndex"]
+        ids = list(range(first, min(first + 7, 51)))
+        return {"totalResults": 50, "Resources": [{"id": i} for i in ids]}
+
+    for workers in (1, 4):
+        starts.clear()
+        ids = [r["id"] for r in iter_scim_pages(fetch, count=20, workers=workers)]
+        assert ids == list(range(1, 51))
+        assert sorted(starts) == list(range(1, 51, 7))
+
+
+def test_scim_filter():
+    assert scim_filter({"userName": 'a"b', ("externalId", "pr"): None, "active": True}) == (
+        'userName eq "a\\"b" and externalId pr and active eq true'
+    )
@@ -0,0 +1,46 @@
+import base64
+import io
+import os
+import zlib
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.docs_api import DocsClient
+from formstack.pdf_tools import Base64Writer, ContentsExtractor, combine, compress, convert, encrypt, split
+
+
+def test_extractor_and_writer_handle_any_chunking():
+    data = os.urandom(1000)
+    text = base64.b64encode(data).replace(b"/", b"\\/")
+    body = b'{"name":"a.pdf","contents":"' + text + b'"}'
+    for size in (1, 2, 7, 64):
+        extractor = ContentsExtractor()
+        out = io.BytesIO()
+        writer = Base64Writer(out)
+        for start in range(0, len(body), size):
+            for _, piece in extractor.feed(body[start : start + size]):
+                writer.write(piece)
+        writer.close()
+        assert out.getvalue() == data and extractor.files == 1
+
+
+def test_chained_steps_stream_to_files(tmp_path):
+    sources = []
+    for n in range(3):
+        path = tmp_path / f"statement{n}.txt"
+        path.write_bytes(os.urandom(50000 + n))
+        sources.append(path)
+    with FormstackStubServer(StubConfig(error_429=0.1, retry_after=0, seed=3)) as server:
+        docs = DocsClient(hostname=server.hostname, api_key="k", api_secret="s", scheme="http")
+        pipeline = docs.pdf_pipeline([convert(), compress(), encrypt("pw")], workers=3, retries=5)
+        run = pipeline.run((path, tmp_path / f"out{n}.pdf") for n, path in enumerate(sources))
+        assert all(result.ok for result in run)
+        for n, path in enumerate(sources):
+            expected = b"ENC:pw:" + zlib.compress(b"%PDF-1.4\n" + path.read_bytes())
+            assert (tmp_path / f"out{n}.pdf").read_bytes() == expected
+        assert not list(tmp_path.glob("*.part"))
+
+        parts = tmp_path / "parts"
+        parts.mkdir()
+        written = docs.pdf_pipeline([combine(), split(parts=3)]).process([io.BytesIO(b"ab" * 10), sources[0]], parts)
+        combined = b"ab" * 10 + sources[0].read_bytes()
+        assert written == len(combined)
+        assert b"".join((parts / f"file-{n}.pdf").read_bytes() for n in (1, 2, 3)) == combined
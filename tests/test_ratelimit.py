@@ -0,0 +1,30 @@
+import pytest
+from formstack.exceptions import RateLimitException
+from formstack.ratelimit import RateLimiter
+
+
+def test_daily_budget_is_enforced():
+    limiter = RateLimiter(daily_limit=3)
+    for _ in range(3):
+        assert limiter.reserve() == 0
+    assert limiter.remaining == 0
+    with pytest.raises(RateLimitException):
+        limiter.reserve()
+
+
+def test_server_headers_tighten_budget():
+    limiter = RateLimiter(daily_limit=1000)
+    limiter.update({"X-RateLimit-Remaining": "5"})
+    assert limiter.remaining == 5
+
+
+def test_token_bucket_spaces_requests():
+    limiter = RateLimiter(rate=10, burst=1)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1, abs=0.02)
+
+
+def test_retry_after_pauses_bucket():
+    limiter = RateLimiter()
+    assert limiter.retry_after({"Retry-After": "2"}) == 2
+    assert limiter.reserve() == pytest.approx(2, abs=0.05)
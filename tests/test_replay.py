@@ -0,0 +1,28 @@
+import gzip
+import pytest
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.forms_api import FormsClient
+from formstack.replay import RecordingTransport, ReplayTransport, replay_traffic
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "traffic.ndjson.gz")
+    with FormstackStubServer(StubConfig(submissions=120)) as server:
+        recorder = RecordingTransport(path)
+        fs = FormsClient(hostname=server.hostname, token="secret-token", scheme="http", transport=recorder)
+        submissions = list(fs.iter_form_submissions(4, per_page=50))
+        form = fs.get("form/4.json", enc_password="secret-password")
+        recorder.close()
+        hostname = server.hostname
+    text = gzip.open(path, "rt").read()
+    assert "secret-token" not in text and "secret-password" not in text
+
+    # The server is gone; everything comes from the archive
+    fs = FormsClient(hostname=hostname, token="t", scheme="http", transport=ReplayTransport(path))
+    assert list(fs.iter_form_submissions(4, per_page=50, stream=True)) == submissions
+    assert fs.get("form/4.json") == form
+    assert fs.get("form/4.json") == form
+    with pytest.raises(KeyError):
+        fs.get("form/5.json")
+    results = list(replay_traffic(fs, path, workers=2))
+    assert len(results) == 4 and all(r.ok for r in results)
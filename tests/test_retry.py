@@ -0,0 +1,73 @@
+import asyncio
+import httpx
+import pytest
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.exceptions import CircuitOpenException, RateLimitException
+from formstack.ratelimit import RateLimiter
+from formstack.retry import CircuitBreaker, RetryPolicy
+from formstack.transport import AsyncTransport, Transport
+
+
+def test_post_is_not_retried_by_default():
+    policy = RetryPolicy()
+    assert policy.should_retry_status("GET", 503, attempt=0)
+    assert not policy.should_retry_status("POST", 503, attempt=0)
+    assert not policy.should_retry_status("GET", 503, attempt=3)
+    assert RetryPolicy(methods=("GET", "POST")).allows("POST", attempt=0)
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+    assert [policy.backoff(n) for n in range(4)] == [1, 2, 4, 5]
+    assert 0 <= RetryPolicy(backoff_factor=1).backoff(2) <= 4
+
+
+def test_circuit_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record(503)
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.is_open
+    breaker.before_request()  # trial request after reset_timeout
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request()
+    breaker.record(200)
+    assert not breaker.is_open
+
+
+def test_cancelled_trial_releases_the_circuit():
+    replies = iter([503, None, 200])
+
+    async def handler(request):
+        status = next(replies)
+        if status is None:
+            await asyncio.sleep(10)
+        return httpx.Response(status)
+
+    transport = AsyncTransport(
+        failure_threshold=1, reset_timeout=0, httpx_transport=httpx.MockTransport(handler)
+    )
+    url = "https://example.com/api/v2/form.json"
+
+    async def main():
+        assert (await transport.request("GET", url)).status_code == 503
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(transport.request("GET", url), 0.05)
+        response = await transport.request("GET", url)
+        await transport.aclose()
+        return response.status_code
+
+    assert asyncio.run(main()) == 200
+    assert not transport.breaker(url).is_open
+
+
+def test_spent_budget_does_not_take_the_trial():
+    with FormstackStubServer(StubConfig(error_5xx=1.0)) as server:
+        transport = Transport(failure_threshold=1, reset_timeout=0)
+        limiter = RateLimiter(daily_limit=1)
+        url = f"http://{server.hostname}/api/v2/form.json"
+        assert transport.request("GET", url, rate_limiter=limiter).status_code == 503
+        with pytest.raises(RateLimitException):
+            transport.request("GET", url, rate_limiter=limiter)
+        assert transport.breaker(url).before_request() is True
+        transport.close()
@@ -0,0 +1,37 @@
+import math
+from formstack.schema import FieldIndex
+
+FIELDS = [
+    {"id": "1", "label": "Name", "type": "text"},
+    {"id": "2", "label": "Age", "type": "number"},
+    {"id": "3", "label": "Colors", "type": "checkbox"},
+]
+
+SUBMISSIONS = [
+    {
+        "id": "100",
+        "timestamp": "2024-01-01 10:00:00",
+        "data": {
+            "1": {"field": "1", "value": "Ada"},
+            "2": {"field": "2", "value": "36"},
+            "3": {"field": "3", "value": "red\nblue"},
+        },
+    },
+    {"id": "101", "timestamp": "2024-01-01 11:00:00", "data": [{"field": "1", "value": {"first": "Alan"}}]},
+]
+
+
+def test_rows_have_fixed_columns_and_typed_values():
+    index = FieldIndex(FIELDS)
+    assert index.columns == ("id", "timestamp", "1", "2", "3")
+    assert index.label("2") == "Age"
+    rows = list(index.rows(SUBMISSIONS))
+    assert rows[0] == ("100", "2024-01-01 10:00:00", "Ada", 36.0, ("red", "blue"))
+    assert rows[1] == ("101", "2024-01-01 11:00:00", '{"first":"Alan"}', None, None)
+
+
+def test_to_columns_pads_missing_values():
+    columns = FieldIndex(FIELDS).to_columns(SUBMISSIONS)
+    assert columns["id"] == ["100", "101"]
+    assert columns["2"][0] == 36.0 and math.isnan(columns["2"][1])
+    assert columns["3"] == [("red", "blue"), None]
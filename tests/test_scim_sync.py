@@ -0,0 +1,75 @@
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.cache import ResponseCache
+from formstack.forms_scim import FormsSCIM
+from formstack.scim_sync import DirectorySync, UserIndex
+
+
+class FakeSCIM:
+    def __init__(self, users, groups=()):
+        self.users = users
+        self.groups = list(groups)
+        self.sent = []
+
+    def iter_users(self, count=100, attributes=None, workers=1, cache=True):
+        return iter(self.users)
+
+    def iter_groups(self, count=100, workers=1, cache=True):
+        return iter(self.groups)
+
+    def post(self, endpoint, data=None):
+        self.sent.append(("POST", endpoint))
+        return dict(data, id="new")
+
+    def patch(self, endpoint, data=None):
+        self.sent.append(("PATCH", endpoint, data["Operations"]))
+        return {}
+
+    def delete(self, endpoint):
+        self.sent.append(("DELETE", endpoint))
+
+
+USERS = [
+    {"id": "1", "userName": "Ada@example.com", "externalId": "e1", "name": {"givenName": "Ada", "formatted": "Ada L"}},
+    {"id": "2", "userName": "alan@example.com", "active": True},
+]
+
+
+def test_plan_sends_only_changes():
+    client = FakeSCIM(USERS, [{"id": "g", "displayName": "Eng", "members": [{"value": "2"}]}])
+    desired = [
+        {"userName": "ada@example.com", "externalId": "e1", "name": {"givenName": "Ada"}},
+        {"userName": "grace@example.com"},
+    ]
+    report = DirectorySync(client, bulk=False, workers=2).run(
+        desired, groups=[{"displayName": "Eng", "members": ["grace@example.com", "e1"]}]
+    )
+    assert (len(report.users.creates), len(report.users.updates), report.users.unchanged) == (1, 0, 1)
+    assert not report.errors
+    assert ("DELETE", "Users/2") in client.sent
+    group_patch = next(s for s in client.sent if s[1] == "Groups/g")
+    assert group_patch[2] == [
+        {"op": "add", "path": "members", "value": [{"value": "1"}, {"value": "new"}]},
+        {"op": "remove", "path": 'members[value eq "2"]'},
+    ]
+
+
+def test_deactivate_instead_of_delete():
+    sync = DirectorySync(FakeSCIM(USERS), deprovision="deactivate")
+    plan = sync.plan_users([USERS[0]], UserIndex(USERS))
+    assert not plan.deletes
+    assert plan.updates[0].id == "2"
+    assert plan.updates[0].data == [{"op": "replace", "path": "active", "value": False}]
+
+
+def test_bulk_sync_with_a_cache_is_idempotent():
+    desired = [{"userName": f"user{n}@example.com", "externalId": f"ext-{n}"} for n in range(6)]
+    with FormstackStubServer(StubConfig(users=5, groups=0)) as server:
+        cache = ResponseCache()
+        scim = FormsSCIM(hostname=server.hostname, token="t", scheme="http", cache=cache)
+        scim.get_users()  # a cached listing from before the sync
+        first = DirectorySync(scim, bulk=True).run(desired)
+        second = DirectorySync(scim, bulk=True).run(desired)
+        assert len(first.users.creates) == 1
+        assert (len(second.users.creates), second.users.unchanged) == (0, 6)
+        assert len(list(scim.iter_users())) == 6
+        assert scim.get_users()["totalResults"] == 6
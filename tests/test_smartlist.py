@@ -0,0 +1,46 @@
+from formstack.smartlist import SmartlistUploader
+
+
+class FakeClient:
+    def __init__(self, existing, fail_chunks=()):
+        self.existing = existing
+        self.fail_chunks = set(fail_chunks)
+        self.sent = []
+        self.deleted = []
+
+    def iter_smartlist_options(self, id):
+        return iter(self.existing)
+
+    def update_smartlist_options_bulk(self, id, data):
+        first = data["options"][0]["label"]
+        if first in self.fail_chunks:
+            self.fail_chunks.discard(first)
+            return "5xx Internal Server Error"
+        self.sent.append([o["label"] for o in data["options"]])
+        return {"success": 1}
+
+    def delete_smartlist_option(self, id, option_id):
+        self.deleted.append(option_id)
+        return {"success": 1}
+
+
+def test_uploads_only_missing_options_in_chunks():
+    client = FakeClient([{"id": 1, "label": "a", "value": "a"}, {"id": 2, "label": "old", "value": "old"}])
+    progress = SmartlistUploader(client, 7, chunk_size=2, workers=2, delete_missing=True).run(
+        ["a", "b", "c", "d", "e"]
+    )
+    assert sorted(sum(client.sent, [])) == ["b", "c", "d", "e"]
+    assert client.deleted == [2]
+    assert (progress.chunks_done, progress.unchanged, progress.options_sent) == (2, 1, 4)
+
+
+def test_rerun_resumes_after_failed_chunk(tmp_path):
+    state = str(tmp_path / "state.json")
+    client = FakeClient([], fail_chunks=["c"])
+    options = ["a", "b", "c", "d", "e"]
+    first = SmartlistUploader(client, 7, chunk_size=2, diff=False, state_path=state).run(options)
+    assert first.chunks_failed == 1
+    client.sent.clear()
+    second = SmartlistUploader(client, 7, chunk_size=2, diff=False, state_path=state).run(options)
+    assert client.sent == [["c", "d"]]
+    assert second.chunks_done == 3 and second.chunks_failed == 0
@@ -0,0 +1,62 @@
+from benchmarks.stub_server import FormstackStubServer, StubConfig
+from formstack.forms_api import FormsClient
+from formstack.forms_scim import FormsSCIM
+from formstack.ratelimit import RateLimiter
+from formstack.retry import RetryPolicy
+
+
+def test_paging_with_capped_page_size_and_injected_errors():
+    config = StubConfig(page_size=10, submissions=150, error_429=0.2, error_5xx=0.2, seed=1)
+    with FormstackStubServer(config) as server:
+        fs = FormsClient(
+            hostname=server.hostname,
+            token="t",
+            scheme="http",
+            rate_limiter=RateLimiter(max_retries=20),
+            retry=RetryPolicy(max_retries=20, backoff_factor=0.001),
+        )
+        submissions = list(fs.iter_form_submissions(7, per_page=100))
+        assert len(submissions) == 150
+        assert len({s["id"] for s in submissions}) == 150
+        assert server.statuses.get(429) and server.statuses.get(503)
+
+
+def test_scim_directory():
+    with FormstackStubServer(StubConfig(users=30, groups=3)) as server:
+        scim = FormsSCIM(hostname=server.hostname, token="t", scheme="http")
+        users = list(scim.iter_users(count=10, filter={"userName": "USER7@example.com"}))
+        assert [u["externalId"] for u in users] == ["ext-7"]
+        created = scim.create_users({"userName": "new@example.com"})
+        scim.patch_user(created["id"], [{"op": "replace", "path": "active", "value": False}])
+        assert scim.get_user(created["id"])["active"] is False
+        assert scim.delete_user(created["id"]) is None
+        assert len(list(scim.iter_users(count=7, workers=3))) == 30
+
+
+def test_fields_partial_submissions_and_smartlists():
+    config = StubConfig(page_size=10, fields=3, partial_submissions=25, smartlist_options=15)
+    with FormstackStubServer(config) as server:
+        fs = FormsClient(hostname=server.hostname, token="t", scheme="http")
+        fields = fs.get_form_fields(7)
+        assert [f["id"] for f in fields] == ["7001", "7002", "7003"]
+        assert fs.get_field(7002)["label"] == "Field 2"
+        partials = list(fs.iter_form_partial_submissions(7, per_page=100))
+        assert len(partials) == 25
+        assert fs.get_partial_submission(partials[3]["id"])["id"] == partials[3]["id"]
+        assert [s["id"] for s in fs.get_smartlists()["smartlists"]] == ["1", "2", "3"]
+        progress = fs.upload_smartlist_options(2, ["Option 0", {"label": "Option 0", "value": "option-0"}, "new"])
+        assert (progress.options_sent, progress.unchanged) == (2, 1)
+        labels = [o["label"] for o in fs.iter_smartlist_options(2)]
+        assert len(labels) == 17 and labels[-2:] == ["Option 0", "new"]
+
+
+def test_downloads_honour_ranges():
+    with FormstackStubServer(StubConfig(download_size=1000)) as server:
+        fs = FormsClient(hostname=server.hostname, token="t", scheme="http")
+        content = server.data.file(7, 3)
+        response = fs._transport.request(
+            "GET", f"http://{server.hostname}/api/v2/download/7/3.json", headers={"Range": "bytes=600-"}
+        )
+        assert response.status_code == 206
+        assert response.content == content[600:]
+        assert response.headers["Content-Range"] == "bytes 600-999/1000"
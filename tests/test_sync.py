@@ -0,0 +1,41 @@
+from formstack.sync import JSONCursorStore, SQLiteCursorStore, SubmissionSync
+
+
+class FakeClient:
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.calls = []
+
+    def iter_form_submissions(self, id, params=None, enc_password="", per_page=100):
+        self.calls.append(params)
+        min_time = params.get("min_time", "")
+        return iter([s for s in self.submissions if s["timestamp"] >= min_time])
+
+
+def submission(id, timestamp):
+    return {"id": str(id), "timestamp": timestamp}
+
+
+def test_sync_fetches_only_new_submissions(tmp_path):
+    client = FakeClient([submission(1, "2024-01-01 10:00:00"), submission(2, "2024-01-01 11:00:00")])
+    store = JSONCursorStore(str(tmp_path / "cursors.json"))
+    received = []
+    sync = SubmissionSync(client, store, batch_size=1)
+    assert sync.run(42, received.extend) == 2
+
+    client.submissions.append(submission(3, "2024-01-01 11:00:00"))
+    client.submissions.append(submission(4, "2024-01-02 09:00:00"))
+    reopened = SubmissionSync(client, JSONCursorStore(str(tmp_path / "cursors.json")))
+    assert reopened.run(42, received.extend) == 2
+    assert [s["id"] for s in received] == ["1", "2", "3", "4"]
+    assert client.calls[-1]["min_time"] == "2024-01-01 11:00:00"
+
+
+def test_cursor_not_committed_without_ack(tmp_path):
+    client = FakeClient([submission(1, "2024-01-01 10:00:00")])
+    store = SQLiteCursorStore(str(tmp_path / "cursors.db"))
+    sync = SubmissionSync(client, store)
+    assert sync.run(7, lambda batch: False) == 0
+    assert store.get(7) is None
+    assert sync.run(7, lambda batch: None) == 1
+    assert store.get(7).timestamp == "2024-01-01 10:00:00"
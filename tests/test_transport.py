@@ -0,0 +1,64 @@
+import asyncio
+from benchmarks.stub_server import StubServer
+from formstack.async_api import AsyncFormsClient
+from formstack.docs_api import DocsClient
+from formstack.forms_api import FormsClient
+from formstack.forms_scim import FormsSCIM
+from formstack.transport import AsyncTransport, Transport, default_transport
+
+
+def test_clients_reuse_one_session_per_host():
+    with StubServer() as server:
+        transport = Transport()
+        fs = FormsClient(hostname=server.hostname, token="t", scheme="http", transport=transport)
+        docs = DocsClient(hostname=server.hostname, api_key="k", api_secret="s", scheme="http", transport=transport)
+        session = transport.session(fs.url)
+        for n in range(5):
+            assert fs.get(f"form/{n}.json")["path"] == f"/api/v2/form/{n}.json"
+            docs.post(f"merge/{n}/key")
+        assert transport.session(docs.url) is session
+        assert server.connections == 1
+        transport.close()
+
+
+def test_closing_a_client_leaves_shared_transports_open():
+    with StubServer() as server:
+        transport = Transport()
+        with FormsClient(hostname=server.hostname, token="t", scheme="http", transport=transport) as fs:
+            fs.get("form.json")
+            session = transport.session(fs.url)
+        scim = FormsSCIM(hostname=server.hostname, token="t", scheme="http", transport=transport)
+        scim.get("Users")
+        scim.close()
+        # Still the same session and connection for the other clients
+        assert transport.session(scim.url) is session
+        assert server.connections == 1
+        transport.close()
+        assert transport.session(scim.url) is not session
+
+
+def test_default_transport_survives_a_closed_client():
+    with StubServer() as server:
+        other = FormsClient(hostname=server.hostname, token="t", scheme="http")
+        other.get("form.json")
+        session = default_transport().session(other.url)
+        with FormsClient(hostname=server.hostname, token="t", scheme="http") as fs:
+            fs.get("form.json")
+        other.get("form.json")
+        assert default_transport().session(other.url) is session
+
+
+def test_async_client_closes_only_the_transport_it_created():
+    async def main():
+        shared = AsyncTransport()
+        client = shared.client()
+        async with AsyncFormsClient(token="t", transport=shared):
+            pass
+        assert not client.is_closed
+        await shared.aclose()
+        fs = AsyncFormsClient(token="t")
+        own = fs._transport.client()
+        await fs.aclose()
+        assert own.is_closed
+
+    asyncio.run(main())
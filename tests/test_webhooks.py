@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import io
+import json
+import time
+from formstack.sync import JSONCursorStore
+from formstack.webhooks import WebhookReceiver, to_submission
+
+
+def signed(payload, secret="s"):
+    body = json.dumps(payload).encode()
+    signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return body, {"Content-Type": "application/json", "X-FS-Signature": signature}
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_validation_and_submission_shape():
+    batches = []
+    with WebhookReceiver(batches.append, handshake_key="hk", secret="s", max_wait=0.01) as receiver:
+        body, headers = signed({"FormID": "5", "UniqueID": "9", "HandshakeKey": "hk", "11": "a", "12": {"value": "b", "type": "text"}})
+        assert receiver.handle(body, headers) == (200, {"id": "9"})
+        assert receiver.handle(body, dict(headers, **{"X-FS-Signature": "sha256=00"}))[0] == 401
+        body, headers = signed({"FormID": "5", "UniqueID": "10", "HandshakeKey": "wrong"})
+        assert receiver.handle(body, headers)[0] == 401
+        assert receiver.handle(b"{", {"Content-Type": "application/json"})[0] == 400
+        wait_for(lambda: batches)
+    submission = batches[0][0]
+    assert (submission["id"], submission["form"]) == ("9", "5")
+    assert submission["data"] == {"11": {"field": "11", "value": "a"}, "12": {"field": "12", "value": "b", "type": "text"}}
+    assert receiver.stats()["rejected"] == 3
+
+    form = to_submission({"UniqueID": "1", "FormID": "2", "7": "x"})
+    assert form["data"]["7"]["value"] == "x"
+
+
+def test_batches_dedupe_and_reconcile(tmp_path):
+    batches = []
+    receiver = WebhookReceiver(batches.append, batch_size=3, max_wait=0.05, max_queue=10)
+    receiver.start()
+    for id in ["1", "2", "3", "4", "2"]:
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": "30",
+            "wsgi.input": io.BytesIO(f"FormID=7&UniqueID={id}&11=hello".ljust(30).encode()),
+        }
+        receiver(environ, lambda status, headers: None)
+    wait_for(lambda: receiver.stats()["delivered"] == 4)
+    receiver.stop()
+    assert [len(b) for b in batches] == [3, 1]
+    assert receiver.stats()["duplicates"] == 1
+    assert receiver.handle(b"UniqueID=5", {})[0] == 503
+
+    class Client:
+        def iter_form_submissions(self, id, params=None, enc_password="", per_page=100):
+            return iter([{"id": str(n), "timestamp": f"2024-01-01 00:00:0{n}"} for n in range(1, 7)])
+
+    assert receiver.reconcile(Client(), JSONCursorStore(str(tmp_path / "c.json")), [7]) == {"7": 6}
+    assert [s["id"] for s in batches[-1]] == ["5", "6"]
+    assert receiver.stats()["backfilled"] == 2
+
+
+def test_duplicates_within_one_batch_and_int_ids(tmp_path):
+    batches = []
+    receiver = WebhookReceiver(batches.append, batch_size=3, max_wait=1)
+    receiver.start()
+    # A retried delivery landing in the same batch as the original
+    for id in ["1", "2", "1"]:
+        assert receiver.handle(f"FormID=7&UniqueID={id}".encode(), {})[0] == 200
+    wait_for(lambda: receiver.stats()["delivered"] == 2)
+    assert [[s["id"] for s in b] for b in batches] == [["1", "2"]]
+    assert receiver.stats()["duplicates"] == 1
+
+    class Client:
+        def iter_form_submissions(self, id, params=None, enc_password="", per_page=100):
+            return iter([{"id": n, "timestamp": f"2024-01-01 00:00:0{n}"} for n in (1, 2, 3)])
+
+    receiver.reconcile(Client(), JSONCursorStore(str(tmp_path / "c.json")), [7])
+    receiver.stop()
+    assert [s["id"] for s in batches[-1]] == [3]